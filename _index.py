@@ -258,10 +258,11 @@ if database_col.button("update horse result"):
     database_container.write(horse_ids)
     progress_bar = database_container.progress(0)
 
+    # リトライのたびに作り直すとChromeが残るため、ドライバーは1つを使い回す
+    driver = app.get_driver()
+    mongo = app.get_mongo_client()
     while True:
         try:
-            driver = app.get_driver()
-            mongo = app.get_mongo_client()
             for num, horse_id in enumerate(horse_ids):
                 progress_bar.progress(num / len(horse_ids), str(horse_id))
                 app.insert_horse_data(driver, mongo, horse_id)
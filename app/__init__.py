@@ -1,6 +1,8 @@
 from app._prepare_id import (
     create_index,
     get_driver,
+    get_prefetcher,
+    close_browsers,
     get_mongo_client,
     get_mongo_database,
     get_race_ids,
@@ -14,9 +16,16 @@ from app._prepare_id import (
     find_human_ids_for_db,
     local_code_to_name,
 )
-from app._create_horse_db import upsert_horse_data
-from app._create_race_db import upsert_pre_race_shutuba
-from app._create_human_db import upsert_human_data
+from app._create_horse_db import (
+    upsert_horse_data,
+    upsert_many_horse_data,
+    prefetch_horse_pages,
+)
+from app._create_race_db import upsert_pre_race_shutuba, upsert_many_pre_race_shutuba
+from app._create_result_db import upsert_result_data, upsert_many_result_data
+from app._create_odds_db import upsert_odds_data, upsert_many_odds_data
+from app._create_human_db import upsert_human_data, upsert_many_human_data
+from app._reparse_archive import reparse_archive
 from app._find_data import (
     find_pre_race,
     find_shutuba,
@@ -1,6 +1,12 @@
-from modules.scrape import GetHorseData
+from modules.scrape import (
+    GetHorseData,
+    ParsePipeline,
+    as_fetcher,
+    fetch_with_retry,
+    parse_horse_pages,
+)
 from modules.database import InsertData, FindData
-from modules.constants import RACEDATA
+from modules.constants import RACEDATA, URL
 import pandas as pd
 from app._prepare_id import generate_race_id
 
@@ -25,12 +31,13 @@ def get_horse_pedigree(get_horse_data) -> dict:
         raise Exception(f"Error getting horse pedigree: {e}")
 
 
-def get_horse_result(get_horse_data) -> pd.DataFrame:
+def get_horse_result(get_horse_data, known_race_id: str = None) -> pd.DataFrame:
     """
     馬の過去戦績を取得する
+    known_race_idを指定した場合は、そのレースより後の戦績だけを取得する
     """
     try:
-        return get_horse_data.get_horse_result()
+        return get_horse_data.get_horse_result(known_race_id)
     except Exception as e:
         raise Exception(f"Error getting horse result: {e}")
 
@@ -128,17 +135,25 @@ def upsert_horse_data(
     mongo,
     horse_id: str,
     get_type: list[str] = ["profile", "pedigree", "result"],
+    force: bool = False,
 ):
     """
     馬のプロフィールと過去戦績を取得してDBに格納する
+    登録済みの馬の過去戦績は、馬のページを再検証し、変更がなければ解析も書き込みもしない
+    変更があった場合も、DBに格納済みの最新のレースより後の戦績だけを解析して書き込む
+    force=Trueの場合は、登録済みかどうかに関係なく解析して書き込む(アーカイブからの再解析用)
     """
+    get_horse_data = None
     try:
         find = FindData(mongo)
-        exist_horse_data = find.exists_horse_data(horse_id)
-        exist_horse_pedigree = find.exists_horse_pedigree(horse_id)
+        exist_horse_data = find.exists_horse_data(horse_id) and not force
+        exist_horse_pedigree = find.exists_horse_pedigree(horse_id) and not force
 
-        get_horse_data = None
         insert = InsertData(mongo)
+        if "result" in get_type and exist_horse_data:
+            get_horse_data = GetHorseData(driver, horse_id)
+            if not get_horse_data.load_if_modified():
+                get_type = [t for t in get_type if t != "result"]
         if "profile" in get_type and not exist_horse_data:
             if get_horse_data is None:
                 get_horse_data = GetHorseData(driver, horse_id)
@@ -152,22 +167,166 @@ def upsert_horse_data(
         if "result" in get_type:
             if get_horse_data is None:
                 get_horse_data = GetHorseData(driver, horse_id)
+            known_race_id = None
+            if exist_horse_data:
+                known_race_id = find.get_latest_result_race_id(horse_id)
             try:
-                result_data = get_horse_result(get_horse_data)
+                result_data = get_horse_result(get_horse_data, known_race_id)
             except Exception as e:
                 # 過去戦績がない場合
                 if "no text parsed from document" in str(e):
+                    get_horse_data.mark_processed()
                     return get_horse_data.driver
                 else:
                     raise Exception(f"Error getting horse result: {e}")
+            # 過去戦績がない場合や、格納済みのレースより新しい戦績がない場合
+            if len(result_data) == 0:
+                get_horse_data.mark_processed()
+                return get_horse_data.driver
             formatted_result_data = format_horse_result(result_data)
             formatted_result_data["trainer_id"] = find.get_trainer_id_by_horse_id(
                 horse_id
             )
             upsert_horse_result(insert, horse_id, formatted_result_data)
+            # 格納が終わってから記録する。失敗した場合は次回も取得し直す
+            get_horse_data.mark_processed()
 
     except Exception as e:
+        # 次回の更新で取得し直すため、保存したページを破棄する
+        if get_horse_data is not None:
+            get_horse_data.invalidate()
         raise Exception(f"Error upserting horse data horse_id={horse_id}: {e}")
     if get_horse_data is None:
         return driver
     return get_horse_data.driver
+
+
+def prefetch_horse_pages(
+    prefetcher,
+    mongo,
+    horse_ids: list[str],
+    get_type: list[str] = ["profile", "pedigree", "result"],
+):
+    """
+    upsert_horse_dataで取得する予定の馬のページを先読みする
+    登録済みの馬のページは、過去戦績の更新を判定するときと同じように再検証で先読みする
+    """
+    find = FindData(mongo)
+    urls, revalidate_urls = [], []
+    for horse_id in horse_ids:
+        exist_horse_data = find.exists_horse_data(horse_id)
+        if not exist_horse_data and ("profile" in get_type or "result" in get_type):
+            urls.append(URL.HORSE + horse_id)
+        elif exist_horse_data and "result" in get_type:
+            revalidate_urls.append(URL.HORSE + horse_id)
+        if "pedigree" in get_type and not find.exists_horse_pedigree(horse_id):
+            urls.append(URL.HROSE_PED + horse_id)
+    prefetcher.submit(urls)
+    prefetcher.submit(revalidate_urls, revalidate=True)
+
+
+def fetch_horse_pages(fetcher, find, horse_id: str, get_type: list[str]):
+    """
+    馬のDB登録状況から必要なページだけを取得する
+    登録済みの馬の過去戦績は再検証し、変更がなければ取得しない
+    変更があった場合は、DBに格納済みの最新のレースIDを解析の起点として渡す
+
+    Returns
+    -------
+    (get_type, pages, known_race_id) | None
+        取得する情報の種類と、URLからHTMLへの辞書と、格納済みの最新のレースID。取得するものがなければNone
+    """
+    exist_horse_data = find.exists_horse_data(horse_id)
+    exist_horse_pedigree = find.exists_horse_pedigree(horse_id)
+    horse_url, pedigree_url = URL.HORSE + horse_id, URL.HROSE_PED + horse_id
+    pages = {}
+    known_race_id = None
+    get_type = [
+        t
+        for t in get_type
+        if not (t == "profile" and exist_horse_data)
+        and not (t == "pedigree" and exist_horse_pedigree)
+    ]
+    if "result" in get_type and exist_horse_data:
+        html = fetcher.fetch_if_modified(horse_url)
+        if html is None:
+            get_type.remove("result")
+        else:
+            pages[horse_url] = html
+            known_race_id = find.get_latest_result_race_id(horse_id)
+    if not get_type:
+        return None
+    if ("profile" in get_type or "result" in get_type) and horse_url not in pages:
+        pages[horse_url] = fetch_with_retry(fetcher, horse_url)
+    if "pedigree" in get_type:
+        pages[pedigree_url] = fetch_with_retry(fetcher, pedigree_url)
+    return get_type, pages, known_race_id
+
+
+def write_horse_record(insert, find, horse_id: str, record: dict):
+    """
+    parse_horse_pagesで解析した馬のデータをDBに格納する
+    """
+    if "profile" in record:
+        upsert_horse_profile(insert, horse_id, record["profile"])
+    if "pedigree" in record:
+        upsert_horse_pedigree(insert, horse_id, record["pedigree"])
+    if "result" in record and len(record["result"]) > 0:
+        formatted_result_data = format_horse_result(record["result"])
+        formatted_result_data["trainer_id"] = find.get_trainer_id_by_horse_id(horse_id)
+        upsert_horse_result(insert, horse_id, formatted_result_data)
+
+
+def upsert_many_horse_data(
+    driver,
+    mongo,
+    horse_ids: list[str],
+    get_type: list[str] = ["profile", "pedigree", "result"],
+    concurrency: int = URL.CONCURRENCY,
+    on_done=None,
+    processes: int = URL.PARSE_PROCESSES,
+):
+    """
+    複数の馬のデータを取得・解析・格納する
+    ページの取得はconcurrency件ずつ並行して行い、解析はprocesses個のプロセスで並列に行う。
+    DBへの書き込みは呼び出し元のスレッドで1件ずつ行う。
+
+    Returns
+    -------
+    driver, failed_horse_ids
+        失敗した馬IDのリスト
+    """
+    fetcher = as_fetcher(driver)
+    find = FindData(mongo)
+    insert = InsertData(mongo)
+    # 過去戦績を解析する馬のページ。格納が終わったら処理済みとして記録する
+    result_pages: dict[str, str] = {}
+
+    def _fetch(horse_id):
+        fetched = fetch_horse_pages(fetcher, find, horse_id, get_type)
+        if fetched is not None and "result" in fetched[0]:
+            result_pages[horse_id] = fetched[1][URL.HORSE + horse_id]
+        return fetched
+
+    def _write(horse_id, record):
+        write_horse_record(insert, find, horse_id, record)
+        if horse_id in result_pages:
+            fetcher.mark_processed(URL.HORSE + horse_id, result_pages[horse_id])
+
+    def _on_done(horse_id, error):
+        result_pages.pop(horse_id, None)
+        if error is not None:
+            # 次回の更新で取得し直すため、保存したページを破棄する
+            GetHorseData(fetcher, horse_id).invalidate()
+        if on_done is not None:
+            on_done(horse_id, error)
+
+    pipeline = ParsePipeline(
+        _fetch,
+        parse_horse_pages,
+        _write,
+        concurrency=concurrency,
+        processes=processes,
+    )
+    failed = pipeline.run(horse_ids, _on_done)
+    return fetcher, [horse_id for horse_id, _ in failed]
@@ -1,5 +1,6 @@
-from modules.scrape import GetHumanData
+from modules.scrape import GetHumanData, Crawler
 from modules.database import InsertData, FindData
+from modules.constants import URL
 
 
 def upsert_human_data(
@@ -7,9 +8,11 @@ def upsert_human_data(
     mongo,
     human_id: str,
     type: str,
+    force: bool = False,
 ):
     """
     騎手・調教師のプロフィールをDBに格納する
+    force=Trueの場合は、登録済みでも取得し直して書き込む
 
     Parameters
     ----------
@@ -21,21 +24,53 @@ def upsert_human_data(
         騎手・調教師ID
     type : str | "jockey" or "trainer"
         騎手か調教師か
+    force : bool
+        登録済みでも書き込むか
     """
     try:
         get_human_data = GetHumanData(driver)
         insert = InsertData(mongo)
         find = FindData(mongo)
         if type == "jockey":
-            if find.exists_jockey(human_id):
+            if find.exists_jockey(human_id) and not force:
                 return get_human_data.driver
             human_profile = get_human_data.get_jockey_profile(human_id)
             insert.upsert_jockey_profile(human_id, human_profile)
         elif type == "trainer":
-            if find.exists_trainer(human_id):
+            if find.exists_trainer(human_id) and not force:
                 return get_human_data.driver
             human_profile = get_human_data.get_trainer_profile(human_id)
             insert.upsert_trainer_profile(human_id, human_profile)
     except Exception as e:
         raise Exception(f"Error upserting human profile type={type} {human_id}: {e}")
     return get_human_data.driver
+
+
+def upsert_many_human_data(
+    driver,
+    mongo,
+    human_ids: list[str],
+    type: str,
+    concurrency: int = URL.CONCURRENCY,
+    on_done=None,
+):
+    """
+    複数の騎手・調教師のプロフィールを並行して取得してDBに格納する
+
+    Returns
+    -------
+    driver, failed_human_ids
+        失敗した騎手・調教師IDのリスト
+    """
+    crawler = Crawler(driver, concurrency)
+    results = crawler.map(
+        human_ids,
+        lambda human_id: upsert_human_data(driver, mongo, human_id, type),
+        on_done,
+    )
+    failed = [
+        human_id
+        for human_id, result in zip(human_ids, results)
+        if isinstance(result, Exception)
+    ]
+    return driver, failed
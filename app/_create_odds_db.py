@@ -0,0 +1,85 @@
+from modules.database import InsertData
+from modules.scrape import (
+    GetOddsData,
+    ParsePipeline,
+    as_fetcher,
+    fetch_with_retry,
+    parse_odds_pages,
+)
+from modules.constants import URL, RACEDATA
+import datetime
+import numpy as np
+
+
+def format_odds(race_id: str, odds: dict[str, np.ndarray]) -> dict:
+    """
+    馬券の種類ごとのオッズの配列を、oddsコレクションのドキュメントに整形する
+    配列はfloat32のバイト列と形で格納する(3連単でも1レース1ドキュメントに収まる)
+    """
+    document = {"_id": race_id, "updated_at": datetime.datetime.now()}
+    for odds_type, matrix in odds.items():
+        document[odds_type] = {
+            "shape": list(matrix.shape),
+            "data": matrix.astype("<f4").tobytes(),
+        }
+    return document
+
+
+def upsert_odds_data(
+    driver, mongo, race_id: str, odds_types: list[str] = list(RACEDATA.ODDS_TYPES)
+):
+    """
+    レースのオッズを取得してDBに格納する
+    """
+    get_odds_data = GetOddsData(driver, race_id)
+    try:
+        odds = get_odds_data.get_all_odds(odds_types)
+        InsertData(mongo).upsert_many_odds([format_odds(race_id, odds)])
+    except Exception as e:
+        # 次回の更新で取得し直すため、保存したページを破棄する
+        get_odds_data.invalidate()
+        raise Exception(f"Error upserting odds race_id={race_id}: {e}")
+    return get_odds_data.driver
+
+
+def upsert_many_odds_data(
+    driver,
+    mongo,
+    race_ids: list[str],
+    odds_types: list[str] = list(RACEDATA.ODDS_TYPES),
+    on_done=None,
+    concurrency: int = URL.CONCURRENCY,
+    processes: int = URL.PARSE_PROCESSES,
+):
+    """
+    複数のレースのオッズを取得・解析・格納する
+    ページの取得と解析はParsePipelineで並行して行い、DBへの書き込みは呼び出し元のスレッドで行う。
+
+    Returns
+    -------
+    driver, failed_race_ids
+        失敗したレースIDのリスト
+    """
+    fetcher = as_fetcher(driver)
+    insert = InsertData(mongo)
+
+    def _fetch(race_id):
+        urls = dict.fromkeys(URL.ODDS_PAGES[t] + race_id for t in odds_types)
+        return odds_types, {url: fetch_with_retry(fetcher, url) for url in urls}
+
+    def _on_done(race_id, error):
+        if error is not None:
+            # 次回の更新で取得し直すため、保存したページを破棄する
+            GetOddsData(fetcher, race_id).invalidate()
+        if on_done is not None:
+            on_done(race_id, error)
+
+    pipeline = ParsePipeline(
+        _fetch,
+        parse_odds_pages,
+        lambda race_id, odds: insert.upsert_many_odds([format_odds(race_id, odds)]),
+        concurrency=concurrency,
+        processes=processes,
+    )
+    failed = pipeline.run(race_ids, _on_done)
+    return fetcher, [race_id for race_id, _ in failed]
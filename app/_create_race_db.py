@@ -1,5 +1,12 @@
 from modules.database import InsertData, FindData
-from modules.scrape import GetPreData
+from modules.scrape import (
+    GetPreData,
+    ParsePipeline,
+    as_fetcher,
+    fetch_with_retry,
+    parse_shutuba_page,
+)
+from modules.constants import URL
 import pandas as pd
 
 
@@ -82,14 +89,25 @@ def upsert_pre_race(insert, pre_data, race_id: str):
         raise Exception(f"Error upserting pre race : {e}")
 
 
-def upsert_pre_race_shutuba(driver, mongo, race_id: str, force: bool = False):
+def upsert_pre_race_shutuba(
+    driver, mongo, race_id: str, force: bool = False, on_horse_ids=None
+):
     """
     レースの事前情報と出馬表を取得してDBに格納する
+    force=Trueの場合は、出馬表ページを再検証し、変更がなければ解析も書き込みもしない
+    on_horse_idsを渡した場合は、出馬表を解析した時点で出走馬のIDのリストを渡して呼ぶ(馬のページの先読み用)
     """
+    get_pre_data = GetPreData(driver, race_id)
     try:
         find = FindData(mongo)
         insert = InsertData(mongo)
-        get_pre_data = GetPreData(driver, race_id)
+
+        if (
+            force
+            and find.exists_pre_race(race_id)
+            and not get_pre_data.load_if_modified()
+        ):
+            return get_pre_data.driver
 
         # レースの事前情報をDBに格納
         if not find.exists_pre_race(race_id) or force:
@@ -98,6 +116,8 @@ def upsert_pre_race_shutuba(driver, mongo, race_id: str, force: bool = False):
 
         # 出馬表データをDBに一括挿入
         shutuba = get_pre_data.get_shutba_table()
+        if on_horse_ids is not None:
+            on_horse_ids(shutuba["horse_id"].tolist())
         if force:
             upsert_many_shutuba(insert, race_id, shutuba)
         else:
@@ -107,6 +127,100 @@ def upsert_pre_race_shutuba(driver, mongo, race_id: str, force: bool = False):
                 )
             ]
             upsert_many_shutuba(insert, race_id, to_insert)
+        # 格納が終わってから記録する。失敗した場合は次回も取得し直す
+        get_pre_data.mark_processed()
     except Exception as e:
+        # 次回の更新で取得し直すため、保存したページを破棄する
+        get_pre_data.invalidate()
         raise Exception(f"upserting pre race shutuba : {e}")
     return get_pre_data.driver
+
+
+def fetch_shutuba_page(fetcher, find, race_id: str, force: bool = True):
+    """
+    出馬表ページを取得する
+    force=Trueで登録済みのレースは再検証し、変更がなければNoneを返す
+    """
+    url = URL.NAR_SHUTUBA + race_id
+    if force and find.exists_pre_race(race_id):
+        html = fetcher.fetch_if_modified(url)
+        if html is None:
+            return None
+        return {url: html}
+    return {url: fetch_with_retry(fetcher, url)}
+
+
+def write_pre_race_shutuba(
+    insert, find, race_id: str, record: dict, force: bool = True, on_horse_ids=None
+):
+    """
+    parse_shutuba_pageで解析したレースの事前情報と出馬表をDBに格納する
+    """
+    if not find.exists_pre_race(race_id) or force:
+        upsert_pre_race(insert, record["pre_data"], race_id)
+    shutuba = record["shutuba"]
+    if force:
+        upsert_many_shutuba(insert, race_id, shutuba)
+    else:
+        to_insert = shutuba[
+            ~shutuba["馬番"].apply(lambda umaban: find.exists_shutuba(race_id, umaban))
+        ]
+        upsert_many_shutuba(insert, race_id, to_insert)
+    if on_horse_ids is not None:
+        on_horse_ids(shutuba["horse_id"].tolist())
+
+
+def upsert_many_pre_race_shutuba(
+    driver,
+    mongo,
+    race_ids: list[str],
+    force: bool = True,
+    on_horse_ids=None,
+    on_done=None,
+    concurrency: int = URL.CONCURRENCY,
+    processes: int = URL.PARSE_PROCESSES,
+):
+    """
+    複数のレースの事前情報と出馬表を取得・解析・格納する
+    ページの取得と解析はParsePipelineで並行して行い、DBへの書き込みは呼び出し元のスレッドで行う。
+    on_done(race_id, error)は1レースの書き込みが終わるか失敗するたびに呼ばれる。
+
+    Returns
+    -------
+    driver, failed_race_ids
+        失敗したレースIDのリスト
+    """
+    fetcher = as_fetcher(driver)
+    find = FindData(mongo)
+    insert = InsertData(mongo)
+    # 解析する出馬表ページ。格納が終わったら処理済みとして記録する
+    fetched_pages: dict[str, dict] = {}
+
+    def _fetch(race_id):
+        pages = fetch_shutuba_page(fetcher, find, race_id, force)
+        if pages is not None:
+            fetched_pages[race_id] = pages
+        return pages
+
+    def _write(race_id, record):
+        write_pre_race_shutuba(insert, find, race_id, record, force, on_horse_ids)
+        for url, html in fetched_pages.get(race_id, {}).items():
+            fetcher.mark_processed(url, html)
+
+    def _on_done(race_id, error):
+        fetched_pages.pop(race_id, None)
+        if error is not None:
+            # 次回の更新で取得し直すため、保存したページを破棄する
+            GetPreData(fetcher, race_id).invalidate()
+        if on_done is not None:
+            on_done(race_id, error)
+
+    pipeline = ParsePipeline(
+        _fetch,
+        parse_shutuba_page,
+        _write,
+        concurrency=concurrency,
+        processes=processes,
+    )
+    failed = pipeline.run(race_ids, _on_done)
+    return fetcher, [race_id for race_id, _ in failed]
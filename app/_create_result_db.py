@@ -0,0 +1,123 @@
+from modules.database import InsertData
+from modules.scrape import (
+    GetResultData,
+    ParsePipeline,
+    as_fetcher,
+    fetch_with_retry,
+    parse_result_page,
+)
+from modules.constants import URL
+from app._create_race_db import upsert_many_shutuba
+import pandas as pd
+
+
+def format_result_order(result: pd.DataFrame, passing: dict, race_id: str) -> list:
+    """
+    レース結果ページの着順を、resultコレクションの形式に整形する
+    """
+    try:
+        df = pd.DataFrame(
+            {
+                "race_id": race_id,
+                "umaban": result["馬番"],
+                "order_of_finish": result["着順"],
+                "time": result["タイム"],
+                "difference": result["着差"],
+                "passing": result["馬番"].map(passing).fillna(""),
+                "up": result["後3F"],
+                "popularity": result["人気"],
+                "odds": result["単勝オッズ"],
+            }
+        )
+        return df.to_dict(orient="records")
+    except Exception as e:
+        raise Exception(f"Error formatting result order race_id={race_id}: {e}")
+
+
+def write_result_record(insert, race_id: str, record: dict):
+    """
+    parse_result_pageで解析したレース結果をDBに格納する
+    着順と通過順はresult、馬・騎手・調教師はshutuba、払戻・コーナー通過順・ラップタイムは
+    payout, corner, lapにそれぞれ一括で格納する
+    """
+    try:
+        insert.upsert_many_result(
+            format_result_order(record["result"], record["passing"], race_id)
+        )
+        upsert_many_shutuba(insert, race_id, record["result"])
+        if record["payouts"]:
+            insert.upsert_many_payout([{"_id": race_id, **record["payouts"]}])
+        if record["corners"]:
+            insert.upsert_many_corner([{"_id": race_id, "corners": record["corners"]}])
+        if record["laps"]:
+            insert.upsert_many_lap([{"_id": race_id, **record["laps"]}])
+    except Exception as e:
+        raise Exception(f"Error upserting result data race_id={race_id}: {e}")
+
+
+def upsert_result_data(driver, mongo, race_id: str):
+    """
+    レース結果ページを取得・解析してDBに格納する
+    """
+    get_result_data = None
+    try:
+        get_result_data = GetResultData(driver, race_id)
+        write_result_record(
+            InsertData(mongo),
+            race_id,
+            {
+                "result": get_result_data.result,
+                "passing": get_result_data.get_passing(),
+                "payouts": get_result_data.payouts,
+                "corners": get_result_data.corners,
+                "laps": get_result_data.laps,
+            },
+        )
+    except Exception as e:
+        # 次回の更新で取得し直すため、保存したページを破棄する
+        if get_result_data is not None:
+            get_result_data.invalidate()
+        raise Exception(f"Error upserting result data race_id={race_id}: {e}")
+    return get_result_data.driver
+
+
+def upsert_many_result_data(
+    driver,
+    mongo,
+    race_ids: list[str],
+    on_done=None,
+    concurrency: int = URL.CONCURRENCY,
+    processes: int = URL.PARSE_PROCESSES,
+):
+    """
+    複数のレース結果を取得・解析・格納する
+    ページの取得と解析はParsePipelineで並行して行い、DBへの書き込みは呼び出し元のスレッドで行う。
+
+    Returns
+    -------
+    driver, failed_race_ids
+        失敗したレースIDのリスト
+    """
+    fetcher = as_fetcher(driver)
+    insert = InsertData(mongo)
+
+    def _fetch(race_id):
+        url = URL.NAR_RESULT + race_id
+        return {url: fetch_with_retry(fetcher, url)}
+
+    def _on_done(race_id, error):
+        if error is not None:
+            # 次回の更新で取得し直すため、保存したページを破棄する
+            fetcher.invalidate(URL.NAR_RESULT + race_id)
+        if on_done is not None:
+            on_done(race_id, error)
+
+    pipeline = ParsePipeline(
+        _fetch,
+        parse_result_page,
+        lambda race_id, record: write_result_record(insert, race_id, record),
+        concurrency=concurrency,
+        processes=processes,
+    )
+    failed = pipeline.run(race_ids, _on_done)
+    return fetcher, [race_id for race_id, _ in failed]
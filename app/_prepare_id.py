@@ -1,12 +1,90 @@
-from modules.scrape import RaceIdGetter, WebDriver
+from modules.scrape import (
+    RaceIdGetter,
+    RoutingFetcher,
+    SeleniumFetcher,
+    CachedFetcher,
+    RecordingFetcher,
+    ReplayFetcher,
+    PageArchive,
+    Prefetcher,
+    WebDriverPool,
+)
 from modules.database import ConnectMongoDB, FindData
-from modules.constants import RACEDATA
+from modules.constants import RACEDATA, URL
+import contextvars
 import datetime
 import re
 
+# 更新処理ごとのWebDriverPool。Streamlitのセッションは別々のスレッドで実行されるため、
+# コンテキスト変数で分けて、他のセッションが使っているChromeを終了しないようにする
+_run_pool: contextvars.ContextVar[WebDriverPool | None] = contextvars.ContextVar(
+    "run_pool", default=None
+)
 
-def get_driver():
-    return WebDriver().driver()
+
+def get_run_pool() -> WebDriverPool:
+    """
+    この更新処理で使うWebDriverPoolを取得する。close_browsersを呼ぶまで同じものを使う。
+    起動できるChromeの数は、プロセス内で共有するChromeManagerで制限される。
+    """
+    pool = _run_pool.get()
+    if pool is None:
+        pool = WebDriverPool()
+        _run_pool.set(pool)
+    return pool
+
+
+def get_driver(
+    use_selenium: bool = False,
+    use_cache: bool = True,
+    replay_dir: str = URL.REPLAY_DIR,
+    record_dir: str = URL.RECORD_DIR,
+):
+    """
+    ページ取得用のFetcherを取得する
+    静的なページはHTTPで取得し、JavaScriptが必要なページのみSeleniumで取得する。
+    use_selenium=Trueの場合は、すべてのページをSeleniumで取得する。
+    Chromeはこの更新処理のWebDriverPool(get_run_pool)から借りるため、呼び出すたびに起動はしない。
+    use_cache=Trueの場合は、有効期限内のページをディスクキャッシュから取得する。
+    replay_dirを指定した場合は、ネットワークにアクセスせずにアーカイブからページを取得する。
+    record_dirを指定した場合は、キャッシュから取得したページも含めて、取得したページをアーカイブに保存する。
+    URL.PAGE_ARCHIVEがTrueの場合は、ネットワークから取得したページだけを長期アーカイブに追記する。
+    """
+    if replay_dir:
+        return ReplayFetcher(replay_dir)
+    selenium = SeleniumFetcher(pool=get_run_pool())
+    if use_selenium:
+        fetcher = selenium
+    else:
+        fetcher = RoutingFetcher(selenium=selenium)
+    if URL.PAGE_ARCHIVE:
+        fetcher = RecordingFetcher(fetcher, PageArchive())
+    if use_cache:
+        fetcher = CachedFetcher(fetcher)
+    # 再生できるよう、キャッシュから取得したページも記録する
+    if record_dir:
+        fetcher = RecordingFetcher(fetcher, record_dir)
+    return fetcher
+
+
+def get_prefetcher() -> Prefetcher:
+    """
+    ページキャッシュを温めるPrefetcherを取得する
+    キャッシュはプロセス内で共有されるため、先読みしたページはget_driver()で取得したFetcherから使える。
+    """
+    return Prefetcher(get_driver())
+
+
+def close_browsers():
+    """
+    この更新処理で起動したChromeを終了する。更新処理の終わりに呼ぶ。
+    他のセッションが使っているChromeは終了しない。
+    プロセス全体の終了処理(終了し忘れたものや残ったChromeの強制終了)はatexitで行われる。
+    """
+    pool = _run_pool.get()
+    if pool is not None:
+        pool.close()
+        _run_pool.set(None)
 
 
 def get_mongo_client():
@@ -38,9 +116,9 @@ def get_race_ids(start_date: datetime.date, end_date: datetime.date):
     """
     日付(期間)からレースIDを取得する
     """
-    driver = WebDriver().driver()
-    race_id_getter = RaceIdGetter(driver)
-    return race_id_getter.get_race_ids(start_date, end_date)
+    with get_driver() as driver:
+        race_id_getter = RaceIdGetter(driver)
+        return race_id_getter.get_race_ids(start_date, end_date)
 
 
 def get_local_race_ids(driver, race_id: str):
@@ -0,0 +1,98 @@
+import multiprocessing
+
+from modules.constants import URL
+from modules.database import ConnectMongoDB
+from modules.scrape import PageArchive, ReplayFetcher, get_page_type
+from app._create_horse_db import upsert_horse_data
+from app._create_human_db import upsert_human_data
+from app._create_race_db import upsert_pre_race_shutuba
+
+# ワーカープロセスごとに作るMongoDBの接続とFetcher
+_worker_mongo = None
+_worker_fetcher = None
+
+
+def _init_worker(directory: str):
+    global _worker_mongo, _worker_fetcher
+    _worker_mongo = ConnectMongoDB().client
+    _worker_fetcher = ReplayFetcher(PageArchive(directory))
+
+
+def _reparse(job: tuple) -> tuple:
+    """
+    1件のIDをアーカイブのページから解析してDBに格納する。
+    """
+    page_type, id, get_type = job
+    try:
+        if page_type == "shutuba":
+            upsert_pre_race_shutuba(_worker_fetcher, _worker_mongo, id, force=True)
+        elif page_type == "horse":
+            upsert_horse_data(_worker_fetcher, _worker_mongo, id, get_type, force=True)
+        else:
+            upsert_human_data(_worker_fetcher, _worker_mongo, id, page_type, force=True)
+    except Exception as e:
+        return job, str(e)
+    return job, None
+
+
+def _get_id(url: str, page_type: str) -> str:
+    return url[len(URL.PAGE_TYPES[page_type]) :].strip("/")
+
+
+def create_reparse_jobs(
+    archive: PageArchive, page_types: list[str] = None
+) -> list[tuple]:
+    """
+    アーカイブに保存されているページから、再解析するジョブ(page_type, id, get_type)を作る。
+    馬のページと血統ページは、同じ馬の1つのジョブにまとめる。
+    """
+    page_types = page_types or ["shutuba", "horse", "pedigree", "jockey", "trainer"]
+    jobs = {}
+    for url, _ in archive.entries(page_types):
+        page_type = get_page_type(url)
+        id = _get_id(url, page_type)
+        if page_type in ("horse", "pedigree"):
+            get_type = jobs.setdefault(("horse", id), [])
+            get_type += ["profile", "result"] if page_type == "horse" else ["pedigree"]
+        else:
+            jobs[(page_type, id)] = []
+    return [(page_type, id, get_type) for (page_type, id), get_type in jobs.items()]
+
+
+def reparse_archive(
+    page_types: list[str] = None,
+    processes: int = None,
+    directory: str = URL.PAGE_ARCHIVE_DIR,
+    on_done=None,
+) -> list[tuple]:
+    """
+    長期アーカイブに保存したページを、ネットワークにアクセスせずに解析し直してDBに格納する。
+    解析処理を変更したときに、過去のページをまとめて取り込み直すために使う。
+
+    Parameters
+    ----------
+    page_types : list[str]
+        再解析するページの種類(shutuba, horse, pedigree, jockey, trainer)
+    processes : int
+        並列に解析するプロセス数。Noneの場合はCPUの数
+    on_done : Callable
+        1件終わるごとに(job, error)で呼ばれる
+
+    Returns
+    -------
+    failed
+        失敗したジョブとエラーメッセージのリスト
+    """
+    jobs = create_reparse_jobs(PageArchive(directory), page_types)
+    failed = []
+    # ParsePipelineと同じく、ブラウザやロックを子プロセスに引き継がないようにspawnで起動する
+    context = multiprocessing.get_context(URL.PARSE_MP_CONTEXT)
+    with context.Pool(
+        processes, initializer=_init_worker, initargs=(directory,)
+    ) as pool:
+        for job, error in pool.imap_unordered(_reparse, jobs, chunksize=16):
+            if error is not None:
+                failed.append((job, error))
+            if on_done is not None:
+                on_done(job, error)
+    return failed
@@ -102,6 +102,51 @@ class RACEDATA(metaclass=ConstantMeta):
         "人気",
     ]
 
+    # レース結果ページの着順の列名
+    RESULT_COLUMNS: list[str] = [
+        "着順",
+        "枠",
+        "馬番",
+        "馬名",
+        "性齢",
+        "斤量",
+        "騎手",
+        "タイム",
+        "着差",
+        "人気",
+        "単勝オッズ",
+        "後3F",
+        "厩舎",
+        "馬体重(増減)",
+    ]
+
+    # レース結果ページの払戻の行のクラス名と、payoutコレクションのキー
+    PAYOUT_TYPES: dict = {
+        "Tansho": "tansho",
+        "Fukusho": "fukusho",
+        "Wakuren": "wakuren",
+        "Umaren": "umaren",
+        "Wide": "wide",
+        "Umatan": "umatan",
+        "Fuku3": "sanrenpuku",
+        "Tan3": "sanrentan",
+    }
+
+    # オッズの最大の馬番。オッズの配列は馬券の種類によらず、各軸の長さをこの値にする
+    MAX_UMABAN: int = 18
+
+    # オッズのページの馬券の種類ごとの(セルのidの番号, 組み合わせの頭数, 下限と上限のオッズか)
+    # セルのidは"odds-{番号}-{2桁の馬番を組み合わせの順に並べたもの}"
+    ODDS_TYPES: dict = {
+        "tansho": (1, 1, False),
+        "fukusho": (2, 1, True),
+        "umaren": (4, 2, False),
+        "wide": (5, 2, True),
+        "umatan": (6, 2, False),
+        "sanrenpuku": (7, 3, False),
+        "sanrentan": (8, 3, False),
+    }
+
     # レースページの事前情報のキー
     TEMP_RACE_INFO_KEYS: list[str] = [
         "race_name",
@@ -130,6 +175,14 @@ class RACEDATA(metaclass=ConstantMeta):
     # 馬ページ #
     ###########
 
+    # 血統表の祖先のキー(父はf、母はmを世代の数だけ並べる)
+    # 5世代・62頭を、世代ごとに父方から並べた順。pedigreeコレクションのancestorsはこの順に馬IDを格納する
+    PEDIGREE_KEYS: tuple = tuple(
+        "".join("fm"[int(bit)] for bit in format(num, f"0{generation}b"))
+        for generation in range(1, 6)
+        for num in range(2**generation)
+    )
+
     # 馬ページのプロフィールの列名
     HORSE_PROFILE_COLUMNS: list[str] = [
         "生年月日",
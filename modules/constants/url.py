@@ -1,4 +1,5 @@
 from modules.constants.metaclass import ConstantMeta
+import os
 
 
 class URL(metaclass=ConstantMeta):
@@ -8,9 +9,108 @@ class URL(metaclass=ConstantMeta):
 
     # URLを取得するための待機時間
     WAIT_TIME: float = 3
+    # リトライ回数と、指数バックオフの初回・上限の待機時間
     RETRY_COUNT: int = 2
+    RETRY_BASE_WAIT: float = 5
     RETRY_WAIT_TIME: int = 60
-    CACHE_SIZE: int = 3
+    # ホストごとのサーキットブレーカー（連続して失敗した回数と、止める秒数）
+    BREAKER_THRESHOLD: int = 5
+    BREAKER_COOLDOWN: float = 120
+    # 半開状態で、試しのリクエストの結果を待つスレッドが確認する間隔（秒）
+    BREAKER_POLL_INTERVAL: float = 0.5
+
+    # プロセス内で共有するページのメモリキャッシュの上限(バイト)
+    MEMORY_CACHE_BYTES: int = 256 * 1024 * 1024
+
+    # ページのディスクキャッシュ
+    PAGE_CACHE_DIR: str = "cache/pages"
+    # ページの種類ごとの有効期限(秒)。None: 期限なし / 0: キャッシュしない
+    PAGE_CACHE_TTL: dict = {
+        "calendar": None,  # 過去の月のみ。今月以降はPAGE_CACHE_TTL_RECENT
+        "result": None,  # 終了したレースのみ。当日以降はPAGE_CACHE_TTL_RECENT
+        "shutuba": 10 * 60,
+        "odds": 0,
+        "horse": 24 * 60 * 60,
+        "pedigree": None,
+        "jockey": 24 * 60 * 60,
+        "trainer": 24 * 60 * 60,
+    }
+    PAGE_CACHE_TTL_RECENT: float = 10 * 60
+    # 再検証してからこの秒数以内のページは、再検証し直さない(先読みで再検証したページなど)
+    REVALIDATE_MAX_AGE: float = 10 * 60
+    # 処理済みのページと比べるときに使う、ページの種類ごとの内容の部分(スクレイパーが読む要素)
+    # 広告・トークン・表示日時など、それ以外の部分だけが変わった場合は変更とみなさない
+    PAGE_CONTENT_SELECTORS: dict = {
+        "horse": "div.horse_title h1, div.db_prof_area_02, table.db_h_race_results",
+        "shutuba": "div.RaceList_Item02, table.ShutubaTable",
+    }
+    PAGE_CONTENT_SELECTOR_DEFAULT: str = "#contents"
+
+    # 取得したページを保存するアーカイブ(RECORD_DIR)と、
+    # ネットワークにアクセスせずにアーカイブから再生する場合のアーカイブ(REPLAY_DIR)
+    RECORD_DIR: str = os.environ.get("NAR_DB_RECORD_DIR", "")
+    REPLAY_DIR: str = os.environ.get("NAR_DB_REPLAY_DIR", "")
+
+    # ネットワークから取得したすべてのページを保存する長期アーカイブ
+    PAGE_ARCHIVE: bool = True
+    PAGE_ARCHIVE_DIR: str = "cache/archive"
+    PAGE_ARCHIVE_SEGMENT_BYTES: int = 256 * 1024 * 1024
+
+    # ホストごとのリクエスト数の上限（WAIT_TIMEに1回）と同時接続数
+    # REQUEST_BURSTが1の場合、リクエストの間隔は必ずWAIT_TIME以上空く
+    REQUESTS_PER_SECOND: float = 1 / WAIT_TIME
+    REQUEST_BURST: int = 1
+    CONCURRENCY: int = 4
+    # リクエスト間隔をロックファイルで他のプロセスと共有する
+    # RATE_LIMIT_DIRが空の場合は一時ディレクトリを使う
+    SHARED_RATE_LIMIT: bool = True
+    RATE_LIMIT_DIR: str = ""
+
+    # 一括取得で、ページを解析するプロセス数と、解析待ちのページ数の上限
+    PARSE_PROCESSES: int = max((os.cpu_count() or 1) - 1, 1)
+    PARSE_QUEUE_SIZE: int = 32
+    # 解析プロセスの開始方法。取得のスレッドが動いている中でforkすると、
+    # スレッドが持っていたロックごと複製されてデッドロックするおそれがあるため、forkは使わない
+    PARSE_MP_CONTEXT: str = "spawn"
+
+    # HTMLの解析に使うパーサー(lxml / html.parser / html5lib)
+    HTML_PARSER: str = os.environ.get("NAR_DB_HTML_PARSER", "lxml")
+    # 指定した場合は、このパーサーでも解析して、取り出す内容に違いがあればログに出す
+    COMPARE_HTML_PARSER: str = os.environ.get("NAR_DB_COMPARE_HTML_PARSER", "")
+
+    # WebDriverPoolの設定
+    DRIVER_POOL_SIZE: int = 2
+    DRIVER_MAX_PAGES: int = 200
+    DRIVER_MAX_RSS_MB: int = 1024
+
+    # ChromeManagerの設定（同時に起動できるChromeの上限と、空きを待つ秒数）
+    MAX_BROWSERS: int = 4
+    BROWSER_LAUNCH_TIMEOUT: int = 300
+
+    # Chromeのプロファイルとディスクキャッシュを、起動し直しても使い回す設定
+    PERSISTENT_BROWSER_PROFILE: bool = True
+    BROWSER_PROFILE_DIR: str = "cache/chrome"
+    BROWSER_DISK_CACHE_BYTES: int = 256 * 1024 * 1024
+    # 使われていないプロファイルのキャッシュがこれを超えたら削除する
+    BROWSER_PROFILE_MAX_BYTES: int = 512 * 1024 * 1024
+    BROWSER_PROFILE_CLEANUP_INTERVAL: int = 10 * 60
+
+    # 1つのChromeで並行して読み込むタブの設定
+    BROWSER_TABS: int = 4
+    TAB_LOAD_TIMEOUT: float = 60
+    TAB_POLL_INTERVAL: float = 0.1
+
+    # HTTPでの取得設定
+    HTTP_TIMEOUT: float = 30
+    HTTP_POOL_SIZE: int = CONCURRENCY
+
+    # 出馬表の取得中に、出走馬のページを先読みするスレッド数
+    PREFETCH_WORKERS: int = 2
+    DEFAULT_ENCODING: str = "EUC-JP"
+    USER_AGENT: str = (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        + "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/88.0.4324.150 Safari/537.36"
+    )
 
     # ログインページ
     LOGIN_URL: str = "https://regist.netkeiba.com/account/?pid=login"
@@ -36,6 +136,17 @@ class URL(metaclass=ConstantMeta):
     NAR_3FUKU: str = f"{NAR_DOMAIN}odds/index.html?type=b7&race_id="
     NAR_3TAN: str = f"{NAR_DOMAIN}odds/index.html?type=b8&race_id="
 
+    # 馬券の種類ごとのオッズのページ(単勝と複勝は同じページ)
+    ODDS_PAGES: dict = {
+        "tansho": NAR_TAN,
+        "fukusho": NAR_TAN,
+        "umaren": NAR_2FUKU,
+        "wide": NAR_WIDE,
+        "umatan": NAR_2TAN,
+        "sanrenpuku": NAR_3FUKU,
+        "sanrentan": NAR_3TAN,
+    }
+
     # 馬のページ
     HORSE: str = f"{DB_DOMAIN}horse/"
     HROSE_PED: str = f"{DB_DOMAIN}horse/ped/"
@@ -45,3 +156,90 @@ class URL(metaclass=ConstantMeta):
 
     # 調教師のページ
     TRAINER: str = f"{DB_DOMAIN}trainer/"
+
+    # ページの種類とURLの前方一致
+    PAGE_TYPES: dict = {
+        "calendar": NAR_CALENDER,
+        "result": NAR_RESULT,
+        "shutuba": NAR_SHUTUBA,
+        "odds": f"{NAR_DOMAIN}odds/",
+        "horse": HORSE,
+        "pedigree": HROSE_PED,
+        "jockey": JOCKEY,
+        "trainer": TRAINER,
+    }
+
+    # JavaScriptで描画されるため、Seleniumで取得するページの種類
+    SELENIUM_PAGE_TYPES: tuple = ("odds",)
+
+    # DevToolsでブロックするURLのパターン
+    BLOCK_STATIC_ASSETS: list[str] = [
+        "*.css",
+        "*.css?*",
+        "*.png",
+        "*.png?*",
+        "*.jpg",
+        "*.jpg?*",
+        "*.jpeg",
+        "*.gif",
+        "*.gif?*",
+        "*.svg",
+        "*.webp",
+        "*.ico",
+        "*.woff",
+        "*.woff2",
+        "*.ttf",
+        "*.otf",
+    ]
+    BLOCK_TRACKERS: list[str] = [
+        "*doubleclick.net*",
+        "*googlesyndication.com*",
+        "*googletagmanager.com*",
+        "*googletagservices.com*",
+        "*google-analytics.com*",
+        "*adservice.google.*",
+        "*amazon-adsystem.com*",
+        "*criteo.*",
+        "*facebook.net*",
+        "*yahoo.co.jp/*ads*",
+        "*yjtag.jp*",
+        "*microad.*",
+    ]
+    BLOCK_SCRIPTS: list[str] = ["*.js", "*.js?*"]
+    # HTMLだけを読むページ用（メインのHTML以外をすべてブロックする）
+    BLOCK_HTML_ONLY: list[str] = BLOCK_STATIC_ASSETS + BLOCK_TRACKERS + BLOCK_SCRIPTS
+
+    # ページの種類ごとにブロックするURLのパターン
+    # オッズはJavaScriptで描画されるため、スクリプトはブロックしない
+    BLOCKED_URL_PATTERNS: dict = {
+        "odds": BLOCK_STATIC_ASSETS + BLOCK_TRACKERS,
+    }
+
+    # ドライバーの読み込み戦略。読み込みの完了はページの種類ごとに待つ
+    DRIVER_PAGE_LOAD_STRATEGY: str = "none"
+
+    # ページの種類ごとの読み込み戦略（normal / eager / none）
+    # 静的な表だけを読むページはloadイベントを待たない
+    PAGE_LOAD_STRATEGY: dict = {
+        "calendar": "eager",
+        "result": "eager",
+        "shutuba": "eager",
+        "odds": "normal",
+        "horse": "eager",
+        "pedigree": "eager",
+        "jockey": "eager",
+        "trainer": "eager",
+    }
+
+    # ページの種類ごとに、読み込みが完了したとみなす要素のCSSセレクター
+    READY_TIMEOUT: float = 10
+    READY_SELECTORS: dict = {
+        "calendar": "div.RaceKaisaiBox",
+        "result": "#All_Result_Table",
+        "shutuba": "table.ShutubaTable",
+        "odds": "table.RaceOdds_HorseList_Table, table.Odds_Table",
+        "horse": "div.db_prof_area_02",
+        "pedigree": "table.blood_table",
+        "jockey": "div.Name",
+        "trainer": "div.Name",
+    }
@@ -34,6 +34,7 @@ class ConnectMongoDB:
     ):
         """
         インデックスを作成する
+        レース結果ページから取得するpayout, corner, lapとオッズのoddsは、格納済みの場合だけ指定する
         """
         _valid_collection = list(
             set(create_collection) - set(self.get_database().list_collection_names())
@@ -74,5 +75,17 @@ class ConnectMongoDB:
             if "pre_race" in create_collection:
                 pre_race_collection = self.get_collection(self.db_name, "pre_race")
                 pre_race_collection.create_index(keys="_id", name="pre_race_index")
+            if "payout" in create_collection:
+                payout_collection = self.get_collection(self.db_name, "payout")
+                payout_collection.create_index(keys="_id", name="payout_index")
+            if "corner" in create_collection:
+                corner_collection = self.get_collection(self.db_name, "corner")
+                corner_collection.create_index(keys="_id", name="corner_index")
+            if "lap" in create_collection:
+                lap_collection = self.get_collection(self.db_name, "lap")
+                lap_collection.create_index(keys="_id", name="lap_index")
+            if "odds" in create_collection:
+                odds_collection = self.get_collection(self.db_name, "odds")
+                odds_collection.create_index(keys="_id", name="odds_index")
         except Exception as e:
             raise Exception(f"Error in create_index: {e}")
@@ -2,7 +2,9 @@ from pymongo import MongoClient
 from pymongo.errors import PyMongoError
 import datetime
 import pandas as pd
+import numpy as np
 from modules.database import ConnectMongoDB
+from modules.constants import RACEDATA
 
 
 class FindData:
@@ -235,6 +237,50 @@ class FindData:
                 f"Error checking existence of result after date {date} for horse ID {horse_id}: {e}"
             )
 
+    def get_latest_result_race_id(self, horse_id: str) -> str | None:
+        """
+        特定の馬IDについて、着順が格納済みのレースのうち最新のレースIDを取得する。
+        着順のないレース(出走前に格納したレースなど)は含まない。
+        """
+        try:
+            pipeline = [
+                {"$match": {"horse_id": horse_id}},
+                {
+                    "$lookup": {
+                        "from": "result",
+                        "let": {"race_id": "$race_id", "umaban": "$umaban"},
+                        "pipeline": [
+                            {
+                                "$match": {
+                                    "$expr": {
+                                        "$and": [
+                                            {"$eq": ["$race_id", "$$race_id"]},
+                                            {"$eq": ["$umaban", "$$umaban"]},
+                                        ]
+                                    }
+                                }
+                            },
+                            {"$project": {"order_of_finish": 1}},
+                        ],
+                        "as": "race_results",
+                    }
+                },
+                {"$unwind": "$race_results"},
+                {"$match": {"race_results.order_of_finish": {"$nin": [None, ""]}}},
+                {"$project": {"race_id": 1}},
+            ]
+            race_ids = [
+                shutuba["race_id"] for shutuba in self.db["shutuba"].aggregate(pipeline)
+            ]
+            # レースIDはyyyyllmmddrrの形式のため、日付の部分で比べる
+            return max(
+                race_ids, key=lambda race_id: race_id[:4] + race_id[6:], default=None
+            )
+        except PyMongoError as e:
+            raise PyMongoError(
+                f"Error finding latest result race ID for horse ID {horse_id}: {e}"
+            )
+
     def exists_horse_pedigree(self, horse_id: str) -> bool:
         """
         特定の馬IDがpedigreeに存在するか確認する。
@@ -244,6 +290,21 @@ class FindData:
         except PyMongoError as e:
             raise PyMongoError(f"Error checking existence of horse ID {horse_id}: {e}")
 
+    def get_horse_pedigree(self, horse_id: str) -> dict:
+        """
+        特定の馬の血統を、血統のキー(f, m, ff, ...)から祖先の馬IDへの辞書で取得する。
+        キーごとのフィールドで格納された古い形式のドキュメントもそのまま読める。
+        """
+        try:
+            document = self.db["pedigree"].find_one({"_id": horse_id}, {"_id": 0})
+            if document is None:
+                return {}
+            if "ancestors" in document:
+                return dict(zip(RACEDATA.PEDIGREE_KEYS, document["ancestors"]))
+            return document
+        except PyMongoError as e:
+            raise PyMongoError(f"Error finding pedigree of horse ID {horse_id}: {e}")
+
     def check_documents_existence(
         self, collection: str, query_list: list[dict]
     ) -> list[dict]:
@@ -309,6 +370,24 @@ class FindData:
         except PyMongoError as e:
             raise PyMongoError(f"Error finding pre race data for {race_id}: {e}")
 
+    def find_odds(self, race_id: str) -> dict[str, np.ndarray]:
+        """
+        特定のレースIDのオッズを、馬券の種類ごとの配列で取得する。
+        """
+        try:
+            document = self.db["odds"].find_one({"_id": race_id}, {"_id": 0})
+            if document is None:
+                return {}
+            return {
+                odds_type: np.frombuffer(odds["data"], dtype="<f4").reshape(
+                    odds["shape"]
+                )
+                for odds_type, odds in document.items()
+                if isinstance(odds, dict)
+            }
+        except PyMongoError as e:
+            raise PyMongoError(f"Error finding odds for {race_id}: {e}")
+
     def find_shutuba(self, race_id: str) -> pd.DataFrame:
         """
         レースIDに基づいて、レース情報と出馬表情報を結合して取得する。
@@ -131,12 +131,16 @@ class InsertData:
         data = {k: v for k, v in data.items() if v != ""}
         self.upsert_document("horse", {"_id": horse_id}, data)
 
-    def upsert_horse_pedigree(self, horse_id, pedigree_data):
+    def upsert_horse_pedigree(self, horse_id, pedigree_data: list[str]):
         """
         馬の血統データをデータベースに挿入する
+        祖先の馬IDをRACEDATA.PEDIGREE_KEYSの順に並べた配列(ancestors)だけを格納し、
+        キーごとのフィールドで格納された古い形式のドキュメントは置き換える
         """
         try:
-            self.upsert_document("pedigree", {"_id": horse_id}, pedigree_data)
+            self.db["pedigree"].replace_one(
+                {"_id": horse_id}, {"ancestors": list(pedigree_data)}, upsert=True
+            )
         except PyMongoError as e:
             raise PyMongoError(f"Error in upserting horse pedigree data: {e}")
 
@@ -178,3 +182,27 @@ class InsertData:
         複数のレース結果データをデータベースに挿入する
         """
         self.upsert_many_documents("result", insert_data)
+
+    def upsert_many_payout(self, insert_data: list):
+        """
+        複数のレースの払戻をデータベースに挿入する
+        """
+        self.upsert_many_documents("payout", insert_data)
+
+    def upsert_many_corner(self, insert_data: list):
+        """
+        複数のレースのコーナー通過順をデータベースに挿入する
+        """
+        self.upsert_many_documents("corner", insert_data)
+
+    def upsert_many_lap(self, insert_data: list):
+        """
+        複数のレースのラップタイムをデータベースに挿入する
+        """
+        self.upsert_many_documents("lap", insert_data)
+
+    def upsert_many_odds(self, insert_data: list):
+        """
+        複数のレースのオッズをデータベースに挿入する
+        """
+        self.upsert_many_documents("odds", insert_data)
@@ -1,6 +1,43 @@
-from modules.scrape.webdriver import WebDriver
+from modules.scrape.webdriver import (
+    WebDriver,
+    WebDriverPool,
+    ChromeManager,
+    get_chrome_manager,
+    TabGroup,
+    get_driver_pool,
+)
+from modules.scrape.fetcher import (
+    Fetcher,
+    HttpFetcher,
+    SeleniumFetcher,
+    RoutingFetcher,
+    as_fetcher,
+)
+from modules.scrape.page_type import get_page_type
+from modules.scrape.html_parser import make_soup
+from modules.scrape.single_flight import SingleFlight
+from modules.scrape.prefetch import Prefetcher
+from modules.scrape.pipeline import ParsePipeline
+from modules.scrape.replay import HtmlArchive, PageSet, RecordingFetcher, ReplayFetcher
+from modules.scrape.page_archive import PageArchive
+from modules.scrape.retry import (
+    FetchError,
+    ParseError,
+    PageNotFoundError,
+    RetryPolicy,
+    CircuitBreaker,
+    fetch_with_retry,
+)
+from modules.scrape.page_cache import (
+    DiskPageCache,
+    MemoryPageCache,
+    CachedFetcher,
+    get_memory_cache,
+)
+from modules.scrape.crawler import Crawler
 from modules.scrape.get_race_ids import RaceIdGetter
-from modules.scrape.get_pre_data import GetPreData
-from modules.scrape.get_result_data import GetResultData
-from modules.scrape.get_horse_data import GetHorseData
+from modules.scrape.get_pre_data import GetPreData, parse_shutuba_page
+from modules.scrape.get_result_data import GetResultData, parse_result_page
+from modules.scrape.get_odds_data import GetOddsData, parse_odds_pages
+from modules.scrape.get_horse_data import GetHorseData, parse_horse_pages
 from modules.scrape.get_human_data import GetHumanData
@@ -0,0 +1,133 @@
+import os
+import shutil
+import threading
+
+from modules.constants import URL
+from modules.scrape.rate_limit import try_lock_file
+
+# Chromeが起動中のプロファイルに作るファイル。異常終了すると残り、次の起動を妨げる
+SINGLETON_FILES: tuple = ("SingletonLock", "SingletonSocket", "SingletonCookie")
+
+
+def directory_size(path: str) -> int:
+    size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return size
+
+
+class ProfileSlot:
+    """
+    1つのChromeが使うプロファイルディレクトリ
+    slot.lockをロックしている間は、他のスレッド・プロセスからは使われない。
+    """
+
+    def __init__(self, directory: str, index: int, lock_file):
+        self.index = index
+        # Chromeには絶対パスで渡す
+        self.path = os.path.abspath(os.path.join(directory, f"slot-{index:02d}"))
+        self.user_data_dir = os.path.join(self.path, "user-data")
+        self.cache_dir = os.path.join(self.path, "cache")
+        self._lock_file = lock_file
+
+    def release(self):
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+class BrowserProfiles:
+    """
+    Chromeのユーザーデータとディスクキャッシュを、起動し直しても使い回すためのディレクトリを管理するクラス
+    同じプロファイルは同時に1つのChromeしか使えないため、起動するChromeごとに空いているスロットを割り当てる。
+    使われていないスロットのディスクキャッシュは、上限を超えたらバックグラウンドで削除する。
+    """
+
+    def __init__(
+        self,
+        directory: str = URL.BROWSER_PROFILE_DIR,
+        max_bytes: int = URL.BROWSER_PROFILE_MAX_BYTES,
+        cleanup_interval: float = URL.BROWSER_PROFILE_CLEANUP_INTERVAL,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.cleanup_interval = cleanup_interval
+        self._closed = threading.Event()
+        self._cleaner = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _lock_path(self, index: int) -> str:
+        return os.path.join(self.directory, f"slot-{index:02d}.lock")
+
+    def _try_claim(self, index: int) -> ProfileSlot | None:
+        lock_file = try_lock_file(self._lock_path(index))
+        if lock_file is None:
+            return None
+        return ProfileSlot(self.directory, index, lock_file)
+
+    def acquire(self) -> ProfileSlot:
+        """
+        空いているスロットを確保する。前回異常終了したChromeのロックファイルは削除する。
+        """
+        index = 0
+        while True:
+            slot = self._try_claim(index)
+            if slot is not None:
+                break
+            index += 1
+        for name in SINGLETON_FILES:
+            path = os.path.join(slot.user_data_dir, name)
+            if os.path.lexists(path):
+                os.remove(path)
+        os.makedirs(slot.user_data_dir, exist_ok=True)
+        self.start_cleaner()
+        return slot
+
+    def cleanup(self):
+        """
+        使われていないスロットのうち、ディスクキャッシュが上限を超えたものを削除する。
+        """
+        for name in sorted(os.listdir(self.directory)):
+            if not (name.startswith("slot-") and name.endswith(".lock")):
+                continue
+            slot = self._try_claim(int(name[5:-5]))
+            if slot is None:
+                continue
+            try:
+                if directory_size(slot.cache_dir) > self.max_bytes:
+                    shutil.rmtree(slot.cache_dir, ignore_errors=True)
+            finally:
+                slot.release()
+
+    def start_cleaner(self):
+        """
+        バックグラウンドでcleanupを定期的に実行するスレッドを起動する。
+        """
+        with self._lock:
+            if self._cleaner is not None or self.cleanup_interval <= 0:
+                return
+            self._closed = threading.Event()
+            self._cleaner = threading.Thread(
+                target=self._clean_periodically, args=(self._closed,), daemon=True
+            )
+            self._cleaner.start()
+
+    def _clean_periodically(self, closed: threading.Event):
+        while not closed.wait(self.cleanup_interval):
+            try:
+                self.cleanup()
+            except OSError:
+                pass
+
+    def close(self):
+        """
+        バックグラウンドの削除を止める。次にacquireしたときに再開する。
+        """
+        with self._lock:
+            self._closed.set()
+            self._cleaner = None
@@ -0,0 +1,90 @@
+import asyncio
+from typing import Callable, Iterable
+
+from modules.constants import URL
+from modules.scrape.fetcher import Fetcher, as_fetcher
+from modules.scrape.rate_limit import get_host
+
+
+class Crawler:
+    """
+    asyncioでページ取得を並行して行うクラス
+    ホストごとにconcurrency件までリクエストを同時に送り、
+    リクエストの間隔はFetcher側のトークンバケットで守られる。
+    """
+
+    def __init__(self, fetcher: Fetcher, concurrency: int = URL.CONCURRENCY):
+        self.fetcher = as_fetcher(fetcher)
+        self.concurrency = concurrency
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore(self, key: str) -> asyncio.Semaphore:
+        if key not in self._semaphores:
+            self._semaphores[key] = asyncio.Semaphore(self.concurrency)
+        return self._semaphores[key]
+
+    async def fetch(self, url: str) -> str:
+        """
+        URLのページを取得する。ホストごとの同時接続数を超える場合は待機する。
+        """
+        async with self._semaphore(get_host(url)):
+            return await asyncio.to_thread(self.fetcher.fetch, url)
+
+    async def fetch_all(
+        self, urls: Iterable[str], on_page: Callable = None
+    ) -> dict[str, str | Exception]:
+        """
+        複数のURLのページを並行して取得する。
+        取得に失敗したURLには例外を格納する。
+        """
+
+        async def _fetch(url: str):
+            try:
+                html = await self.fetch(url)
+            except Exception as e:
+                html = e
+            if on_page is not None:
+                on_page(url, html)
+            return url, html
+
+        results = await asyncio.gather(*[_fetch(url) for url in dict.fromkeys(urls)])
+        return dict(results)
+
+    async def run(
+        self, items: Iterable, job: Callable, on_done: Callable = None
+    ) -> list:
+        """
+        itemsのそれぞれに対してjobを並行して実行する。
+        jobはページの取得を含む同期関数で、別スレッドで実行される。
+        on_doneはイベントループのスレッド（呼び出し元のスレッド）で呼ばれる。
+        """
+        semaphore = self._semaphore("job")
+
+        async def _run(item):
+            async with semaphore:
+                try:
+                    result = await asyncio.to_thread(job, item)
+                except Exception as e:
+                    result = e
+            if on_done is not None:
+                on_done(item, result)
+            return result
+
+        return await asyncio.gather(*[_run(item) for item in items])
+
+    def crawl(
+        self, urls: Iterable[str], on_page: Callable = None
+    ) -> dict[str, str | Exception]:
+        """
+        fetch_allを同期的に実行する。
+        """
+        # Semaphoreはイベントループごとに作り直す
+        self._semaphores = {}
+        return asyncio.run(self.fetch_all(urls, on_page))
+
+    def map(self, items: Iterable, job: Callable, on_done: Callable = None) -> list:
+        """
+        runを同期的に実行する。
+        """
+        self._semaphores = {}
+        return asyncio.run(self.run(items, job, on_done))
@@ -0,0 +1,280 @@
+import re
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+from modules.constants import URL
+from modules.scrape.webdriver import (
+    ChromeManager,
+    WebDriverPool,
+    TabGroup,
+    get_driver_pool,
+    get_chrome_manager,
+    block_resources,
+    mark_navigation,
+    wait_for_navigation,
+    wait_for_page_load,
+    wait_for_ready,
+)
+from modules.scrape.rate_limit import get_host_limiter
+from modules.scrape.page_type import get_page_type
+
+
+class Fetcher:
+    """
+    ページのHTMLを取得するクラスの基底クラス
+    """
+
+    def fetch(self, url: str) -> str:
+        """
+        指定されたURLのHTMLを文字列で取得する。
+        ホストごとのレート制限を守ってからリクエストを行う。
+        """
+        with get_host_limiter(url).slot():
+            return self.request(url)
+
+    def request(self, url: str) -> str:
+        """
+        レート制限をかけずにURLのHTMLを取得する。
+        """
+        raise NotImplementedError
+
+    def fetch_conditional(
+        self, url: str, etag: str = None, last_modified: str = None
+    ) -> tuple[str | None, dict]:
+        """
+        ETag・Last-Modifiedを使って条件付きで取得する。
+        変更がない(304)場合はHTMLの代わりにNoneを返す。2つめの戻り値は新しい検証子。
+        条件付きリクエストに対応しないFetcherは常に取得する。
+        """
+        return self.fetch(url), {}
+
+    def fetch_if_modified(self, url: str) -> str | None:
+        """
+        前回処理したとき(mark_processed)から変更があればHTMLを、なければNoneを返す。
+        処理済みのページを記録しないFetcherは常にHTMLを返す。
+        """
+        return self.fetch(url)
+
+    def mark_processed(self, url: str, html: str):
+        """
+        取得したページの処理(DBへの書き込み)が完了したことを記録する。
+        fetch_if_modifiedは、ページがこのHTMLから変わるまでNoneを返す。
+        """
+
+    def invalidate(self, url: str):
+        """
+        保存しているページを破棄する。取得したページの処理に失敗したときに呼ばれる。
+        """
+
+    def restart(self):
+        """
+        接続を作り直す。取得に失敗したときに呼ばれる。
+        """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.quit()
+
+    def close(self):
+        self.quit()
+
+    def quit(self):
+        """
+        接続を閉じる。
+        """
+
+
+class HttpFetcher(Fetcher):
+    """
+    HTTPセッションを使い回してページを取得するクラス
+    サーバー側で描画される静的なページはこちらで取得する。
+    """
+
+    def __init__(self, pool_size: int = URL.HTTP_POOL_SIZE):
+        self.pool_size = pool_size
+        self.session = self._create_session()
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        session.headers.update(
+            {
+                "User-Agent": URL.USER_AGENT,
+                "Accept-Encoding": "gzip, deflate",
+                "Accept-Language": "ja",
+                "Connection": "keep-alive",
+            }
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size, pool_maxsize=self.pool_size
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def request(self, url: str) -> str:
+        response = self.session.get(url, timeout=URL.HTTP_TIMEOUT)
+        response.raise_for_status()
+        return self.decode(response)
+
+    def fetch_conditional(
+        self, url: str, etag: str = None, last_modified: str = None
+    ) -> tuple[str | None, dict]:
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        with get_host_limiter(url).slot():
+            response = self.session.get(url, headers=headers, timeout=URL.HTTP_TIMEOUT)
+        if response.status_code == 304:
+            return None, {}
+        response.raise_for_status()
+        validators = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+        return self.decode(response), {k: v for k, v in validators.items() if v}
+
+    def decode(self, response: requests.Response) -> str:
+        """
+        レスポンスをデコードする。
+        netkeiba.comはEUC-JPで配信されているため、charsetが無い場合はEUC-JPとみなす。
+        """
+        content_type = response.headers.get("Content-Type", "")
+        match = re.search(r"charset=([\w-]+)", content_type, re.IGNORECASE)
+        encoding = match.group(1) if match else URL.DEFAULT_ENCODING
+        if encoding.lower() in ("euc-jp", "eucjp", "x-euc-jp"):
+            # 機種依存文字（丸数字など）を含むため、上位互換のEUC-JIS-2004で読む
+            encoding = "euc_jis_2004"
+        return response.content.decode(encoding, errors="replace")
+
+    def restart(self):
+        self.session.close()
+        self.session = self._create_session()
+
+    def quit(self):
+        self.session.close()
+
+
+class SeleniumFetcher(Fetcher):
+    """
+    Seleniumでページを取得するクラス
+    JavaScriptで描画されるページ（オッズなど）はこちらで取得する。
+    poolを渡した場合は、取得のたびにプールからドライバーを借りる。
+    自分で起動したドライバーはmanagerに記録し、quitで確実に終了する。
+    """
+
+    def __init__(
+        self, driver=None, pool: WebDriverPool = None, manager: ChromeManager = None
+    ):
+        self._driver = driver
+        self.pool = pool
+        self.manager = manager if manager is not None else get_chrome_manager()
+        # 1つのブラウザは同時に1ページしか操作できないため、スレッド間で直列化する
+        self._lock = threading.RLock()
+
+    @property
+    def driver(self):
+        if self._driver is None:
+            self._driver = self.manager.launch()
+        return self._driver
+
+    def request(self, url: str) -> str:
+        if self.pool is not None:
+            with self.pool.driver() as driver:
+                return self._load(driver, url)
+        with self._lock:
+            return self._load(self.driver, url)
+
+    def _load(self, driver, url: str) -> str:
+        page_type = get_page_type(url)
+        block_resources(driver, page_type)
+        # 前のページの状態を、読み込み中のページのものと取り違えないようにする
+        mark_navigation(driver)
+        driver.get(url)
+        wait_for_navigation(driver)
+        wait_for_page_load(driver, page_type)
+        wait_for_ready(driver, page_type)
+        return driver.page_source
+
+    def fetch_many(
+        self, urls: list[str], tabs: int = URL.BROWSER_TABS
+    ) -> dict[str, str | Exception]:
+        """
+        1つのChromeに複数のタブを開き、複数のURLを並行して読み込む。
+        """
+        if self.pool is not None:
+            with self.pool.driver() as driver:
+                return self._load_many(driver, urls, tabs)
+        with self._lock:
+            return self._load_many(self.driver, urls, tabs)
+
+    def _load_many(self, driver, urls: list[str], tabs: int) -> dict:
+        # どのタブにどのURLを割り振るかは決まっていないため、すべてのURLのページの種類で不要なものだけをブロックする
+        page_types = tuple(dict.fromkeys(map(get_page_type, urls)))
+        group = TabGroup(driver, min(tabs, max(len(urls), 1)), page_types)
+        try:
+            return group.fetch_many(urls)
+        finally:
+            group.close()
+
+    def restart(self):
+        # 次の取得時に新しいドライバーを起動する
+        # プールのドライバーは例外発生時にプール側で作り直される
+        self.quit()
+
+    def quit(self):
+        with self._lock:
+            if self._driver is not None:
+                try:
+                    self.manager.quit(self._driver)
+                finally:
+                    self._driver = None
+
+
+class RoutingFetcher(Fetcher):
+    """
+    ページの種類によってHttpFetcherとSeleniumFetcherを使い分けるクラス
+    """
+
+    def __init__(self, http: Fetcher = None, selenium: Fetcher = None):
+        self.http = http if http is not None else HttpFetcher()
+        self.selenium = (
+            selenium
+            if selenium is not None
+            else SeleniumFetcher(pool=get_driver_pool())
+        )
+
+    def route(self, url: str) -> Fetcher:
+        if get_page_type(url) in URL.SELENIUM_PAGE_TYPES:
+            return self.selenium
+        return self.http
+
+    def fetch(self, url: str) -> str:
+        return self.route(url).fetch(url)
+
+    def fetch_conditional(
+        self, url: str, etag: str = None, last_modified: str = None
+    ) -> tuple[str | None, dict]:
+        return self.route(url).fetch_conditional(url, etag, last_modified)
+
+    def restart(self):
+        self.http.restart()
+        self.selenium.restart()
+
+    def quit(self):
+        self.http.quit()
+        self.selenium.quit()
+
+
+def as_fetcher(driver) -> Fetcher:
+    """
+    Fetcherでないもの（SeleniumのWebDriver）が渡された場合はSeleniumFetcherで包む。
+    Noneの場合は、取得済みのページを解析するだけでページを取得しないものとしてNoneを返す。
+    """
+    if driver is None or isinstance(driver, Fetcher):
+        return driver
+    return SeleniumFetcher(driver)
@@ -1,38 +1,31 @@
 import pandas as pd
-from selenium.common.exceptions import WebDriverException
-from bs4 import BeautifulSoup
-from io import StringIO
-from time import sleep
-from functools import lru_cache
+from bs4 import BeautifulSoup, Tag
 import re
 
 from modules.constants import URL, RACEDATA
-from modules.scrape import WebDriver
+from modules.scrape.fetcher import Fetcher, as_fetcher
+from modules.scrape.retry import fetch_with_retry
+from modules.scrape.html_parser import make_soup
+from modules.scrape.html_table import clean_table, read_table, table_rows
 
 
 class GetHorseData:
     def __init__(self, driver, horse_id: str):
-        self.driver = driver
+        self.fetcher = as_fetcher(driver)
         self.horse_id = horse_id
+        self.horse_page_html: str = ""
         self.horse_page_soup = None
+        self.pedigree_soup = None
+
+    @property
+    def driver(self) -> Fetcher:
+        return self.fetcher
 
-    @lru_cache(maxsize=URL.CACHE_SIZE)
     def _get_soup(self, url: str) -> BeautifulSoup:
         """
         指定されたURLからBeautifulSoupオブジェクトを取得する。
         """
-        for r in range(URL.RETRY_COUNT):
-            try:
-                self.driver.get(url)
-                sleep(URL.WAIT_TIME)
-                soup = BeautifulSoup(self.driver.page_source, "html.parser")
-                if soup:
-                    return soup
-            except Exception:
-                sleep(URL.RETRY_WAIT_TIME)
-                self.driver = WebDriver().driver()
-                continue
-        raise WebDriverException(f"Error getting soup from {url}")
+        return fetch_with_retry(self.fetcher, url, make_soup)
 
     def _select_element(self, soup: BeautifulSoup, selector: str) -> BeautifulSoup:
         """
@@ -41,24 +34,18 @@ class GetHorseData:
         try:
             element = soup.select_one(selector)
             if element:
-                return BeautifulSoup(str(element), "html.parser")
+                # 文字列に戻して解析し直さず、要素をそのまま使う
+                return element
             else:
-                return BeautifulSoup("", "html.parser")
+                return make_soup("")
         except Exception as e:
             raise Exception(f"Error selecting element {selector}: {e}")
 
-    def _select_all_elements(self, soup: BeautifulSoup, selector: str) -> BeautifulSoup:
+    def _split_href(self, href: str) -> str:
         """
-        指定されたセレクターに一致するすべてのBeautifulSoupオブジェクトを取得する。
+        hrefを/で分割して、末尾の/の前の要素(IDなど)を返す。
         """
-        try:
-            elements = soup.select(selector)
-            if elements:
-                return BeautifulSoup(str(elements), "html.parser")
-            else:
-                return BeautifulSoup("", "html.parser")
-        except Exception as e:
-            raise Exception(f"Error selecting element {selector}: {e}")
+        return href.split("/")[-2] if href else ""
 
     def _get_splitted_href(self, soup: BeautifulSoup, selector: str) -> str:
         """
@@ -67,22 +54,68 @@ class GetHorseData:
         try:
             element = soup.select_one(selector)
             if element:
-                href = str(element.get("href"))
-                return href.split("/")[-2]
+                return self._split_href(str(element.get("href")))
             else:
                 return ""
         except Exception as e:
             raise Exception(f"Error selecting element {selector}: {e}")
 
+    def load_if_modified(self) -> bool:
+        """
+        馬のページを条件付きで取得する。前回取得したときから変更がない場合はFalseを返す。
+        """
+        html = self.fetcher.fetch_if_modified(URL.HORSE + self.horse_id)
+        if html is None:
+            return False
+        self.set_horse_page(html)
+        return True
+
+    def set_horse_page(self, html: str):
+        """
+        取得済みの馬のページを解析する。
+        """
+        self.horse_page_html = html
+        self.horse_page_soup = make_soup(html)
+
+    def set_pedigree_page(self, html: str):
+        """
+        取得済みの血統ページを解析する。
+        """
+        self.pedigree_soup = make_soup(html)
+
+    def _load_horse_page(self) -> BeautifulSoup:
+        """
+        馬のページを取得する。取得済みの場合は取得し直さない。
+        """
+        if not self.horse_page_soup:
+            self.horse_page_html, self.horse_page_soup = fetch_with_retry(
+                self.fetcher,
+                URL.HORSE + self.horse_id,
+                lambda html: (html, make_soup(html)),
+            )
+        return self.horse_page_soup
+
+    def mark_processed(self):
+        """
+        過去戦績をDBに格納したことを記録する。
+        次回のload_if_modifiedは、馬のページがこのときから変わるまでFalseを返す。
+        """
+        if self.horse_page_html:
+            self.fetcher.mark_processed(URL.HORSE + self.horse_id, self.horse_page_html)
+
+    def invalidate(self):
+        """
+        保存されている馬のページを破棄する。
+        """
+        self.fetcher.invalidate(URL.HORSE + self.horse_id)
+        self.fetcher.invalidate(URL.HROSE_PED + self.horse_id)
+
     def get_horse_profile(self) -> dict:
         """
         馬のプロフィールを取得する
         """
         try:
-            url = URL.HORSE + self.horse_id
-            if not self.horse_page_soup:
-                self.horse_page_soup = self._get_soup(url)
-            soup = self.horse_page_soup
+            soup = self._load_horse_page()
             name_soup = self._select_element(soup, "div.horse_title > h1")
             name = name_soup.get_text() if name_soup else ""
             data_soup = self._select_element(soup, "div.db_prof_area_02")
@@ -98,46 +131,36 @@ class GetHorseData:
         except Exception as e:
             raise Exception(f"Error getting horse profile: {e}")
 
-    def get_horse_pedigree(self) -> dict:
+    def get_horse_pedigree(self) -> list[str]:
         """
         馬の血統を取得する
+        RACEDATA.PEDIGREE_KEYSの順に祖先の馬IDを並べたリストを返す
         """
         try:
-            soup = self._get_soup(URL.HROSE_PED + self.horse_id)
-            table = self._select_element(soup, "table.blood_table")
-            return self.parse_pedigree(str(table))
+            if not self.pedigree_soup:
+                self.pedigree_soup = self._get_soup(URL.HROSE_PED + self.horse_id)
+            table = self._select_element(self.pedigree_soup, "table.blood_table")
+            return self.parse_pedigree(table)
         except Exception as e:
             raise Exception(f"Error getting horse pedigree: {e}")
 
-    def generate_pedigree_key(self, depth: int, current_depth_count: int) -> str:
-        """
-        テーブルの行数と列数から血統のキーを生成する
-        """
-        key_map = {
-            16: "f",
-            8: "ff",
-            4: "fff",
-            2: "ffff",
-            1: "fffff",
-        }
-        binary = bin(current_depth_count)[2:].zfill(len(key_map.get(depth, "")))
-        return binary.replace("0", "f").replace("1", "m")
-
-    def parse_pedigree(self, html) -> dict:
+    def parse_pedigree(self, table: Tag) -> list[str]:
         """
-        血統のテーブルから血統データを取得する
+        血統のテーブルを1回だけ走査して、祖先の馬IDをRACEDATA.PEDIGREE_KEYSの順に並べる
+        セルのrowspan(16, 8, 4, 2, 1)が世代を表し、同じ世代のセルは父方から順に現れる
         """
-        soup = BeautifulSoup(html, "html.parser")
-        pedigree_data = {}
-        depth_count = {16: 0, 8: 0, 4: 0, 2: 0, 1: 0}
-        for tr in soup.find_all("tr"):
-            tds = BeautifulSoup(str(tr), "html.parser").find_all("td")
-            for td in tds:
-                rowspan = int(td.get("rowspan", 1))
-                key = self.generate_pedigree_key(rowspan, depth_count[rowspan])
-                depth_count[rowspan] += 1
-                pedigree_data[key] = self._get_splitted_href(td, "a")
-        return pedigree_data
+        ancestors = [""] * len(RACEDATA.PEDIGREE_KEYS)
+        # rowspanごとに、次に埋める位置と世代の終わりの位置
+        slots = {16 >> (g - 1): [2**g - 2, 2 ** (g + 1) - 2] for g in range(1, 6)}
+        for td in table.find_all("td"):
+            slot = slots.get(int(td.get("rowspan") or 1))
+            if slot is None or slot[0] >= slot[1]:
+                raise Exception(f"Unexpected pedigree cell: {td}")
+            anchor = td.find("a")
+            if anchor is not None:
+                ancestors[slot[0]] = self._split_href(str(anchor.get("href", "")))
+            slot[0] += 1
+        return ancestors
 
     def format_local_name(self, local: str) -> str:
         """
@@ -148,36 +171,87 @@ class GetHorseData:
         except Exception as e:
             raise Exception(f"Error parsing local {local}: {e}")
 
-    def get_horse_result(self) -> pd.DataFrame:
+    def count_new_results(self, table, known_race_id: str) -> int:
+        """
+        過去戦績のテーブルの先頭(新しいレース)から、known_race_idのレースより後の日付の行数を数える。
+        過去戦績は新しい順に並んでいるため、known_race_id以前の日付の行が現れたら数えるのをやめる。
+        行はread_tableと同じように選ぶため、tbodyのないテーブルでも数えられる。
+        非表示の行もread_tableと同じく取り除いてから数え、read_tableのmax_rowsと行を揃える。
+        """
+        # レースIDはyyyyllmmddrrの形式
+        known_date = known_race_id[:4] + known_race_id[6:10]
+        count = 0
+        _, body_rows, _ = table_rows(clean_table(table))
+        for num, tr in enumerate(body_rows):
+            td = tr.find("td", recursive=False)
+            # 見出しなどのtdのない行は飛ばす。max_rowsは本文の行数なので、後に続く戦績の行と一緒に数える
+            if td is None:
+                continue
+            date = re.sub(r"\D", "", td.get_text())
+            if date <= known_date:
+                break
+            count = num + 1
+        return count
+
+    def extract_horse_result(
+        self, table, max_rows: int = None
+    ) -> tuple[pd.DataFrame, list, list]:
+        """
+        過去戦績のテーブルを1回だけ走査して、戦績のDataFrameと騎手ID・レースIDのリストを取得する。
+        DataFrameの列の型はpandas.read_htmlで読み込んだ場合と同じ。
+        max_rowsを指定した場合は、先頭のmax_rows行だけを読み込む。
+        """
+        # 騎手は13列目、レース名(レースへのリンク)は5列目
+        df, links = read_table(table, link_columns=[4, 12], max_rows=max_rows)
+        df.columns = RACEDATA.HORSE_RESULT_COLUMNS
+        df.drop(columns=RACEDATA.HORSE_RESULT_DROP_COLUMNS, inplace=True)
+        jockey_ids = [self._split_href(href) for href in links[12]]
+        race_ids = [self._split_href(href) for href in links[4]]
+        return df, jockey_ids, race_ids
+
+    def get_horse_result(self, known_race_id: str = None) -> pd.DataFrame:
         """
         馬の過去戦績を取得する
+        known_race_idを指定した場合は、そのレースより後の日付の戦績だけを取得する(DBに格納済みの戦績の続きから)
         """
         try:
-            if not self.horse_page_soup:
-                self.horse_page_soup = self._get_soup(URL.HORSE + self.horse_id)
-            soup = self.horse_page_soup
-            table = self._select_element(soup, "table.db_h_race_results.nk_tb_common")
+            soup = self._load_horse_page()
+            table = soup.select_one("table.db_h_race_results.nk_tb_common")
             if table:
-                df = pd.read_html(StringIO(str(table)))[0]
-                df.columns = RACEDATA.HORSE_RESULT_COLUMNS
-                df.drop(columns=RACEDATA.HORSE_RESULT_DROP_COLUMNS, inplace=True)
-                df["jockey_id"] = [
-                    self._get_splitted_href(BeautifulSoup(str(td), "html.parser"), "a")
-                    for num, td in enumerate(
-                        self._select_all_elements(table, "td:nth-of-type(13)")
-                    )
-                    if num % 2 == 1
-                ]
-                df["race_id"] = [
-                    self._get_splitted_href(BeautifulSoup(str(td), "html.parser"), "a")
-                    for num, td in enumerate(
-                        self._select_all_elements(table, "td:nth-of-type(5)")
-                    )
-                    if num % 2 == 1
-                ]
+                max_rows = None
+                if known_race_id:
+                    max_rows = self.count_new_results(table, known_race_id)
+                df, jockey_ids, race_ids = self.extract_horse_result(table, max_rows)
+                df["jockey_id"] = jockey_ids
+                df["race_id"] = race_ids
                 df["開催"] = df["開催"].apply(self.format_local_name)
             else:
                 df = pd.DataFrame()
             return df
         except Exception as e:
             raise Exception(f"Error getting horse result: {e}")
+
+
+def parse_horse_pages(
+    horse_id: str, fetched: tuple[list[str], dict, str | None]
+) -> dict:
+    """
+    取得済みの馬のページを解析する。ParsePipelineのプロセスプールで実行される。
+    fetchedは(取得する情報の種類のリスト, URLからHTMLへの辞書, DBに格納済みの最新のレースID)
+    過去戦績がない場合や新しい戦績がない場合、resultは空のDataFrameになる。
+    """
+    get_type, pages, known_race_id = fetched
+    # ページの文字列を直接解析する。プロセスの中では取得もリトライもしない
+    get_horse_data = GetHorseData(None, horse_id)
+    if "profile" in get_type or "result" in get_type:
+        get_horse_data.set_horse_page(pages[URL.HORSE + horse_id])
+    if "pedigree" in get_type:
+        get_horse_data.set_pedigree_page(pages[URL.HROSE_PED + horse_id])
+    record = {"get_type": get_type}
+    if "profile" in get_type:
+        record["profile"] = get_horse_data.get_horse_profile()
+    if "pedigree" in get_type:
+        record["pedigree"] = get_horse_data.get_horse_pedigree()
+    if "result" in get_type:
+        record["result"] = get_horse_data.get_horse_result(known_race_id)
+    return record
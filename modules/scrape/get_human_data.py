@@ -1,31 +1,24 @@
 from bs4 import BeautifulSoup
-from time import sleep
-from selenium.common.exceptions import WebDriverException
 
 from modules.constants import URL
-from modules.scrape import WebDriver
+from modules.scrape.fetcher import Fetcher, as_fetcher
+from modules.scrape.retry import FetchError, fetch_with_retry
+from modules.scrape.html_parser import make_soup
 
 
 class GetHumanData:
     def __init__(self, driver):
-        self.driver = driver
+        self.fetcher = as_fetcher(driver)
+
+    @property
+    def driver(self) -> Fetcher:
+        return self.fetcher
 
     def _get_soup(self, url: str) -> BeautifulSoup:
         """
         指定されたURLからBeautifulSoupオブジェクトを取得する。
         """
-        for r in range(URL.RETRY_COUNT):
-            try:
-                self.driver.get(url)
-                sleep(URL.WAIT_TIME)
-                soup = BeautifulSoup(self.driver.page_source, "html.parser")
-                if soup:
-                    return soup
-            except Exception:
-                sleep(URL.RETRY_WAIT_TIME)
-                self.driver = WebDriver().driver()
-                continue
-        raise WebDriverException(f"Error getting soup from {url}")
+        return fetch_with_retry(self.fetcher, url, make_soup)
 
     def _get_text(self, soup: BeautifulSoup, selector: str) -> str:
         """
@@ -73,14 +66,10 @@ class GetHumanData:
         try:
             soup = self._get_soup(url)
             div = soup.find("div", {"class": "Name"})
-            name = self._get_text(BeautifulSoup(str(div), "html.parser"), "h1").split(
-                "\n"
-            )
+            name = self._get_text(make_soup(str(div)), "h1").split("\n")
             name_kaki = self._export_text(name[0])
             name_yomi = self._export_text(name[-1])
-            birthday = self._get_text(
-                BeautifulSoup(str(div), "html.parser"), "p"
-            ).split(" ")[0]
+            birthday = self._get_text(make_soup(str(div)), "p").split(" ")[0]
             birthday = self._format_birthday(birthday)
             return {"name": name_kaki, "yomi": name_yomi, "birthday": birthday}
         except Exception as e:
@@ -89,11 +78,11 @@ class GetHumanData:
     def get_jockey_profile(self, human_id: str) -> dict:
         try:
             return self._get_human_profile(URL.JOCKEY + human_id)
-        except WebDriverException as e:
-            raise WebDriverException(f"Error loading Jockey profile page: {e}")
+        except FetchError as e:
+            raise FetchError(f"Error loading Jockey profile page: {e}", e.kind)
 
     def get_trainer_profile(self, human_id: str) -> dict:
         try:
             return self._get_human_profile(URL.TRAINER + human_id)
-        except WebDriverException as e:
-            raise WebDriverException(f"Error loading Trainer profile page: {e}")
+        except FetchError as e:
+            raise FetchError(f"Error loading Trainer profile page: {e}", e.kind)
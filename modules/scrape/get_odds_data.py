@@ -1,23 +1,142 @@
-from modules.constants import URL
-from bs4 import BeautifulSoup
-import pandas as pd
-from io import StringIO
-from time import sleep
+from modules.constants import URL, RACEDATA
+from modules.scrape.fetcher import Fetcher, as_fetcher
+from modules.scrape.retry import fetch_with_retry
+from lxml import html as lxml_html
+import numpy as np
+import re
+
+# オッズのセル。idは"odds-1-01"や"odds-8_010203"の形式
+_ODDS_CELL_XPATH = "//*[starts-with(@id, 'odds-')]"
+_RE_ODDS_ID = re.compile(r"odds-(\d+)[-_](\d+)")
+_RE_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+
+def parse_odds_cells(html: str) -> dict[int, tuple[np.ndarray, np.ndarray]]:
+    """
+    オッズのページのHTMLをlxmlで解析し、idでオッズのセルを選んで、idの番号ごとに組み合わせとオッズを取り出す。
+    セルのテキストは入れ子の要素も含めて取り出す(複勝・ワイドの"1.2 - 1.5"が別々のspanに入っている場合など)。
+    BeautifulSoupを使わないため、3連単のような数千のセルがあるページでも速い。
+
+    Returns
+    -------
+    dict
+        セルのidの番号から、(馬番の組み合わせの配列(セル数, 頭数), オッズの配列(セル数, 2))への辞書
+        オッズは(下限, 上限)。下限と上限がない馬券は同じ値を2つ並べる。取消などで数値がない場合はnan
+    """
+    combinations, odds = {}, {}
+    if not html.strip():
+        return {}
+    # 文字列のままではXML宣言のあるHTMLを解析できないため、バイト列で渡す
+    root = lxml_html.fromstring(
+        html.encode("utf-8"), parser=lxml_html.HTMLParser(encoding="utf-8")
+    )
+    for element in root.xpath(_ODDS_CELL_XPATH):
+        match = _RE_ODDS_ID.fullmatch(element.get("id"))
+        if match is None:
+            continue
+        number, umaban = match.groups()
+        # 3連単などの1,000倍以上のオッズは桁区切りのカンマを含む
+        text = element.text_content().replace(",", "")
+        values = [float(value) for value in _RE_NUMBER.findall(text)]
+        combinations.setdefault(int(number), []).append(
+            [int(umaban[num : num + 2]) for num in range(0, len(umaban), 2)]
+        )
+        odds.setdefault(int(number), []).append(
+            (values + values + [np.nan, np.nan])[:2] if len(values) < 2 else values[:2]
+        )
+    return {
+        number: (np.array(combinations[number], dtype=np.int64), np.array(odds[number]))
+        for number in combinations
+    }
+
+
+def to_odds_matrix(
+    combinations: np.ndarray, odds: np.ndarray, size: int, is_range: bool
+) -> np.ndarray:
+    """
+    組み合わせとオッズの配列を、馬番(1始まり)を添字から1を引いた位置に置いた密な配列にする。
+    3連単なら形は(size, size, size)、複勝・ワイドのように下限と上限がある馬券は最後の軸に(下限, 上限)が並ぶ。
+    オッズのない組み合わせはnan。
+    """
+    shape = (RACEDATA.MAX_UMABAN,) * size + ((2,) if is_range else ())
+    matrix = np.full(shape, np.nan)
+    if len(combinations) == 0:
+        return matrix
+    valid = ((combinations >= 1) & (combinations <= RACEDATA.MAX_UMABAN)).all(axis=1)
+    index = tuple((combinations[valid] - 1).T)
+    matrix[index] = odds[valid] if is_range else odds[valid, 0]
+    return matrix
 
 
 class GetOddsData:
+    """
+    馬券の種類ごとのオッズを、組み合わせの密な配列で取得するクラス
+    オッズのページはJavaScriptで描画されるため、Seleniumで取得される(URL.SELENIUM_PAGE_TYPES)。
+    """
+
     def __init__(self, driver, race_id: str):
-        self.driver = driver
+        self.fetcher = as_fetcher(driver)
         self.race_id = race_id
+        # URLごとの、ページを解析した結果
+        self._cells: dict[str, dict] = {}
 
-    def get_tanfuku(self):
-        url = URL.NAR_TAN + self.race_id
-        self.driver.get(url)
-        sleep(URL.WAIT_TIME)
-        soup = BeautifulSoup(self.driver.page_source, "html.parser")
+    @property
+    def driver(self) -> Fetcher:
+        return self.fetcher
 
-    def get_tan(self, soup: BeautifulSoup):
+    def invalidate(self):
+        """
+        保存されているオッズのページを破棄する。
         """
-        単勝のオッズを取得する
+        for url in set(URL.ODDS_PAGES.values()):
+            self.fetcher.invalidate(url + self.race_id)
+        self._cells = {}
+
+    def set_page(self, url: str, html: str):
         """
-        div = soup.find("div", {"id": "odds_tan_block"})
+        取得済みのオッズのページを解析する。
+        """
+        self._cells[url] = parse_odds_cells(html)
+
+    def _get_cells(self, url: str) -> dict:
+        """
+        ページを取得して解析する。同じページ(単勝と複勝など)は1回だけ取得・解析する。
+        """
+        if url not in self._cells:
+            self.set_page(url, fetch_with_retry(self.fetcher, url))
+        return self._cells[url]
+
+    def get_odds(self, odds_type: str) -> np.ndarray:
+        """
+        馬券の種類(RACEDATA.ODDS_TYPESのキー)のオッズを取得する
+        """
+        try:
+            number, size, is_range = RACEDATA.ODDS_TYPES[odds_type]
+            cells = self._get_cells(URL.ODDS_PAGES[odds_type] + self.race_id)
+            if number not in cells:
+                raise Exception("Odds not found")
+            return to_odds_matrix(*cells[number], size, is_range)
+        except Exception as e:
+            raise Exception(
+                f"Error getting {odds_type} odds race_id={self.race_id}: {e}"
+            )
+
+    def get_all_odds(self, odds_types: list[str] = None) -> dict[str, np.ndarray]:
+        """
+        複数の馬券の種類のオッズを取得する。指定しない場合はすべての種類を取得する。
+        """
+        odds_types = odds_types or list(RACEDATA.ODDS_TYPES)
+        return {odds_type: self.get_odds(odds_type) for odds_type in odds_types}
+
+
+def parse_odds_pages(race_id: str, fetched: tuple[list[str], dict]) -> dict:
+    """
+    取得済みのオッズのページを解析する。ParsePipelineのプロセスプールで実行される。
+    fetchedは(馬券の種類のリスト, URLからHTMLへの辞書)
+    """
+    odds_types, pages = fetched
+    # ページの文字列を直接解析する。プロセスの中では取得もリトライもしない
+    get_odds_data = GetOddsData(None, race_id)
+    for url, html in pages.items():
+        get_odds_data.set_page(url, html)
+    return get_odds_data.get_all_odds(odds_types)
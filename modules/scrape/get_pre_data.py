@@ -1,50 +1,110 @@
 from modules.constants import URL, RACEDATA
-from modules.scrape import WebDriver
-from selenium.common.exceptions import WebDriverException
-from bs4 import BeautifulSoup
+from modules.scrape.fetcher import Fetcher, as_fetcher
+from modules.scrape.retry import fetch_with_retry
+from modules.scrape.html_parser import make_soup
+from modules.scrape.html_table import read_table
 import pandas as pd
-from io import StringIO
-from time import sleep
 import re
 
 
 class GetPreData:
     def __init__(self, driver, race_id: str):
-        self.driver = driver
+        self.fetcher = as_fetcher(driver)
         self.race_id = race_id
         self.html: str = ""
+        # self.htmlを解析した結果。self.htmlが変わったら解析し直す
+        self._parsed_html: str = None
+        self._race_details: str = None
+        self._shutuba_table: pd.DataFrame = None
+
+    @property
+    def driver(self) -> Fetcher:
+        return self.fetcher
 
     def get_pre_page(self) -> str:
         """
         ページを取得します。
         """
-        url = URL.NAR_SHUTUBA + self.race_id
-        for _ in range(URL.RETRY_COUNT):
-            try:
-                self.driver.get(url)
-                sleep(URL.WAIT_TIME)
-                return self.driver.page_source
-            except WebDriverException as e:
-                if _ < URL.RETRY_COUNT - 1:
-                    sleep(URL.RETRY_WAIT_TIME)
-                    self.driver = WebDriver().driver()
-                    continue
-                raise WebDriverException(f"Error loading page {url} : {e}")
-        raise WebDriverException(f"Not found page {url}")
+        return fetch_with_retry(self.fetcher, URL.NAR_SHUTUBA + self.race_id)
+
+    def load_if_modified(self) -> bool:
+        """
+        出馬表ページを条件付きで取得します。
+        前回取得したときから変更がない場合はFalseを返します。
+        """
+        html = self.fetcher.fetch_if_modified(URL.NAR_SHUTUBA + self.race_id)
+        if html is None:
+            return False
+        self.html = html
+        return True
+
+    def mark_processed(self):
+        """
+        出馬表をDBに格納したことを記録します。
+        次回のload_if_modifiedは、出馬表ページがこのときから変わるまでFalseを返します。
+        """
+        if self.html:
+            self.fetcher.mark_processed(URL.NAR_SHUTUBA + self.race_id, self.html)
+
+    def invalidate(self):
+        """
+        保存されている出馬表ページを破棄します。
+        """
+        self.fetcher.invalidate(URL.NAR_SHUTUBA + self.race_id)
+
+    def parse_page(self):
+        """
+        出馬表ページを1回だけ解析して、レース情報のテキストと出馬表を取り出します。
+        get_pre_dataとget_shutba_tableはこの結果を共有します。
+        """
+        if self.html == "":
+            self.html = self.get_pre_page()
+        if self._parsed_html is self.html:
+            return
+        soup = make_soup(self.html)
+        race_details_div = soup.find("div", {"class": "RaceList_Item02"})
+        self._race_details = (
+            race_details_div.get_text(separator="|", strip=True)
+            if race_details_div
+            else None
+        )
+        shutuba_table = soup.find("table", {"class": "ShutubaTable"})
+        self._shutuba_table = (
+            self.extract_shutuba_table(shutuba_table) if shutuba_table else None
+        )
+        self._parsed_html = self.html
+
+    def extract_shutuba_table(self, table) -> pd.DataFrame:
+        """
+        出馬表のテーブルを1回だけ走査して、馬・騎手・調教師のIDを含む出馬表を作成します。
+        列の型はpandas.read_htmlで読み込んだ場合と同じです。
+        """
+        # 馬名は4列目、騎手は7列目、厩舎は8列目
+        df, links = read_table(
+            table,
+            link_columns={
+                3: "span.HorseName > a",
+                6: "span.Jockey > a",
+                7: ":scope > a",
+            },
+        )
+        df.columns = df.columns.droplevel()
+        df = df.iloc[:, [0, 1, 3, 4, 5, 6, 7, 8, 9, 10]]
+        df.columns = RACEDATA.SHUTUBA_COLUMNS
+        df["horse_id"] = [href.split("/")[-1] for href in links[3]]
+        df["jockey_id"] = [href.split("/")[-1] for href in links[6]]
+        df["trainer_id"] = [href.split("/")[-1] for href in links[7]]
+        return df
 
     def get_pre_data(self) -> dict:
         """
         レース事前情報を取得します。
         """
         try:
-            if self.html == "":
-                self.html = self.get_pre_page()
-            soup = BeautifulSoup(self.html, "html.parser")
-            race_details_div = soup.find("div", {"class": "RaceList_Item02"})
-            if not race_details_div:
+            self.parse_page()
+            if self._race_details is None:
                 raise Exception("Race details not found")
-            race_details = race_details_div.get_text(separator="|", strip=True)
-            return self.converta_race_details_to_dict(race_details)
+            return self.converta_race_details_to_dict(self._race_details)
         except Exception as e:
             raise Exception(f"Error getting race info : {e}")
 
@@ -122,33 +182,22 @@ class GetPreData:
         出馬表を取得します。
         """
         try:
-            if self.html == "":
-                self.html = self.get_pre_page()
-            soup = BeautifulSoup(self.html, "html.parser")
-            shutuba_table = soup.find("table", {"class": "ShutubaTable"})
-            html_string_io = StringIO(str(shutuba_table))
-            shutuba_table_df = pd.read_html(html_string_io)[0]
-            shutuba_table_df.columns = shutuba_table_df.columns.droplevel()
-            shutuba_table_df = shutuba_table_df.iloc[:, [0, 1, 3, 4, 5, 6, 7, 8, 9, 10]]
-            shutuba_table_df.columns = RACEDATA.SHUTUBA_COLUMNS
-
-            # horse_id, jockey_id, trainer_idの取得
-            shutuba_table = BeautifulSoup(html_string_io, "html.parser")
-            horse_ids = shutuba_table.select("span.HorseName > a")
-            horse_ids = [str(horse_id["href"]).split("/")[-1] for horse_id in horse_ids]
-            shutuba_table_df["horse_id"] = horse_ids
-
-            jockey_ids = shutuba_table.select("span.Jockey > a")
-            jockey_ids = [
-                str(jockey_id["href"]).split("/")[-1] for jockey_id in jockey_ids
-            ]
-            shutuba_table_df["jockey_id"] = jockey_ids
-
-            trainer_ids = shutuba_table.select("td.Trainer > a")
-            trainer_ids = [
-                str(trainer_id["href"]).split("/")[-1] for trainer_id in trainer_ids
-            ]
-            shutuba_table_df["trainer_id"] = trainer_ids
-            return shutuba_table_df
+            self.parse_page()
+            if self._shutuba_table is None:
+                raise Exception("Shutuba table not found")
+            return self._shutuba_table.copy()
         except Exception as e:
             raise Exception(f"Error getting shutuba table : {e}")
+
+
+def parse_shutuba_page(race_id: str, pages: dict) -> dict:
+    """
+    取得済みの出馬表ページを解析する。ParsePipelineのプロセスプールで実行される。
+    """
+    # ページの文字列を直接解析する。プロセスの中では取得もリトライもしない
+    get_pre_data = GetPreData(None, race_id)
+    get_pre_data.html = pages[URL.NAR_SHUTUBA + race_id]
+    return {
+        "pre_data": get_pre_data.get_pre_data(),
+        "shutuba": get_pre_data.get_shutba_table(),
+    }
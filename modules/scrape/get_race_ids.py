@@ -1,29 +1,22 @@
-from selenium.common.exceptions import WebDriverException
 from bs4 import BeautifulSoup
 import datetime
-from time import sleep
 
 from modules.constants import URL
-from modules.scrape import WebDriver
+from modules.scrape.fetcher import Fetcher, as_fetcher
+from modules.scrape.retry import fetch_with_retry
+from modules.scrape.html_parser import make_soup
 
 
 class RaceIdGetter:
     def __init__(self, driver):
-        self.driver = driver
+        self.fetcher = as_fetcher(driver)
+
+    @property
+    def driver(self) -> Fetcher:
+        return self.fetcher
 
     def _get_soup(self, url: str):
-        for r in range(URL.RETRY_COUNT):
-            try:
-                self.driver.get(url)
-                sleep(URL.WAIT_TIME)
-                soup = BeautifulSoup(self.driver.page_source, "html.parser")
-                if soup:
-                    return soup
-            except Exception:
-                sleep(URL.RETRY_WAIT_TIME)
-                self.driver = WebDriver().driver()
-                continue
-        raise WebDriverException(f"Error getting soup from {url}")
+        return fetch_with_retry(self.fetcher, url, make_soup)
 
     def get_race_ids(self, start_date: datetime.date, end_date: datetime.date):
         """
@@ -100,5 +93,5 @@ class RaceIdGetter:
         url = URL.NAR_SHUTUBA + race_id
         soup = self._get_soup(url)
         num_wrap = soup.find("div", {"class": "RaceNumWrap"})
-        links = BeautifulSoup(str(num_wrap), "html.parser").find_all("a")
+        links = make_soup(str(num_wrap)).find_all("a")
         return [link["href"].split("race_id=")[-1] for link in links]
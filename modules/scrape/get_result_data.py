@@ -1,16 +1,34 @@
-from bs4 import BeautifulSoup
-from modules.constants import URL
-from time import sleep
+from bs4 import BeautifulSoup, Tag
+from modules.constants import URL, RACEDATA
+from modules.scrape.fetcher import Fetcher, as_fetcher
+from modules.scrape.retry import fetch_with_retry
+from modules.scrape.html_parser import make_soup
+from modules.scrape.html_table import read_table
 import pandas as pd
-from io import StringIO
+import re
 
 
 class GetResultData:
-    def __init__(self, driver, race_id: str):
+    """
+    レース結果ページを1回だけ解析して、着順・払戻・コーナー通過順・ラップタイムを取得するクラス
+    """
+
+    def __init__(self, driver, race_id: str, soup: BeautifulSoup = None):
+        """
+        soupを渡した場合は、ページを取得せずにそれを解析する。
+        """
+        self.race_id = race_id
         self.url = URL.NAR_RESULT + race_id
-        self.driver = driver
-        self.soup = self.get_data()
+        self.fetcher = as_fetcher(driver)
+        self.soup = soup if soup is not None else self.get_data()
         self.result_order = self.get_result_order(self.soup)
+        self.payouts = self.get_payouts(self.soup)
+        self.corners = self.get_corners(self.soup)
+        self.laps = self.get_laps(self.soup)
+
+    @property
+    def driver(self) -> Fetcher:
+        return self.fetcher
 
     @property
     def result(self):
@@ -20,47 +38,201 @@ class GetResultData:
         """
         レース結果ページからデータを取得します。
         """
-        self.driver.get(self.url)
-        sleep(URL.WAIT_TIME)
-        soup = BeautifulSoup(self.driver.page_source, "html.parser")
-        return soup
+        return fetch_with_retry(self.fetcher, self.url, make_soup)
 
-    def get_result_order(self, soup: BeautifulSoup):
+    def invalidate(self):
+        """
+        保存されているレース結果ページを破棄します。
+        """
+        self.fetcher.invalidate(self.url)
+
+    def get_result_order(self, soup: BeautifulSoup) -> pd.DataFrame:
         """
         レース結果ページから着順を取得します。
+        テーブルを1回だけ走査して、馬・騎手・調教師のIDも取り出します。
         """
         result_table = soup.find("table", {"id": "All_Result_Table"})
-        html_string_io = StringIO(str(result_table))
-        result_df = pd.read_html(html_string_io)[0]
-        result_df.columns = [
-            "着順",
-            "枠",
-            "馬番",
-            "馬名",
-            "性齢",
-            "斤量",
-            "騎手",
-            "タイム",
-            "着差",
-            "人気",
-            "単勝オッズ",
-            "後3F",
-            "厩舎",
-            "馬体重(増減)",
-        ]
+        if result_table is None:
+            raise Exception(f"Result table not found race_id={self.race_id}")
+        # 馬名は4列目、騎手は7列目、厩舎は13列目
+        result_df, links = read_table(
+            result_table,
+            link_columns={
+                3: "span.Horse_Name > a",
+                6: ":scope > a",
+                12: ":scope > a",
+            },
+        )
+        result_df.columns = RACEDATA.RESULT_COLUMNS
+        result_df["horse_id"] = [href.split("/")[-2] for href in links[3]]
+        result_df["jockey_id"] = [href.split("/")[-2] for href in links[6]]
+        result_df["trainer_id"] = [href.split("/")[-1] for href in links[12]]
+        return result_df
+
+    def _to_int(self, text: str) -> int | None:
+        digits = re.sub(r"\D", "", text)
+        return int(digits) if digits else None
 
-        # horse_id, jockey_id, trainer_idを取得
-        result_table = BeautifulSoup(html_string_io, "html.parser")
-        horse_ids = result_table.select("span.Horse_Name > a")
-        horse_ids = [str(horse_id["href"]).split("/")[-2] for horse_id in horse_ids]
-        jockey_ids = result_table.select("td.Jockey > a")
-        jockey_ids = [str(jockey_id["href"]).split("/")[-2] for jockey_id in jockey_ids]
-        trainer_ids = result_table.select("td.Trainer > a")
-        trainer_ids = [
-            str(trainer_id["href"]).split("/")[-1] for trainer_id in trainer_ids
+    def _split_lines(self, td: Tag | None) -> list[str]:
+        """
+        <br>や<span>で区切られたセルのテキストを行ごとに分ける
+        """
+        if td is None:
+            return []
+        return [
+            text for text in td.get_text(separator="\n").split("\n") if text.strip()
         ]
-        result_df["horse_id"] = horse_ids
-        result_df["jockey_id"] = jockey_ids
-        result_df["trainer_id"] = trainer_ids
 
-        return result_df
+    def get_payouts(self, soup: BeautifulSoup) -> dict:
+        """
+        レース結果ページから払戻を取得します。
+        RACEDATA.PAYOUT_TYPESのキーごとに、{"umaban": 組み合わせ, "payout": 払戻金, "popularity": 人気}のリストを返します。
+        """
+        payouts = {}
+        for table in soup.select("table.Payout_Detail_Table"):
+            for tr in table.find_all("tr"):
+                key = next(
+                    (
+                        RACEDATA.PAYOUT_TYPES[name]
+                        for name in tr.get("class", [])
+                        if name in RACEDATA.PAYOUT_TYPES
+                    ),
+                    None,
+                )
+                if key is None:
+                    continue
+                result = tr.find("td", class_="Result")
+                combinations = []
+                if result is not None:
+                    # 組み合わせの馬券は組ごとにul、単勝・複勝は馬ごとにdivで並ぶ
+                    groups = result.find_all("ul") or [
+                        div
+                        for div in result.find_all("div")
+                        if div.get_text(strip=True)
+                    ]
+                    for group in groups:
+                        umaban = [
+                            self._to_int(span.get_text())
+                            for span in group.find_all("span")
+                            if span.get_text(strip=True)
+                        ]
+                        combinations.append(umaban)
+                amounts = self._split_lines(tr.find("td", class_="Payout"))
+                popularities = self._split_lines(tr.find("td", class_="Ninki"))
+                payouts[key] = [
+                    {
+                        "umaban": umaban,
+                        "payout": self._to_int(amount),
+                        "popularity": self._to_int(popularity),
+                    }
+                    for umaban, amount, popularity in zip(
+                        combinations, amounts, popularities + [""] * len(amounts)
+                    )
+                ]
+        return payouts
+
+    def get_corners(self, soup: BeautifulSoup) -> dict[str, str]:
+        """
+        レース結果ページからコーナー通過順を取得します。
+        コーナー名("1コーナー"など)から、通過順の文字列("3,5-(1,2)-4"など)への辞書を返します。
+        """
+        corners = {}
+        table = soup.find("table", class_="Corner_Num")
+        if table is None:
+            return corners
+        for tr in table.find_all("tr"):
+            th, td = tr.find("th"), tr.find("td")
+            if th is not None and td is not None:
+                corners[th.get_text(strip=True)] = td.get_text(strip=True)
+        return corners
+
+    def corner_positions(self, order: str) -> dict[int, int]:
+        """
+        コーナー通過順の文字列から、馬番ごとの順位を求めます。
+        ()で囲まれた併走している馬は同じ順位にします。
+        """
+        positions = {}
+        position = 1
+        for group, umaban in re.findall(r"\(([^)]*)\)|(\d+)", order):
+            group = [int(num) for num in re.findall(r"\d+", group)] or [int(umaban)]
+            for num in group:
+                positions[num] = position
+            position += len(group)
+        return positions
+
+    def get_passing(self) -> dict[int, str]:
+        """
+        コーナー通過順から、馬番ごとの通過順("3-3-2-1"など)を求めます。
+        馬ページの過去戦績の通過と同じ形式です。
+        """
+        passing = {}
+        for order in self.corners.values():
+            for umaban, position in self.corner_positions(order).items():
+                passing.setdefault(umaban, []).append(str(position))
+        return {umaban: "-".join(positions) for umaban, positions in passing.items()}
+
+    def _to_seconds(self, text: str) -> float | None:
+        """
+        "1:12.3"や"12.3"の形式のタイムを秒に変換します。
+        """
+        match = re.fullmatch(r"(?:(\d+):)?(\d+(?:\.\d+)?)", text.strip())
+        if match is None:
+            return None
+        minutes, seconds = match.groups()
+        return round(int(minutes or 0) * 60 + float(seconds), 1)
+
+    def get_laps(self, soup: BeautifulSoup) -> dict:
+        """
+        レース結果ページからラップタイムを取得します。
+        {"distance": 区間の距離(m), "lap": 区間ごとのタイム, "time": 通過タイム}を返します。
+        """
+        table = soup.find("table", class_="Race_HaronTime")
+        if table is None:
+            return {}
+        header = table.find("tr")
+        distances = [self._to_int(th.get_text()) for th in header.find_all("th")]
+        rows = []
+        for tr in table.find_all("tr"):
+            times = [self._to_seconds(td.get_text()) for td in tr.find_all("td")]
+            if times and None not in times:
+                rows.append(times)
+        if not rows:
+            return {}
+        # 通過タイムは増え続け、最後は区間ごとのタイムより大きくなる
+        rows.sort(key=lambda times: times[-1])
+        if len(rows) > 1:
+            laps, elapsed = rows[0], rows[-1]
+        elif self._is_elapsed(rows[0]):
+            elapsed = rows[0]
+            laps = [
+                round(time - previous, 1)
+                for time, previous in zip(elapsed, [0.0] + elapsed[:-1])
+            ]
+        else:
+            laps = rows[0]
+            elapsed = [round(sum(laps[: num + 1]), 1) for num in range(len(laps))]
+        return {"distance": distances[: len(laps)], "lap": laps, "time": elapsed}
+
+    def _is_elapsed(self, times: list[float]) -> bool:
+        return (
+            len(times) > 1
+            and all(previous < time for previous, time in zip(times, times[1:]))
+            and times[-1] > times[0] * 2
+        )
+
+
+def parse_result_page(race_id: str, pages: dict) -> dict:
+    """
+    取得済みのレース結果ページを解析する。ParsePipelineのプロセスプールで実行される。
+    """
+    # ページの文字列を直接解析する。プロセスの中では取得もリトライもしない
+    get_result_data = GetResultData(
+        None, race_id, make_soup(pages[URL.NAR_RESULT + race_id])
+    )
+    return {
+        "result": get_result_data.result,
+        "passing": get_result_data.get_passing(),
+        "payouts": get_result_data.payouts,
+        "corners": get_result_data.corners,
+        "laps": get_result_data.laps,
+    }
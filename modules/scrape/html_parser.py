@@ -0,0 +1,58 @@
+import logging
+from itertools import zip_longest
+
+from bs4 import BeautifulSoup
+
+from modules.constants import URL
+
+logger = logging.getLogger(__name__)
+
+# BeautifulSoupで使えるパーサー。lxmlはCで実装されていて、html.parserより数倍速い
+PARSER_BACKENDS: tuple = ("lxml", "html.parser", "html5lib")
+
+
+def make_soup(html: str, parser: str = None) -> BeautifulSoup:
+    """
+    HTMLを解析する。parserを指定しない場合はURL.HTML_PARSERを使う。
+    CSSセレクター(select)はどのパーサーでも同じsoupsieveで処理される。
+    URL.COMPARE_HTML_PARSERを指定した場合は、そのパーサーでも解析して結果を比較し、違いをログに出す。
+    """
+    parser = parser or URL.HTML_PARSER
+    soup = BeautifulSoup(html, parser)
+    if URL.COMPARE_HTML_PARSER and URL.COMPARE_HTML_PARSER != parser:
+        compare_soups(soup, BeautifulSoup(html, URL.COMPARE_HTML_PARSER))
+    return soup
+
+
+def soup_fingerprint(soup: BeautifulSoup) -> list[tuple]:
+    """
+    スクレイパーが取り出す内容(リンク先と、表のセル・見出しのテキスト)を並べたもの
+    パーサーによって補完される<html><body>などの違いは含まない。
+    """
+    return [
+        (element.name, element.get("href", ""), element.get_text(strip=True))
+        for element in soup.select("a[href], th, td, h1, span, p")
+    ]
+
+
+def compare_soups(soup: BeautifulSoup, other: BeautifulSoup) -> bool:
+    """
+    2つのパーサーの解析結果を比較する。違いがあれば最初の違いをログに出してFalseを返す。
+    """
+    fingerprint, other_fingerprint = soup_fingerprint(soup), soup_fingerprint(other)
+    if fingerprint == other_fingerprint:
+        return True
+    for num, (element, other_element) in enumerate(
+        zip_longest(fingerprint, other_fingerprint)
+    ):
+        if element != other_element:
+            logger.warning(
+                "HTML parsers differ at element %d: %s=%s, %s=%s",
+                num,
+                soup.builder.NAME,
+                element,
+                other.builder.NAME,
+                other_element,
+            )
+            break
+    return False
@@ -0,0 +1,136 @@
+import copy
+import re
+
+import pandas as pd
+from bs4 import Tag
+from pandas.io.parsers import TextParser
+
+# pandas.read_htmlと同じ空白の扱い
+_RE_WHITESPACE = re.compile(r"[\r\n]+|\s{2,}")
+_RE_HIDDEN = re.compile(r"display:\s*none")
+
+
+def cell_text(cell: Tag) -> str:
+    return _RE_WHITESPACE.sub(" ", cell.get_text().strip())
+
+
+def _expand_spans(rows: list[list[Tag]], remainder: list = None) -> tuple[list, list]:
+    """
+    rowspan・colspanのあるセルを、pandas.read_htmlと同じように後続のセルに複製する。
+    戻り値の各セルは(テキスト, セル要素)
+    """
+    all_cells = []
+    remainder = remainder if remainder is not None else []
+    for cells in rows:
+        texts, next_remainder = [], []
+        index = 0
+        for cell in cells:
+            while remainder and remainder[0][0] <= index:
+                prev_index, prev_cell, prev_rowspan = remainder.pop(0)
+                texts.append(prev_cell)
+                if prev_rowspan > 1:
+                    next_remainder.append((prev_index, prev_cell, prev_rowspan - 1))
+                index += 1
+            rowspan = int(cell.get("rowspan") or 1)
+            colspan = int(cell.get("colspan") or 1)
+            for _ in range(colspan):
+                texts.append((cell_text(cell), cell))
+                if rowspan > 1:
+                    next_remainder.append((index, (cell_text(cell), cell), rowspan - 1))
+                index += 1
+        for prev_index, prev_cell, prev_rowspan in remainder:
+            texts.append(prev_cell)
+            if prev_rowspan > 1:
+                next_remainder.append((prev_index, prev_cell, prev_rowspan - 1))
+        all_cells.append(texts)
+        remainder = next_remainder
+    return all_cells, remainder
+
+
+def _row_cells(tr: Tag) -> list[Tag]:
+    return tr.find_all(["td", "th"], recursive=False)
+
+
+def table_rows(table: Tag) -> tuple[list[Tag], list[Tag], list[Tag]]:
+    """
+    テーブルの行を、pandas.read_htmlと同じように見出し・本文・フッターに分ける。
+    本文はtbodyの行と、tableの直下の行(tbodyがない場合)。
+    theadがない場合は、本文の先頭のthだけの行を見出しにする。
+    """
+    head_rows = table.select("thead tr")
+    body_rows = table.select("tbody tr") + table.find_all("tr", recursive=False)
+    foot_rows = table.select("tfoot tr")
+    if not head_rows:
+        while body_rows and all(cell.name == "th" for cell in _row_cells(body_rows[0])):
+            head_rows.append(body_rows.pop(0))
+    return head_rows, body_rows, foot_rows
+
+
+def clean_table(table: Tag) -> Tag:
+    """
+    非表示(display:none)の要素を取り除き、<br>を改行にしたテーブルのコピーを返す。
+    元のテーブル(soup)は変更しない。
+    """
+    table = copy.copy(table)
+    for element in table.find_all(style=_RE_HIDDEN):
+        element.decompose()
+    # pandas.read_htmlと同じく、<br>を改行にする("480<br>(+2)"は"480 (+2)"になる)
+    for br in table.find_all("br"):
+        br.replace_with("\n" + br.text)
+    return table
+
+
+def read_table(
+    table: Tag, link_columns: list[int] | dict[int, str] = (), max_rows: int = None
+) -> tuple[pd.DataFrame, dict[int, list[str]]]:
+    """
+    テーブルを1回だけ走査して、DataFrameと指定した列のリンク先を取得する。
+    DataFrameの列名・型は、pandas.read_html(str(table))[0]と同じになる。
+    非表示の行やセルはclean_tableで取り除いてから読み込む。渡したテーブルは変更しない。
+
+    Parameters
+    ----------
+    table : Tag
+        table要素
+    link_columns : list[int] | dict[int, str]
+        リンク先(最初のaタグのhref)を取得する列の番号
+        辞書の場合は、列の番号からセル内のaタグを選ぶセレクターへの辞書
+    max_rows : int
+        本文の先頭から読み込む行数(非表示の行は含めない)。指定しない場合はすべての行を読み込む
+
+    Returns
+    -------
+    df, links
+        linksは列の番号から、本文の行ごとのhref(リンクがない場合は"")のリストへの辞書
+    """
+    head_rows, body_rows, foot_rows = [
+        [_row_cells(tr) for tr in rows] for rows in table_rows(clean_table(table))
+    ]
+    if max_rows is not None:
+        body_rows = body_rows[:max_rows]
+    head, remainder = _expand_spans(head_rows)
+    body, _ = _expand_spans(body_rows, remainder)
+    foot, _ = _expand_spans(foot_rows)
+
+    if not isinstance(link_columns, dict):
+        link_columns = {column: None for column in link_columns}
+    links = {column: [] for column in link_columns}
+    for row in body:
+        for column, selector in link_columns.items():
+            anchor = None
+            if column < len(row):
+                cell = row[column][1]
+                anchor = cell.select_one(selector) if selector else cell.find("a")
+            links[column].append(str(anchor.get("href", "")) if anchor else "")
+
+    texts = [[text for text, _ in row] for row in head + body + foot]
+    header = None
+    if head:
+        if len(head) == 1:
+            header = 0
+        else:
+            header = [num for num, row in enumerate(texts[: len(head)]) if any(row)]
+    width = max((len(row) for row in texts), default=0)
+    texts = [row + [""] * (width - len(row)) for row in texts]
+    with TextParser(texts, header=header, thousands=",") as parser:
+        return parser.read(), links
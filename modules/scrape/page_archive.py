@@ -0,0 +1,171 @@
+import glob
+import hashlib
+import os
+import threading
+import time
+import zlib
+from typing import Iterator
+
+import numpy as np
+
+from modules.constants import URL
+from modules.scrape.page_type import get_page_type
+from modules.scrape.rate_limit import locked_file
+
+# インデックスの1レコード。ファイル全体をnumpy.memmapでそのまま読める固定長形式
+INDEX_DTYPE = np.dtype(
+    [
+        # URLのSHA-1。Sは末尾の0のバイトを取り除いてしまうため、生のバイト列のVにする
+        ("key", "V20"),
+        ("segment", "<u4"),
+        ("offset", "<u8"),
+        ("length", "<u4"),
+        ("fetched_at", "<f8"),
+        ("page_type", "<u1"),
+    ]
+)
+
+PAGE_TYPE_CODES: dict = {
+    page_type: code for code, page_type in enumerate(["other", *URL.PAGE_TYPES])
+}
+PAGE_TYPE_NAMES: dict = {code: page_type for page_type, code in PAGE_TYPE_CODES.items()}
+
+
+def url_key(url: str) -> bytes:
+    return hashlib.sha1(url.encode()).digest()
+
+
+class PageArchive:
+    """
+    取得したページを長期保存する、追記専用の圧縮アーカイブ
+    ページはzlibで圧縮してセグメントファイル(segment-000001.bin, ...)に追記し、
+    位置をインデックスファイル(index.bin)に固定長レコードで追記する。
+    同じURLが複数回保存された場合は、最後に保存したものを最新とする。
+    """
+
+    def __init__(
+        self,
+        directory: str = URL.PAGE_ARCHIVE_DIR,
+        segment_bytes: int = URL.PAGE_ARCHIVE_SEGMENT_BYTES,
+    ):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.index_path = os.path.join(directory, "index.bin")
+        self.lock_path = os.path.join(directory, "archive.lock")
+        self._lookup: dict[bytes, int] = {}
+        self._lookup_rows = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"segment-{segment:06d}.bin")
+
+    def _current_segment(self) -> int:
+        segments = sorted(glob.glob(os.path.join(self.directory, "segment-*.bin")))
+        if not segments:
+            return 1
+        segment = int(os.path.basename(segments[-1])[8:14])
+        if os.path.getsize(segments[-1]) >= self.segment_bytes:
+            segment += 1
+        return segment
+
+    def append(self, url: str, html: str, fetched_at: float = None, **meta):
+        """
+        ページを圧縮してアーカイブに追記する。
+        """
+        if not html:
+            return
+        payload = zlib.compress(f"{url}\n{html}".encode("utf-8", errors="replace"))
+        record = np.zeros(1, dtype=INDEX_DTYPE)
+        record["key"] = url_key(url)
+        record["length"] = len(payload)
+        record["fetched_at"] = fetched_at or time.time()
+        record["page_type"] = PAGE_TYPE_CODES.get(get_page_type(url), 0)
+        # 複数のプロセスから追記されても、セグメントとインデックスの対応が崩れないようにする
+        with locked_file(self.lock_path):
+            segment = self._current_segment()
+            with open(self._segment_path(segment), "ab") as f:
+                record["segment"] = segment
+                record["offset"] = f.tell()
+                f.write(payload)
+            with open(self.index_path, "ab") as f:
+                f.write(record.tobytes())
+
+    def set(self, url: str, html: str, **meta):
+        """
+        RecordingFetcherから保存するためのappendの別名
+        """
+        self.append(url, html, **meta)
+
+    def index(self) -> np.ndarray:
+        """
+        インデックスをメモリマップで読み込む。
+        """
+        if not os.path.exists(self.index_path):
+            return np.zeros(0, dtype=INDEX_DTYPE)
+        rows = os.path.getsize(self.index_path) // INDEX_DTYPE.itemsize
+        if rows == 0:
+            return np.zeros(0, dtype=INDEX_DTYPE)
+        return np.memmap(self.index_path, dtype=INDEX_DTYPE, mode="r", shape=(rows,))
+
+    def _refresh_lookup(self, index: np.ndarray):
+        """
+        前回から増えたインデックスのレコードだけを、URLのキーから行番号への辞書に追加する。
+        """
+        with self._lock:
+            for row in range(self._lookup_rows, len(index)):
+                self._lookup[bytes(index["key"][row])] = row
+            self._lookup_rows = len(index)
+
+    def _read_record(self, record) -> tuple[str, str]:
+        with open(self._segment_path(int(record["segment"])), "rb") as f:
+            f.seek(int(record["offset"]))
+            payload = f.read(int(record["length"]))
+        url, html = zlib.decompress(payload).decode("utf-8").split("\n", 1)
+        return url, html
+
+    def _read_url(self, record) -> str:
+        """
+        ページ全体を展開せずに、先頭に保存したURLだけを読む。
+        """
+        with open(self._segment_path(int(record["segment"])), "rb") as f:
+            f.seek(int(record["offset"]))
+            payload = f.read(min(int(record["length"]), 4096))
+        head = zlib.decompressobj().decompress(payload, 4096)
+        return head.split(b"\n", 1)[0].decode("utf-8")
+
+    def read(self, url: str) -> tuple[dict, str] | None:
+        """
+        URLの最新のページとそのメタ情報を取得する。ない場合はNoneを返す。
+        """
+        index = self.index()
+        self._refresh_lookup(index)
+        row = self._lookup.get(url_key(url))
+        if row is None:
+            return None
+        record = index[row]
+        stored_url, html = self._read_record(record)
+        if stored_url != url:
+            return None
+        return {"url": url, "fetched_at": float(record["fetched_at"])}, html
+
+    def entries(
+        self, page_types: list[str] = None, latest_only: bool = True
+    ) -> Iterator[tuple[str, float]]:
+        """
+        アーカイブに保存されているURLと取得日時を返す。
+        page_typesを指定した場合は、そのページの種類のみ返す。
+        """
+        index = self.index()
+        rows = np.arange(len(index))
+        if page_types is not None:
+            codes = [PAGE_TYPE_CODES[page_type] for page_type in page_types]
+            rows = rows[np.isin(index["page_type"], codes)]
+        if latest_only:
+            # 同じURLの中で最後の行だけを残す
+            keys = index["key"][rows][::-1]
+            _, first = np.unique(keys, return_index=True)
+            rows = np.sort(rows[::-1][first])
+        for row in rows:
+            url = self._read_url(index[row])
+            yield url, float(index["fetched_at"][row])
@@ -0,0 +1,382 @@
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlsplit
+
+from modules.constants import URL
+from modules.scrape.fetcher import Fetcher
+from modules.scrape.html_parser import make_soup, soup_fingerprint
+from modules.scrape.page_type import get_page_type
+from modules.scrape.retry import DEFAULT_RETRY_POLICY
+from modules.scrape.single_flight import SingleFlight, get_fetch_flight
+
+
+def _race_date(race_id: str) -> datetime.date | None:
+    """
+    レースID(yyyyllmmddrr)から開催日を取得する。
+    """
+    try:
+        return datetime.date(int(race_id[:4]), int(race_id[6:8]), int(race_id[8:10]))
+    except (ValueError, IndexError):
+        return None
+
+
+def get_page_ttl(url: str) -> float | None:
+    """
+    ページの有効期限(秒)を取得する。
+    None: 期限なし / 0: キャッシュしない
+    終了したレースの結果ページと、過去の月のカレンダーは変わらないため期限なしとする。
+    """
+    page_type = get_page_type(url)
+    ttl = URL.PAGE_CACHE_TTL.get(page_type, 0)
+    query = parse_qs(urlsplit(url).query)
+    today = datetime.date.today()
+    if page_type == "result":
+        race_date = _race_date(query.get("race_id", [""])[0])
+        if race_date is None or race_date >= today:
+            return URL.PAGE_CACHE_TTL_RECENT
+    elif page_type == "calendar":
+        try:
+            year, month = int(query["year"][0]), int(query["month"][0])
+        except (KeyError, ValueError):
+            return URL.PAGE_CACHE_TTL_RECENT
+        if (year, month) >= (today.year, today.month):
+            return URL.PAGE_CACHE_TTL_RECENT
+    return ttl
+
+
+def has_ready_element(html: str, page_type: str) -> bool:
+    """
+    ページの種類ごとの主要な要素(READY_SELECTORSのクラス名・ID)がHTMLに含まれるか確認する。
+    """
+    selector = URL.READY_SELECTORS.get(page_type)
+    if selector is None:
+        return True
+    return any(name in html for name in re.findall(r"[.#]([\w-]+)", selector))
+
+
+def content_hash(html: str) -> str:
+    return hashlib.sha1(html.encode("utf-8", errors="replace")).hexdigest()
+
+
+def page_content_hash(url: str, html: str) -> str:
+    """
+    ページの内容の部分(URL.PAGE_CONTENT_SELECTORS)から、スクレイパーが読むリンク先とテキストだけをハッシュする。
+    内容の部分が見つからない場合は、HTML全体のハッシュを返す。
+    """
+    selector = URL.PAGE_CONTENT_SELECTORS.get(
+        get_page_type(url), URL.PAGE_CONTENT_SELECTOR_DEFAULT
+    )
+    elements = make_soup(html).select(selector)
+    if not elements:
+        return content_hash(html)
+    return content_hash(repr([soup_fingerprint(element) for element in elements]))
+
+
+class DiskPageCache:
+    """
+    URLをキーにして、取得したページをgzipで圧縮してディスクに保存するキャッシュ
+    ファイルの先頭行にURLと取得日時をJSONで書き、2行目以降にHTMLを書く。
+    """
+
+    def __init__(self, directory: str = URL.PAGE_CACHE_DIR):
+        self.directory = directory
+
+    def _path(self, url: str) -> str:
+        key = hashlib.sha1(url.encode()).hexdigest()
+        return os.path.join(self.directory, key[:2], f"{key}.html.gz")
+
+    def read(self, url: str) -> tuple[dict, str] | None:
+        """
+        有効期限に関係なく、保存されているページとそのメタ情報を取得する。
+        """
+        path = self._path(url)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                meta = json.loads(f.readline())
+                html = f.read()
+        except (OSError, ValueError, EOFError):
+            return None
+        if meta.get("url") != url:
+            return None
+        return meta, html
+
+    def get_entry(self, url: str) -> tuple[dict, str] | None:
+        """
+        有効期限内のページとそのメタ情報を取得する。ない場合はNoneを返す。
+        """
+        ttl = get_page_ttl(url)
+        if ttl == 0:
+            return None
+        entry = self.read(url)
+        if entry is None:
+            return None
+        if ttl is not None and time.time() - entry[0]["fetched_at"] > ttl:
+            return None
+        return entry
+
+    def get(self, url: str) -> str | None:
+        """
+        有効期限内のページを取得する。ない場合はNoneを返す。
+        """
+        entry = self.get_entry(url)
+        return entry[1] if entry is not None else None
+
+    def set(self, url: str, html: str, **meta):
+        """
+        ページを保存する。期限なしのページは、主要な要素を含む場合のみ保存する。
+        """
+        ttl = get_page_ttl(url)
+        if ttl == 0 or not html:
+            return
+        if ttl is None and not has_ready_element(html, get_page_type(url)):
+            return
+        self.write(url, html, **meta)
+
+    def write(self, url: str, html: str, **meta):
+        """
+        有効期限に関係なく、ページを保存する。
+        """
+        path = self._path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        meta = {
+            "url": url,
+            "fetched_at": time.time(),
+            "sha1": content_hash(html),
+            **meta,
+        }
+        # 書き込み途中のファイルを読まないよう、一時ファイルに書いてから置き換える
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.open(
+                raw, "wt", encoding="utf-8"
+            ) as f:
+                f.write(json.dumps(meta, ensure_ascii=False) + "\n")
+                f.write(html)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def delete(self, url: str):
+        try:
+            os.remove(self._path(url))
+        except FileNotFoundError:
+            pass
+
+    def _processed_path(self, url: str) -> str:
+        return self._path(url)[: -len(".html.gz")] + ".processed"
+
+    def get_processed(self, url: str) -> str | None:
+        """
+        最後に処理が完了したページのハッシュを取得する。
+        ページの有効期限や破棄(delete)とは別に保存する。
+        """
+        try:
+            with open(self._processed_path(url), encoding="utf-8") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def set_processed(self, url: str, sha1: str):
+        path = self._processed_path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(sha1)
+
+
+class MemoryPageCache:
+    """
+    プロセス内で共有する、メモリ上のページキャッシュ
+    HTMLの合計サイズがmax_bytesを超えたら、最も長く使われていないページから削除する。
+    """
+
+    def __init__(self, max_bytes: int = URL.MEMORY_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._pages: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> str | None:
+        ttl = get_page_ttl(url)
+        with self._lock:
+            entry = self._pages.get(url)
+            if entry is not None and ttl is not None and time.time() - entry[0] > ttl:
+                self._remove(url)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._pages.move_to_end(url)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, url: str, html: str, fetched_at: float = None):
+        if get_page_ttl(url) == 0 or not html:
+            return
+        size = sys.getsizeof(html)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if url in self._pages:
+                self._remove(url)
+            self._pages[url] = (fetched_at or time.time(), html)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                oldest = next(iter(self._pages))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, url: str):
+        _, html = self._pages.pop(url)
+        self.bytes -= sys.getsizeof(html)
+
+    def delete(self, url: str):
+        with self._lock:
+            if url in self._pages:
+                self._remove(url)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        """
+        キャッシュのヒット数・ミス数などを取得する。
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "pages": len(self._pages),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+_memory_cache = None
+_memory_cache_lock = threading.Lock()
+
+
+def get_memory_cache() -> MemoryPageCache:
+    """
+    プロセス内で共有するMemoryPageCacheを取得する。
+    """
+    global _memory_cache
+    with _memory_cache_lock:
+        if _memory_cache is None:
+            _memory_cache = MemoryPageCache()
+        return _memory_cache
+
+
+class CachedFetcher(Fetcher):
+    """
+    ページキャッシュを通してページを取得するFetcher
+    メモリ、ディスクの順にキャッシュを探し、有効なページがあればネットワークにアクセスしない。
+    同じURLの取得が他のスレッドで実行中の場合は、その結果を待って共有する。
+    """
+
+    def __init__(
+        self,
+        fetcher: Fetcher,
+        cache: DiskPageCache = None,
+        memory_cache: MemoryPageCache = None,
+        flight: SingleFlight = None,
+    ):
+        self.fetcher = fetcher
+        self.cache = cache if cache is not None else DiskPageCache()
+        self.memory_cache = (
+            memory_cache if memory_cache is not None else get_memory_cache()
+        )
+        self.flight = flight if flight is not None else get_fetch_flight()
+
+    def fetch(self, url: str) -> str:
+        html = self.memory_cache.get(url)
+        if html is not None:
+            return html
+        return self.flight.do(url, lambda: self._fetch_miss(url))
+
+    def _fetch_miss(self, url: str) -> str:
+        entry = self.cache.get_entry(url)
+        if entry is not None:
+            meta, html = entry
+            self.memory_cache.set(url, html, meta["fetched_at"])
+            return html
+        # 次回の再検証で使えるよう、ETag・Last-Modifiedも保存する
+        html, validators = self.fetcher.fetch_conditional(url)
+        self.cache.set(url, html, **validators)
+        self.memory_cache.set(url, html)
+        return html
+
+    def request(self, url: str) -> str:
+        return self.fetcher.request(url)
+
+    def fetch_if_modified(self, url: str) -> str | None:
+        """
+        保存しているETag・Last-Modifiedで再検証し、最後に処理が完了したとき(mark_processed)から
+        変更があればHTMLを、なければNoneを返す。
+        比べるのは処理済みのページのハッシュで、他の呼び出し元(先読みなど)が最後に保存したページではない。
+        ハッシュはページの内容の部分だけから計算するため、広告などが変わっただけではNoneを返す。
+        有効期限は無視して再検証する。ただし、URL.REVALIDATE_MAX_AGE秒以内に取得・再検証したページ
+        (先読みで再検証したページなど)は再検証し直さない。
+        再検証のリクエストはfetch_with_retryと同じポリシーでリトライする。
+        """
+        html = self.flight.do(f"revalidate:{url}", lambda: self._revalidate(url))
+        if page_content_hash(url, html) == self.cache.get_processed(url):
+            return None
+        return html
+
+    def _revalidate(self, url: str) -> str:
+        entry = self.cache.read(url)
+        meta, cached_html = entry if entry is not None else ({}, None)
+        if (
+            cached_html is not None
+            and time.time() - meta["fetched_at"] < URL.REVALIDATE_MAX_AGE
+        ):
+            self.memory_cache.set(url, cached_html, meta["fetched_at"])
+            return cached_html
+        policy = getattr(self.fetcher, "retry_policy", None) or DEFAULT_RETRY_POLICY
+        html, validators = policy.call(
+            url,
+            lambda: self.fetcher.fetch_conditional(
+                url, meta.get("etag"), meta.get("last_modified")
+            ),
+            restart=self.fetcher.restart,
+        )
+        if html is None:
+            # 変更なし(304)。取得日時だけ更新して、有効期限を延ばす
+            html = cached_html
+            validators = validators or {
+                k: meta[k] for k in ("etag", "last_modified") if k in meta
+            }
+        self.cache.set(url, html, **validators)
+        self.memory_cache.set(url, html)
+        return html
+
+    def mark_processed(self, url: str, html: str):
+        self.cache.set_processed(url, page_content_hash(url, html))
+
+    def invalidate(self, url: str):
+        self.cache.delete(url)
+        self.memory_cache.delete(url)
+
+    def restart(self):
+        self.fetcher.restart()
+
+    def quit(self):
+        self.fetcher.quit()
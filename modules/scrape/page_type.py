@@ -0,0 +1,15 @@
+from modules.constants import URL
+
+
+def get_page_type(url: str) -> str:
+    """
+    URLからページの種類を取得する。
+    前方一致が長いものを優先する。(horse/ped/ は horse/ より優先)
+    """
+    page_types = sorted(
+        URL.PAGE_TYPES.items(), key=lambda item: len(item[1]), reverse=True
+    )
+    for page_type, prefix in page_types:
+        if url.startswith(prefix):
+            return page_type
+    return "other"
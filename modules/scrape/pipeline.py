@@ -0,0 +1,151 @@
+import multiprocessing
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterable
+
+from modules.constants import URL
+
+# 待ち行列の終わりを表す値
+_DONE = object()
+
+
+class ParsePipeline:
+    """
+    ページの取得・解析・DBへの書き込みを別々に並行して行うパイプライン
+    fetch(スレッド) -> 上限付きの待ち行列 -> parse(プロセスプール) -> write(呼び出し元のスレッド)
+    ダウンロードを待つ間も他のページの解析が進み、解析はCPUのコア数に応じて並列になる。
+    待ち行列が一杯になると取得を止めるため、解析が遅れてもメモリに溜め込まない。
+
+    fetch(item) -> pages | None
+        ページを取得する。Noneを返した場合は、解析も書き込みもしない(変更なしなど)
+    parse(item, pages) -> record
+        ページを解析する。プロセスプールで実行するため、モジュールの関数で、引数と戻り値はpickleできるもの
+        プロセスはURL.PARSE_MP_CONTEXT(spawn)で起動するため、ネットワークやブラウザには触れず、
+        渡されたページの文字列だけを解析すること
+    write(item, record)
+        解析結果をDBに書き込む。呼び出し元のスレッドで1件ずつ実行される
+    """
+
+    def __init__(
+        self,
+        fetch: Callable,
+        parse: Callable,
+        write: Callable,
+        concurrency: int = URL.CONCURRENCY,
+        processes: int = URL.PARSE_PROCESSES,
+        queue_size: int = URL.PARSE_QUEUE_SIZE,
+    ):
+        self.fetch = fetch
+        self.parse = parse
+        self.write = write
+        self.concurrency = concurrency
+        self.processes = processes
+        self.queue_size = queue_size
+
+    def _fetch_stage(
+        self, items: list, fetched: queue.Queue, cancelled: threading.Event
+    ):
+        def _fetch(item):
+            if cancelled.is_set():
+                return
+            try:
+                fetched.put((item, self.fetch(item), None))
+            except Exception as e:
+                fetched.put((item, None, e))
+
+        with ThreadPoolExecutor(self.concurrency) as executor:
+            list(executor.map(_fetch, items))
+        fetched.put(_DONE)
+
+    def _parse_stage(
+        self,
+        fetched: queue.Queue,
+        parsed: queue.Queue,
+        executor: ProcessPoolExecutor,
+        cancelled: threading.Event,
+    ):
+        # 解析中のページも上限に含め、取得が解析を追い越しすぎないようにする
+        in_flight = threading.BoundedSemaphore(self.queue_size)
+        while True:
+            entry = fetched.get()
+            if entry is _DONE:
+                break
+            item, pages, error = entry
+            if cancelled.is_set():
+                continue
+            if error is not None or pages is None:
+                parsed.put((item, None, error))
+                continue
+            if executor is None:
+                try:
+                    parsed.put((item, self.parse(item, pages), None))
+                except Exception as e:
+                    parsed.put((item, None, e))
+                continue
+            in_flight.acquire()
+            future = executor.submit(self.parse, item, pages)
+            future.add_done_callback(lambda _: in_flight.release())
+            # 解析の結果は、書き込み側でFutureから受け取る
+            parsed.put((item, future, None))
+        parsed.put(_DONE)
+
+    def run(self, items: Iterable, on_done: Callable = None) -> list:
+        """
+        itemsのそれぞれについて、取得・解析・書き込みを行う。
+        on_done(item, error)は書き込みが終わるか失敗するたびに、呼び出し元のスレッドで呼ばれる。
+        失敗したitemとその例外のリストを返す。
+        """
+        items = list(dict.fromkeys(items))
+        fetched = queue.Queue(self.queue_size)
+        parsed = queue.Queue()
+        cancelled = threading.Event()
+        executor = (
+            ProcessPoolExecutor(
+                self.processes,
+                mp_context=multiprocessing.get_context(URL.PARSE_MP_CONTEXT),
+            )
+            if self.processes > 0
+            else None
+        )
+        failed = []
+        threads = [
+            threading.Thread(
+                target=self._fetch_stage, args=(items, fetched, cancelled), daemon=True
+            ),
+            threading.Thread(
+                target=self._parse_stage,
+                args=(fetched, parsed, executor, cancelled),
+                daemon=True,
+            ),
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                entry = parsed.get()
+                if entry is _DONE:
+                    break
+                item, record, error = entry
+                if isinstance(record, Future):
+                    try:
+                        record = record.result()
+                    except Exception as e:
+                        record, error = None, e
+                if error is None and record is not None:
+                    try:
+                        self.write(item, record)
+                    except Exception as e:
+                        error = e
+                if error is not None:
+                    failed.append((item, error))
+                if on_done is not None:
+                    on_done(item, error)
+        finally:
+            # 途中で終了した場合は、残りのページを取得・解析せずに読み捨てる
+            cancelled.set()
+            for thread in threads:
+                thread.join()
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        return failed
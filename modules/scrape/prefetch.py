@@ -0,0 +1,95 @@
+import queue
+import threading
+from typing import Iterable
+
+from modules.constants import URL
+from modules.scrape.fetcher import Fetcher
+
+
+class Prefetcher:
+    """
+    バックグラウンドのスレッドでページを先に取得して、ページキャッシュを温めるクラス
+    CachedFetcherを渡すと、後で同じURLを取得するときにキャッシュから返される。
+    先読み中のURLを取得した場合は、CachedFetcherのSingleFlightで先読みの結果を待って共有する。
+    revalidate=Trueで追加したURLは、fetch_if_modifiedで再検証する。再検証したページは
+    URL.REVALIDATE_MAX_AGE秒の間、後のfetch_if_modifiedで再検証し直さずに使われる。
+    リクエストの間隔はFetcher側のレート制限で守られる。
+    """
+
+    def __init__(self, fetcher: Fetcher, workers: int = URL.PREFETCH_WORKERS):
+        self.fetcher = fetcher
+        self.fetched = 0
+        self.failed = 0
+        self._queue: queue.Queue = queue.Queue()
+        self._seen: set[str] = set()
+        self._lock = threading.Lock()
+        self._threads = [
+            threading.Thread(target=self._work, daemon=True) for _ in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def submit(self, urls: Iterable[str], revalidate: bool = False):
+        """
+        URLを先読みの待ち行列に追加する。一度追加したURLは追加しない。
+        revalidate=Trueの場合は、キャッシュの有効期限に関係なく再検証する。
+        """
+        with self._lock:
+            urls = [url for url in dict.fromkeys(urls) if url not in self._seen]
+            self._seen.update(urls)
+        for url in urls:
+            self._queue.put((url, revalidate))
+
+    def _work(self):
+        while True:
+            entry = self._queue.get()
+            try:
+                if entry is None:
+                    return
+                url, revalidate = entry
+                if revalidate:
+                    self.fetcher.fetch_if_modified(url)
+                else:
+                    self.fetcher.fetch(url)
+                with self._lock:
+                    self.fetched += 1
+            except Exception:
+                # 先読みの失敗は、本番の取得時にリトライされるため無視する
+                with self._lock:
+                    self.failed += 1
+            finally:
+                self._queue.task_done()
+
+    def join(self):
+        """
+        待ち行列のURLをすべて取得し終えるまで待機する。
+        """
+        self._queue.join()
+
+    def cancel(self):
+        """
+        まだ取得していないURLを待ち行列から取り除く。
+        """
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._queue.task_done()
+
+    def close(self, wait: bool = False):
+        """
+        スレッドを終了する。wait=Falseの場合は、取得していないURLを破棄する。
+        """
+        if not wait:
+            self.cancel()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
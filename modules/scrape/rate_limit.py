@@ -0,0 +1,187 @@
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from modules.constants import URL
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+
+class TokenBucket:
+    """
+    トークンバケットによるレート制限
+    rate: 1秒あたりに補充されるトークン数
+    capacity: バケットに貯められるトークンの上限（連続して取得できる回数）
+    """
+
+    def __init__(
+        self,
+        rate: float = URL.REQUESTS_PER_SECOND,
+        capacity: int = URL.REQUEST_BURST,
+    ):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        トークンを1つ予約し、使えるようになるまでの待機秒数を返す。
+        トークンが足りない場合は負債として予約するため、呼び出し順に間隔が空く。
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated_at) * self.rate
+            )
+            self.updated_at = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        """
+        トークンが使えるようになるまで待機する。
+        """
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+@contextmanager
+def locked_file(path: str):
+    """
+    ファイルを開いて排他ロックをかける。プロセス間・スレッド間の両方で排他になる。
+    """
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield f
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield f
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def try_lock_file(path: str):
+    """
+    ファイルを開いて、待たずに排他ロックをかける。
+    ロックできた場合は開いたファイルを返し、他のプロセスがロックしている場合はNoneを返す。
+    ロックはファイルを閉じると解除される。
+    """
+    f = open(path, "a+b")
+    try:
+        if os.name == "nt":
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    複数のプロセスで共有するトークンバケット
+    トークン数と更新時刻をロックファイルに保存し、ロックをかけて読み書きする。
+    同じホストにアクセスするプロセスが何個あっても、合計のリクエスト数はrateを超えない。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        rate: float = URL.REQUESTS_PER_SECOND,
+        capacity: int = URL.REQUEST_BURST,
+    ):
+        super().__init__(rate, capacity)
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def reserve(self) -> float:
+        with locked_file(self.path) as f:
+            f.seek(0)
+            try:
+                tokens, updated_at = map(float, f.read().decode().split())
+            except ValueError:
+                tokens, updated_at = float(self.capacity), time.time()
+            now = time.time()
+            tokens = min(self.capacity, tokens + max(now - updated_at, 0) * self.rate)
+            tokens -= 1
+            f.seek(0)
+            f.truncate()
+            f.write(f"{tokens} {now}".encode())
+            f.flush()
+        if tokens >= 0:
+            return 0.0
+        return -tokens / self.rate
+
+
+def get_rate_limit_path(host: str) -> str:
+    directory = URL.RATE_LIMIT_DIR or os.path.join(
+        tempfile.gettempdir(), "nar_db_rate_limit"
+    )
+    return os.path.join(directory, f"{host.replace(':', '_')}.lock")
+
+
+class HostLimiter:
+    """
+    ホストごとの同時接続数とリクエスト間隔を制限するクラス
+    URL.SHARED_RATE_LIMITがTrueの場合は、リクエスト間隔を他のプロセスと共有する。
+    """
+
+    def __init__(self, host: str = "", concurrency: int = URL.CONCURRENCY):
+        if URL.SHARED_RATE_LIMIT and host:
+            self.bucket = SharedTokenBucket(get_rate_limit_path(host))
+        else:
+            self.bucket = TokenBucket()
+        self.semaphore = threading.BoundedSemaphore(concurrency)
+
+    @contextmanager
+    def slot(self):
+        """
+        同時接続数の枠を確保し、トークンを取得してからリクエストを行う。
+        """
+        with self.semaphore:
+            self.bucket.acquire()
+            yield
+
+
+_host_limiters: dict[str, HostLimiter] = {}
+_host_limiters_lock = threading.Lock()
+
+
+def get_host(url: str) -> str:
+    return urlsplit(url).netloc
+
+
+def get_host_limiter(url: str) -> HostLimiter:
+    """
+    URLのホストに対応するHostLimiterを取得する。プロセス内で共有される。
+    """
+    host = get_host(url)
+    with _host_limiters_lock:
+        if host not in _host_limiters:
+            _host_limiters[host] = HostLimiter(host)
+        return _host_limiters[host]
@@ -0,0 +1,102 @@
+from modules.scrape.fetcher import Fetcher
+from modules.scrape.page_cache import DiskPageCache
+from modules.scrape.retry import PageNotFoundError, RetryPolicy
+
+
+class HtmlArchive(DiskPageCache):
+    """
+    URLをキーにしたHTMLのアーカイブ
+    ページキャッシュと同じ形式のディレクトリで、有効期限に関係なくすべてのページを保存する。
+    """
+
+    def set(self, url: str, html: str, **meta):
+        if html:
+            self.write(url, html, **meta)
+
+
+class RecordingFetcher(Fetcher):
+    """
+    取得したページをアーカイブに保存するFetcher
+    保存したアーカイブはReplayFetcherで再生できる。
+    archiveには、ディレクトリのパスか、set(url, html)で保存するもの(PageArchiveなど)を渡す。
+    """
+
+    def __init__(self, fetcher: Fetcher, archive):
+        self.fetcher = fetcher
+        self.archive = HtmlArchive(archive) if isinstance(archive, str) else archive
+
+    def fetch(self, url: str) -> str:
+        html = self.fetcher.fetch(url)
+        self.archive.set(url, html)
+        return html
+
+    def fetch_conditional(
+        self, url: str, etag: str = None, last_modified: str = None
+    ) -> tuple[str | None, dict]:
+        html, validators = self.fetcher.fetch_conditional(url, etag, last_modified)
+        if html is not None:
+            self.archive.set(url, html)
+        return html, validators
+
+    def request(self, url: str) -> str:
+        return self.fetcher.request(url)
+
+    def fetch_if_modified(self, url: str) -> str | None:
+        html = self.fetcher.fetch_if_modified(url)
+        if html is not None:
+            self.archive.set(url, html)
+        return html
+
+    def mark_processed(self, url: str, html: str):
+        self.fetcher.mark_processed(url, html)
+
+    def invalidate(self, url: str):
+        self.fetcher.invalidate(url)
+
+    def restart(self):
+        self.fetcher.restart()
+
+    def quit(self):
+        self.fetcher.quit()
+
+
+class PageSet(dict):
+    """
+    URLからHTMLへの辞書
+    ReplayFetcherに渡すと、取得済みのページをスクレイパーで解析できる。
+    """
+
+    def read(self, url: str) -> tuple[dict, str] | None:
+        html = self.get(url)
+        if html is None:
+            return None
+        return {"url": url}, html
+
+
+class ReplayFetcher(Fetcher):
+    """
+    アーカイブからページを取得するFetcher
+    ネットワークにはアクセスせず、レート制限もかけない。
+    アーカイブにないページはPageNotFoundErrorを送出する。
+    archiveには、read(url)で(meta, html)を返すものを渡す。
+    同じページを解析し直しても結果は変わらないため、解析の失敗はリトライしない。
+    """
+
+    retry_policy = RetryPolicy(retries=0)
+
+    def __init__(self, archive):
+        self.archive = HtmlArchive(archive) if isinstance(archive, str) else archive
+
+    def fetch(self, url: str) -> str:
+        entry = self.archive.read(url)
+        if entry is None:
+            raise PageNotFoundError(f"Not found in archive: {url}")
+        return entry[1]
+
+    def request(self, url: str) -> str:
+        return self.fetch(url)
+
+    def fetch_conditional(
+        self, url: str, etag: str = None, last_modified: str = None
+    ) -> tuple[str | None, dict]:
+        return self.fetch(url), {}
@@ -0,0 +1,224 @@
+import random
+import threading
+import time
+from typing import Callable
+
+import requests
+from selenium.common.exceptions import TimeoutException
+
+from modules.constants import URL
+from modules.scrape.rate_limit import get_host
+
+
+class FetchError(Exception):
+    """
+    ページの取得・解析に失敗したときの例外
+    kind: timeout / client(4xx) / server(5xx) / rate_limited(429) / parse
+          / missing(アーカイブにない) / other
+    """
+
+    def __init__(self, message: str, kind: str = "other"):
+        super().__init__(message)
+        self.kind = kind
+
+
+class ParseError(FetchError):
+    def __init__(self, message: str):
+        super().__init__(message, kind="parse")
+
+
+class PageNotFoundError(FetchError):
+    def __init__(self, message: str):
+        super().__init__(message, kind="missing")
+
+
+class CircuitOpenError(FetchError):
+    def __init__(self, message: str):
+        super().__init__(message, kind="circuit_open")
+
+
+def classify_error(error: Exception) -> str:
+    """
+    例外を種類ごとに分類する。
+    """
+    if isinstance(error, FetchError):
+        return error.kind
+    if isinstance(error, (requests.Timeout, TimeoutException, TimeoutError)):
+        return "timeout"
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        if status == 429:
+            return "rate_limited"
+        if 400 <= status < 500:
+            return "client"
+        if status >= 500:
+            return "server"
+    return "other"
+
+
+# サイト側の障害とみなす（サーキットブレーカーに数える）エラーの種類
+HOST_FAILURE_KINDS: tuple = ("timeout", "server", "rate_limited", "other")
+# リトライしても結果が変わらないエラーの種類
+PERMANENT_KINDS: tuple = ("client", "missing")
+# 接続を作り直してからリトライするエラーの種類
+RESTART_KINDS: tuple = ("timeout", "other")
+
+
+class CircuitBreaker:
+    """
+    ホストごとのサーキットブレーカー
+    連続してthreshold回失敗したら、cooldown秒の間そのホストへのリクエストを全スレッドで止める。
+    cooldownが過ぎたら半開状態にして、1つのリクエストだけを試しに通す。
+    試したリクエストが成功したら閉じ(通常に戻し)、失敗したらもう一度cooldown秒の間開く。
+    試している間、他のスレッドはその結果を待つ。
+    """
+
+    def __init__(
+        self,
+        threshold: int = URL.BREAKER_THRESHOLD,
+        cooldown: float = URL.BREAKER_COOLDOWN,
+    ):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_until = 0.0
+        # 半開状態で、試しのリクエストを実行中かどうか
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return time.monotonic() < self.opened_until
+
+    @property
+    def is_half_open(self) -> bool:
+        return self.opened_until > 0 and not self.is_open
+
+    def wait(self, max_wait: float = None):
+        """
+        ブレーカーが開いている間は待機する。max_waitを超える場合はCircuitOpenErrorを送出する。
+        半開状態では、最初に呼んだスレッドだけを試しのリクエストとして通し、他のスレッドは結果を待つ。
+        """
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if self.opened_until == 0:
+                    return
+                if now >= self.opened_until and not self.trial_running:
+                    self.trial_running = True
+                    return
+                # 試しのリクエストの結果が出るまでは、短い間隔で確認する
+                remaining = (
+                    self.opened_until - now
+                    if now < self.opened_until
+                    else URL.BREAKER_POLL_INTERVAL
+                )
+            if deadline is not None and now + remaining > deadline:
+                raise CircuitOpenError(f"Circuit is open for {remaining:.0f} seconds")
+            time.sleep(remaining)
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_until = 0.0
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.threshold:
+                self.opened_until = time.monotonic() + self.cooldown
+            self.trial_running = False
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(url: str) -> CircuitBreaker:
+    """
+    URLのホストに対応するCircuitBreakerを取得する。プロセス内で共有される。
+    """
+    host = get_host(url)
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker()
+        return _breakers[host]
+
+
+class RetryPolicy:
+    """
+    指数バックオフとジッターでリトライするポリシー
+    """
+
+    def __init__(
+        self,
+        retries: int = URL.RETRY_COUNT,
+        base_wait: float = URL.RETRY_BASE_WAIT,
+        max_wait: float = URL.RETRY_WAIT_TIME,
+    ):
+        self.retries = retries
+        self.base_wait = base_wait
+        self.max_wait = max_wait
+
+    def wait_time(self, attempt: int) -> float:
+        """
+        attempt回目の失敗後の待機秒数。上限の半分から上限までの間でランダムに決める。
+        """
+        wait = min(self.max_wait, self.base_wait * 2**attempt)
+        return random.uniform(wait / 2, wait)
+
+    def call(self, url: str, func: Callable, restart: Callable = None):
+        """
+        funcを実行し、失敗した場合はエラーの種類に応じてリトライする。
+        restartは、接続を作り直す必要があるエラーのときに呼ばれる。
+        """
+        breaker = get_circuit_breaker(url)
+        for attempt in range(self.retries + 1):
+            breaker.wait()
+            try:
+                result = func()
+            except Exception as e:
+                kind = classify_error(e)
+                if kind in HOST_FAILURE_KINDS:
+                    breaker.record_failure()
+                else:
+                    # 4xxや解析の失敗は、ホストが応答しているので成功として数える
+                    breaker.record_success()
+                if kind in PERMANENT_KINDS or attempt == self.retries:
+                    raise FetchError(f"Error fetching {url} ({kind}): {e}", kind) from e
+                if restart is not None and kind in RESTART_KINDS:
+                    restart()
+                time.sleep(self.wait_time(attempt))
+            else:
+                breaker.record_success()
+                return result
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+
+def fetch_with_retry(
+    fetcher, url: str, parse: Callable = None, policy: RetryPolicy = None
+):
+    """
+    ページを取得してparseで解析する。取得と解析の失敗はpolicyに従ってリトライする。
+    parseが例外を送出した場合は、解析の失敗(ParseError)として扱う。
+    policyを指定しない場合は、fetcherのretry_policyか、DEFAULT_RETRY_POLICYを使う。
+    """
+    if policy is None:
+        policy = getattr(fetcher, "retry_policy", None) or DEFAULT_RETRY_POLICY
+
+    def _fetch_and_parse():
+        html = fetcher.fetch(url)
+        if parse is None:
+            return html
+        try:
+            return parse(html)
+        except Exception as e:
+            # 壊れたページをキャッシュから返さないよう破棄してからリトライする
+            fetcher.invalidate(url)
+            raise ParseError(f"Error parsing {url}: {e}") from e
+
+    return policy.call(url, _fetch_and_parse, restart=fetcher.restart)
@@ -0,0 +1,60 @@
+import threading
+from typing import Callable
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    同じキーの処理が実行中の場合は、新たに実行せずにその結果を待って共有する。
+    同じURLを複数のスレッドが同時に取得しようとしたとき、ダウンロードを1回にまとめるために使う。
+    """
+
+    def __init__(self):
+        self._calls: dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    def do(self, key: str, func: Callable):
+        """
+        keyの処理が実行中でなければfuncを実行し、実行中であればその結果を待って返す。
+        funcが例外を送出した場合は、待っていたスレッドにも同じ例外を送出する。
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                self.shared += 1
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+
+_fetch_flight = SingleFlight()
+
+
+def get_fetch_flight() -> SingleFlight:
+    """
+    プロセス内で共有する、ページ取得用のSingleFlightを取得する。
+    """
+    return _fetch_flight
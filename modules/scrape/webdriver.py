@@ -1,5 +1,26 @@
 from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.support.ui import WebDriverWait
+from contextlib import contextmanager
+import atexit
+import logging
+import os
+import queue
+import threading
 import time
+import traceback
+import uuid
+import psutil
+
+from modules.constants import URL
+from modules.scrape.rate_limit import get_host_limiter
+from modules.scrape.page_type import get_page_type
+from modules.scrape.browser_profile import BrowserProfiles, ProfileSlot
+
+logger = logging.getLogger(__name__)
+
+# ChromeManagerが起動したChromeに付けるコマンドライン引数。残ったプロセスを見つけるために使う
+OWNER_SWITCH = "--nar-db-owner"
 
 
 class WebDriver:
@@ -7,8 +28,14 @@ class WebDriver:
     WebDriverクラス
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        page_load_strategy: str = "normal",
+        owner: str = "",
+        profile: ProfileSlot = None,
+    ):
         self._driver = None
+        self.page_load_strategy = page_load_strategy
         self.options = webdriver.ChromeOptions()
 
         # for running in background
@@ -27,11 +54,9 @@ class WebDriver:
 
         # for avoiding error
         # self.options.add_argument("--disable-dev-shm-usage") # for linux
-        self.options.add_argument(
-            "--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            + "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/88.0.4324.150 Safari/537.36"
-        )
-        self.options.page_load_strategy = "normal"  # "eager"
+        self.options.add_argument(f"--user-agent={URL.USER_AGENT}")
+        # "none"の場合は、読み込みの完了をwait_for_page_loadで待つ
+        self.options.page_load_strategy = page_load_strategy
         self.options.add_argument("log-level=3")
         self.options.add_argument("disable-logging")
         self.options.add_experimental_option("excludeSwitches", ["enable-logging"])
@@ -40,24 +65,690 @@ class WebDriver:
         self.options.add_experimental_option("excludeSwitches", ["enable-automation"])
         self.options.add_experimental_option("useAutomationExtension", False)
 
+        # 起動元を記録して、終了し忘れたChromeを後から見つけられるようにする
+        if owner:
+            self.options.add_argument(f"{OWNER_SWITCH}={owner}")
+
+        # 起動し直しても、キャッシュ・Cookieなどを前回のものから使う
+        if profile is not None:
+            self.options.add_argument(f"--user-data-dir={profile.user_data_dir}")
+            self.options.add_argument(f"--disk-cache-dir={profile.cache_dir}")
+            self.options.add_argument(
+                f"--disk-cache-size={URL.BROWSER_DISK_CACHE_BYTES}"
+            )
+
     def driver(self):
         if self._driver is None:
             self._driver = webdriver.Chrome(options=self.options)
-            self._driver.implicitly_wait(60)
+            # 要素の待機はwait_for_readyで明示的に行う。暗黙の待機があると、
+            # 要素がないページでポーリングの1回ごとに最大60秒止まってしまう
+            self._driver.implicitly_wait(0)
             self._driver.set_page_load_timeout(60)
         return self._driver
 
-    def get(self, url: str, sleep_time: int = 3):
+    def get(self, url: str):
         """call get method of selenium webdriver
+        and wait until the main content of the page exists.
         Args:
             url (str): url
-            sleep_time (float, optional): sleep time. Defaults to 1.
 
         Returns:
             None
         """
         if self._driver is not None:
+            mark_navigation(self._driver)
             self._driver.get(url)
-            time.sleep(sleep_time)
+            wait_for_navigation(self._driver)
+            wait_for_ready(self._driver, get_page_type(url))
         else:
             raise Exception("driver is None")
+
+    def block_resources(self, page_type: str):
+        """
+        ページの種類に応じて、不要なリソースの読み込みをブロックする。
+        """
+        block_resources(self.driver(), page_type)
+
+    def tabs(self, n: int = URL.BROWSER_TABS) -> "TabGroup":
+        """
+        1つのChromeの中にn個のタブを開き、それぞれを並行して読み込めるようにする。
+        """
+        return TabGroup(self.driver(), n)
+
+
+# タブ(ウィンドウハンドル)ごとに、ブロックしているページの種類
+# DevToolsのコマンドはフォーカスのあるタブにだけ効くため、タブごとに設定する
+_blocked_page_types: dict[str, tuple[str, ...]] = {}
+
+
+def blocked_url_patterns(page_types: tuple[str, ...]) -> list[str]:
+    """
+    複数のページの種類で共通してブロックするURLのパターン
+    どのページの種類でも必要なリソースを読み込めるよう、すべての種類がブロックするものだけを返す。
+    """
+    patterns = None
+    for page_type in page_types:
+        blocked = URL.BLOCKED_URL_PATTERNS.get(page_type, URL.BLOCK_HTML_ONLY)
+        patterns = (
+            list(blocked)
+            if patterns is None
+            else [pattern for pattern in patterns if pattern in blocked]
+        )
+    return patterns or []
+
+
+def is_html_only(page_types: tuple[str, ...]) -> bool:
+    """
+    すべてのページの種類がHTMLだけを読む(URL.BLOCKED_URL_PATTERNSに個別の設定がない)かどうか
+    """
+    return all(page_type not in URL.BLOCKED_URL_PATTERNS for page_type in page_types)
+
+
+def block_resources(driver, page_type: str | tuple[str, ...]):
+    """
+    DevToolsのNetwork.setBlockedURLsで、ページの種類ごとに不要なリソースをブロックする。
+    HTMLだけを読むページでは、CSS・画像・フォント・スクリプト・広告をすべてブロックする。
+    URLのパターンでは拡張子のないスクリプトやXHR・ビーコンを防げないため、
+    Emulation.setScriptExecutionDisabledでスクリプトの実行も止める。
+    DevToolsのイベントを受け取れないためFetch.requestPausedでDocument以外を止めることはできず、
+    「メインのHTML以外をすべてブロックする」ことの近似である。
+    HTMLだけを読むページは、通常はSeleniumを使わずHttpFetcherで取得される。
+    ページの種類を複数渡した場合(タブで並行して読み込む場合)は、すべての種類で不要なものだけをブロックする。
+    DevToolsのコマンドは現在のタブにだけ効くため、タブごとに呼び出す。
+    同じタブで同じページの種類が続く場合は何もしない。
+    """
+    page_types = (page_type,) if isinstance(page_type, str) else tuple(page_type)
+    handle = driver.current_window_handle
+    if _blocked_page_types.get(handle) == page_types:
+        return
+    if handle not in _blocked_page_types:
+        # タブごとにNetworkドメインを有効にして、URLのブロックを使えるようにする
+        driver.execute_cdp_cmd("Network.enable", {})
+    patterns = blocked_url_patterns(page_types)
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+    driver.execute_cdp_cmd(
+        "Emulation.setScriptExecutionDisabled", {"value": is_html_only(page_types)}
+    )
+    _blocked_page_types[handle] = page_types
+
+
+def forget_blocked_tabs(driver):
+    """
+    終了するドライバーのタブのブロックの設定を破棄する。
+    """
+    try:
+        handles = driver.window_handles
+    except Exception:
+        return
+    for handle in handles:
+        _blocked_page_types.pop(handle, None)
+
+
+# 読み込み前のページに付ける印。遷移後のページには付いていないため、遷移の完了を判定できる
+NAVIGATION_MARK_SCRIPT = "window.__nar_navigating = true;"
+NAVIGATED_SCRIPT = "return !window.__nar_navigating;"
+# 主要な要素があるかどうか。find_elementと違い、暗黙の待機の影響を受けない
+SELECTOR_SCRIPT = "return document.querySelector(arguments[0]) !== null;"
+
+
+def mark_navigation(driver):
+    """
+    現在のページに印を付ける。ページがない(起動直後など)場合は何もしない。
+    """
+    try:
+        driver.execute_script(NAVIGATION_MARK_SCRIPT)
+    except WebDriverException:
+        pass
+
+
+def wait_for_navigation(driver, timeout: float = 60):
+    """
+    mark_navigationで印を付けたページから、次のページに遷移するまで待つ。
+    読み込み戦略が"none"の場合、driver.getは遷移前に戻るため、
+    前のページのreadyStateや要素を次のページのものと取り違えないように使う。
+    """
+    WebDriverWait(
+        driver,
+        timeout,
+        poll_frequency=URL.TAB_POLL_INTERVAL,
+        ignored_exceptions=(WebDriverException,),
+    ).until(lambda d: d.execute_script(NAVIGATED_SCRIPT))
+
+
+def wait_for_page_load(driver, page_type: str, timeout: float = 60):
+    """
+    ページの種類ごとの読み込み戦略に従って、読み込みを待つ。
+    normal: loadイベントまで待つ / eager: DOMの構築まで待つ / none: 待たない
+    """
+    strategy = URL.PAGE_LOAD_STRATEGY.get(page_type, "normal")
+    if strategy == "none":
+        return
+    ready_states = (
+        ("complete",) if strategy == "normal" else ("interactive", "complete")
+    )
+    WebDriverWait(driver, timeout).until(
+        lambda d: d.execute_script("return document.readyState") in ready_states
+    )
+
+
+def wait_for_ready(driver, page_type: str, timeout: float = URL.READY_TIMEOUT) -> bool:
+    """
+    ページの種類ごとの主要な要素が表示されるまで待つ。
+    要素が見つからないまま時間切れになった場合はFalseを返す。
+    (出馬表が未発表など、要素がないページもあるため例外にはしない)
+    """
+    selector = URL.READY_SELECTORS.get(page_type)
+    if selector is None:
+        return True
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=URL.TAB_POLL_INTERVAL).until(
+            lambda d: d.execute_script(SELECTOR_SCRIPT, selector)
+        )
+        return True
+    except TimeoutException:
+        return False
+
+
+class BrowserTab:
+    """
+    TabGroupの中の1つのタブ
+    タブの切り替えはTabGroupのロックの中で行う。
+    """
+
+    # 読み込み前のページに印を付け、遷移後のページと区別する
+    _MARK_SCRIPT = (
+        "window.__nar_navigating = true; window.location.href = arguments[0];"
+    )
+    _READY_SCRIPT = (
+        "return !window.__nar_navigating && document.readyState !== 'loading';"
+    )
+
+    def __init__(self, group: "TabGroup", handle: str):
+        self.group = group
+        self.handle = handle
+        self.url = None
+        self.started_at = None
+
+    def open(self, url: str):
+        """
+        ページの読み込みを開始する。読み込みの完了は待たない。
+        """
+        with self.group.focus(self) as driver:
+            driver.execute_script(self._MARK_SCRIPT, url)
+        self.url = url
+        self.started_at = time.monotonic()
+
+    def is_ready(self) -> bool:
+        """
+        遷移後のページのDOMが構築され、ページの種類ごとの主要な要素があればTrue
+        主要な要素がないまま読み込みが完了した場合もTrueとする。
+        """
+        with self.group.focus(self) as driver:
+            if not driver.execute_script(self._READY_SCRIPT):
+                return False
+            selector = URL.READY_SELECTORS.get(get_page_type(self.url))
+            if selector is None or driver.execute_script(
+                SELECTOR_SCRIPT, selector
+            ):
+                return True
+            return driver.execute_script("return document.readyState") == "complete"
+
+    def page_source(self) -> str:
+        with self.group.focus(self) as driver:
+            return driver.page_source
+
+    def get(self, url: str, timeout: float = URL.TAB_LOAD_TIMEOUT) -> str:
+        """
+        ページを読み込み、完了したらHTMLを返す。
+        待機中はロックを手放すため、他のスレッドのタブも並行して読み込まれる。
+        """
+        self.open(url)
+        while not self.is_ready():
+            if time.monotonic() - self.started_at > timeout:
+                raise TimeoutException(f"Timeout loading {url}")
+            time.sleep(URL.TAB_POLL_INTERVAL)
+        return self.page_source()
+
+
+class TabGroup:
+    """
+    1つのChromeを共有する複数のタブ
+    Chromeを増やさずに複数ページを並行して読み込むために使う。
+    page_typesを渡した場合は、それぞれのタブでblock_resourcesを呼び出す。
+    """
+
+    def __init__(
+        self, driver, n: int = URL.BROWSER_TABS, page_types: tuple[str, ...] = None
+    ):
+        self.driver = driver
+        self._lock = threading.RLock()
+        self._free = queue.Queue()
+        if page_types:
+            block_resources(driver, page_types)
+        handles = [driver.current_window_handle]
+        for _ in range(n - 1):
+            driver.switch_to.new_window("tab")
+            # 新しいタブには最初のタブの設定が引き継がれないため、開いたタブで設定し直す
+            if page_types:
+                block_resources(driver, page_types)
+            handles.append(driver.current_window_handle)
+        self.tabs = [BrowserTab(self, handle) for handle in handles]
+        for tab in self.tabs:
+            self._free.put(tab)
+
+    @contextmanager
+    def focus(self, tab: BrowserTab):
+        """
+        タブを切り替えて操作する。
+        """
+        with self._lock:
+            if self.driver.current_window_handle != tab.handle:
+                self.driver.switch_to.window(tab.handle)
+            yield self.driver
+
+    @contextmanager
+    def tab(self):
+        """
+        空いているタブを借りる。空きがない場合は返却されるまで待機する。
+        """
+        tab = self._free.get()
+        try:
+            yield tab
+        finally:
+            self._free.put(tab)
+
+    def fetch_many(
+        self, urls: list[str], timeout: float = URL.TAB_LOAD_TIMEOUT
+    ) -> dict[str, str | Exception]:
+        """
+        複数のURLをタブに割り振って並行して読み込む。
+        読み込みの開始はホストごとのレート制限に従う。
+        タブごとの失敗は、そのURLの結果に例外として格納し、他のURLの読み込みは続ける。
+        """
+        pending = list(dict.fromkeys(urls))
+        free = list(self.tabs)
+        scheduled: dict[BrowserTab, float] = {}
+        loading: list[BrowserTab] = []
+        results = {}
+        while pending or scheduled or loading:
+            # 空いているタブにURLを割り振る。トークンが使えるまでは読み込みを始めない
+            while pending and free:
+                tab = free.pop()
+                tab.url = pending.pop(0)
+                scheduled[tab] = (
+                    time.monotonic() + get_host_limiter(tab.url).bucket.reserve()
+                )
+            for tab, start_at in list(scheduled.items()):
+                if time.monotonic() >= start_at:
+                    del scheduled[tab]
+                    try:
+                        tab.open(tab.url)
+                    except Exception as e:
+                        results[tab.url] = e
+                        free.append(tab)
+                        continue
+                    loading.append(tab)
+            for tab in list(loading):
+                try:
+                    if tab.is_ready():
+                        results[tab.url] = tab.page_source()
+                    elif time.monotonic() - tab.started_at > timeout:
+                        results[tab.url] = TimeoutException(
+                            f"Timeout loading {tab.url}"
+                        )
+                    else:
+                        continue
+                except Exception as e:
+                    results[tab.url] = e
+                loading.remove(tab)
+                free.append(tab)
+            time.sleep(URL.TAB_POLL_INTERVAL)
+        return results
+
+    def close(self):
+        """
+        最初のタブ以外を閉じる。
+        """
+        with self._lock:
+            for tab in self.tabs[1:]:
+                self.driver.switch_to.window(tab.handle)
+                self.driver.close()
+                _blocked_page_types.pop(tab.handle, None)
+            self.driver.switch_to.window(self.tabs[0].handle)
+            self.tabs = self.tabs[:1]
+
+
+def driver_processes(driver) -> list[psutil.Process]:
+    """
+    chromedriverとその子プロセス（Chrome本体）を取得する。
+    """
+    try:
+        process = psutil.Process(driver.service.process.pid)
+        return [process] + process.children(recursive=True)
+    except (psutil.Error, AttributeError):
+        return []
+
+
+def kill_processes(processes: list[psutil.Process], timeout: float = 5):
+    """
+    プロセスを強制終了し、終了するまで待つ。
+    psutil.Processは起動時刻を覚えているため、PIDが再利用された別のプロセスは終了しない。
+    """
+    alive = []
+    for process in processes:
+        try:
+            if process.is_running():
+                process.kill()
+                alive.append(process)
+        except psutil.Error:
+            pass
+    psutil.wait_procs(alive, timeout=timeout)
+
+
+class ChromeManager:
+    """
+    起動したChromeの寿命を管理するクラス
+    起動したchromedriverとChromeのプロセスを記録し、同時に起動するChromeをmax_browsers個までに制限する。
+    close(with文の終了時)では、終了し忘れたドライバーをログに出してから終了し、
+    残ったプロセスと、以前の実行で残ったChrome(孤児)を強制終了する。
+    profilesを渡した場合は、Chromeごとに使い回すプロファイルを割り当てる。
+    """
+
+    def __init__(
+        self,
+        max_browsers: int = URL.MAX_BROWSERS,
+        launch_timeout: float = URL.BROWSER_LAUNCH_TIMEOUT,
+        profiles: BrowserProfiles = None,
+    ):
+        self.profiles = profiles
+        self.max_browsers = max_browsers
+        self.launch_timeout = launch_timeout
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._slots = threading.BoundedSemaphore(max_browsers)
+        self._drivers: dict[int, dict] = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def launch(self, page_load_strategy: str = URL.DRIVER_PAGE_LOAD_STRATEGY):
+        """
+        Chromeを起動する。起動中のChromeが上限に達している場合は、終了されるまで待機する。
+        """
+        if not self._slots.acquire(timeout=self.launch_timeout):
+            self.log_leaks()
+            raise RuntimeError(
+                f"Could not launch Chrome: {self.max_browsers} browsers are running"
+            )
+        profile = None
+        try:
+            if self.profiles is not None:
+                profile = self.profiles.acquire()
+            driver = WebDriver(page_load_strategy, self.owner, profile).driver()
+        except Exception:
+            if profile is not None:
+                profile.release()
+            self._slots.release()
+            raise
+        with self._lock:
+            self._drivers[id(driver)] = {
+                "driver": driver,
+                "profile": profile,
+                "processes": driver_processes(driver),
+                "started_at": time.monotonic(),
+                # リークしたときに、どこで起動したかを表示する
+                "stack": "".join(traceback.format_stack(limit=8)[:-1]),
+            }
+        return driver
+
+    def quit(self, driver):
+        """
+        ドライバーを終了し、残ったchromedriverとChromeのプロセスを強制終了する。
+        """
+        forget_blocked_tabs(driver)
+        with self._lock:
+            entry = self._drivers.pop(id(driver), None)
+        # 起動後に増えたレンダラーなども含めるため、終了前にもう一度取得する
+        processes = driver_processes(driver)
+        if entry is not None:
+            processes += entry["processes"]
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        kill_processes(processes)
+        if entry is not None:
+            # プロファイルはChromeのプロセスがすべて終了してから解放する
+            if entry["profile"] is not None:
+                entry["profile"].release()
+            self._slots.release()
+
+    def live_drivers(self) -> list[dict]:
+        """
+        起動中のドライバーと、その起動からの経過秒数・起動した場所を取得する。
+        """
+        with self._lock:
+            entries = list(self._drivers.values())
+        now = time.monotonic()
+        return [
+            {
+                "driver": entry["driver"],
+                "pids": [p.pid for p in entry["processes"]],
+                "age": now - entry["started_at"],
+                "stack": entry["stack"],
+            }
+            for entry in entries
+        ]
+
+    def log_leaks(self):
+        for leak in self.live_drivers():
+            logger.warning(
+                "Chrome (pids=%s) has been running for %.0f seconds without quit. "
+                "Launched at:\n%s",
+                leak["pids"],
+                leak["age"],
+                leak["stack"],
+            )
+
+    def find_orphans(self) -> list[psutil.Process]:
+        """
+        このChromeManagerか、終了したプロセスが起動して残っているChromeを探す。
+        """
+        orphans = []
+        for process in psutil.process_iter(["cmdline"]):
+            try:
+                owner = next(
+                    arg.split("=", 1)[1]
+                    for arg in process.info["cmdline"] or []
+                    if arg.startswith(f"{OWNER_SWITCH}=")
+                )
+            except StopIteration:
+                continue
+            owner_pid = int(owner.split("-", 1)[0])
+            if owner == self.owner or not psutil.pid_exists(owner_pid):
+                orphans.append(process)
+        return orphans
+
+    def kill_orphans(self) -> int:
+        """
+        残っているChromeと、その子プロセス・親のchromedriverを強制終了する。
+        """
+        processes = []
+        for process in self.find_orphans():
+            try:
+                processes += [process] + process.children(recursive=True)
+                parent = process.parent()
+                if parent is not None and "chromedriver" in parent.name().lower():
+                    processes.append(parent)
+            except psutil.Error:
+                pass
+        if processes:
+            logger.warning("Killing %d orphaned Chrome processes", len(processes))
+        kill_processes(processes)
+        return len(processes)
+
+    def close(self):
+        """
+        起動中のドライバーをすべて終了する。終了し忘れたものはログに出す。
+        """
+        self.log_leaks()
+        for leak in self.live_drivers():
+            self.quit(leak["driver"])
+        self.kill_orphans()
+        if self.profiles is not None:
+            self.profiles.close()
+
+
+_chrome_manager = None
+_chrome_manager_lock = threading.Lock()
+
+
+def get_chrome_manager() -> ChromeManager:
+    """
+    プロセス内で共有するChromeManagerを取得する。
+    プロセスの終了時に、残っているChromeをすべて終了する。
+    """
+    global _chrome_manager
+    with _chrome_manager_lock:
+        if _chrome_manager is None:
+            profiles = None
+            if URL.PERSISTENT_BROWSER_PROFILE:
+                profiles = BrowserProfiles()
+            _chrome_manager = ChromeManager(profiles=profiles)
+            atexit.register(_chrome_manager.close)
+        return _chrome_manager
+
+
+class WebDriverPool:
+    """
+    起動済みのChromeを使い回すためのプール
+    起動に時間がかかるChromeを毎回作り直さず、使い終わったものを次の取得に回す。
+    一定ページ数を読み込んだものや、メモリ使用量が上限を超えたものは作り直す。
+    """
+
+    def __init__(
+        self,
+        size: int = URL.DRIVER_POOL_SIZE,
+        max_pages: int = URL.DRIVER_MAX_PAGES,
+        max_rss_mb: int = URL.DRIVER_MAX_RSS_MB,
+        manager: ChromeManager = None,
+    ):
+        self.manager = manager if manager is not None else get_chrome_manager()
+        self.size = size
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self._idle = queue.LifoQueue()
+        self._pages: dict[int, int] = {}
+        self._available = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+    def _create(self):
+        driver = self.manager.launch()
+        with self._lock:
+            self._pages[id(driver)] = 0
+        return driver
+
+    def _discard(self, driver):
+        with self._lock:
+            self._pages.pop(id(driver), None)
+        self.manager.quit(driver)
+
+    def is_alive(self, driver) -> bool:
+        """
+        軽いスクリプトを実行して、ドライバーが応答するか確認する。
+        """
+        try:
+            return driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def rss_mb(self, driver) -> float:
+        """
+        chromedriverとその子プロセス（Chrome本体）のメモリ使用量(MB)を取得する。
+        """
+        try:
+            processes = driver_processes(driver)
+            return sum(p.memory_info().rss for p in processes) / 1024 / 1024
+        except psutil.Error:
+            return 0.0
+
+    def should_recycle(self, driver) -> bool:
+        if self._pages.get(id(driver), 0) >= self.max_pages:
+            return True
+        return self.rss_mb(driver) >= self.max_rss_mb
+
+    def acquire(self):
+        """
+        プールからドライバーを借りる。空きがない場合は返却されるまで待機する。
+        """
+        self._available.acquire()
+        try:
+            while True:
+                try:
+                    driver = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._create()
+                if self.is_alive(driver):
+                    return driver
+                self._discard(driver)
+        except Exception:
+            self._available.release()
+            raise
+
+    def release(self, driver, pages: int = 1, broken: bool = False):
+        """
+        ドライバーをプールに返す。壊れたものや寿命に達したものは終了する。
+        """
+        try:
+            with self._lock:
+                self._pages[id(driver)] = self._pages.get(id(driver), 0) + pages
+            if broken or self.should_recycle(driver):
+                self._discard(driver)
+            else:
+                self._idle.put(driver)
+        finally:
+            self._available.release()
+
+    @contextmanager
+    def driver(self):
+        """
+        with文でドライバーを借りる。例外が発生した場合も必ず返却する。
+        """
+        driver = self.acquire()
+        try:
+            yield driver
+        except Exception:
+            self.release(driver, broken=True)
+            raise
+        else:
+            self.release(driver)
+
+    def close(self):
+        """
+        待機中のドライバーをすべて終了する。
+        """
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)
+
+
+_driver_pool = None
+_driver_pool_lock = threading.Lock()
+
+
+def get_driver_pool() -> WebDriverPool:
+    """
+    プロセス内で共有するWebDriverPoolを取得する。
+    """
+    global _driver_pool
+    with _driver_pool_lock:
+        if _driver_pool is None:
+            _driver_pool = WebDriverPool()
+            atexit.register(_driver_pool.close)
+        return _driver_pool
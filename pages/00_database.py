@@ -75,9 +75,14 @@ def get_update_settings(container: DeltaGenerator):
         results_toggle,
         jockey_toggle,
         trainer_toggle,
-    ) = (None, None, None, None, None, None)
+        odds_toggle,
+    ) = (None, None, None, None, None, None, None)
 
     races_update_toggle = race_col.toggle(label="レース", value=True)
+    # オッズはレースと一緒に、取得したレースIDの分だけ格納する
+    odds_toggle = race_col.toggle(
+        label="オッズ", value=False, disabled=not races_update_toggle
+    )
     horse_profile_toggle = horse_col.toggle(label="馬プロフィール", value=True)
     pedigree_toggle = horse_col.toggle(label="血統データ", value=False)
     results_toggle = horse_col.toggle(label="過去戦績", value=True)
@@ -90,6 +95,7 @@ def get_update_settings(container: DeltaGenerator):
         results_toggle,
         jockey_toggle,
         trainer_toggle,
+        odds_toggle and races_update_toggle,
     )
 
 
@@ -139,43 +145,118 @@ def wait_for_update(waiting_minutes: int, interval_seconds: int = 60):
     log_wait_time.update(label="待機完了", state="complete", expanded=False)
 
 
-def update_race_data(start_date, end_date):
+def update_race_data(
+    start_date, end_date, prefetcher=None, horse_get_type=None, update_odds=False
+):
     """
     レース情報と出馬表をデータベースに格納する
+    prefetcherを渡した場合は、出馬表を格納しながら出走馬のページを先読みする
+    update_odds=Trueの場合は、すべての馬券の種類のオッズも格納する
     """
     log_races_update = st.status("レースの更新中...", expanded=True)
     log_races_update.info("レースIDを取得中...")
     progress_bar = log_races_update.progress(0)
     race_ids = app.get_race_ids(start_date, end_date)
     race_id_list = []
-    driver = app.get_driver()
-    for num, race_id in enumerate(race_ids):
-        local_race_ids, driver = app.get_local_race_ids(driver, race_id)
-        race_id_list.extend(local_race_ids)
-        progress_bar.progress(
-            num / len(race_ids), f"{num} / {len(race_ids)} race id: {race_id}"
-        )
-    driver.quit()
+    with app.get_driver() as driver:
+        for num, race_id in enumerate(race_ids):
+            local_race_ids, _ = app.get_local_race_ids(driver, race_id)
+            race_id_list.extend(local_race_ids)
+            progress_bar.progress(
+                num / len(race_ids), f"{num} / {len(race_ids)} race id: {race_id}"
+            )
     progress_bar.progress(1.0, "レースIDを取得しました。")
 
     log_races_update.info("レース情報と出馬表をデータベースに格納中...")
     predict_complete_time = len(race_id_list) * 3 / 60
     log_races_update.write(f"予想時間：{predict_complete_time}分")
     progress_bar = log_races_update.progress(0)
-    driver = app.get_driver()
     mongo = app.get_mongo_client()
-    for num, race_id in enumerate(race_id_list):
-        driver = app.upsert_pre_race_shutuba(driver, mongo, race_id, force=True)
+    on_horse_ids = None
+    if prefetcher is not None:
+
+        def on_horse_ids(horse_ids):
+            app.prefetch_horse_pages(prefetcher, mongo, horse_ids, horse_get_type)
+
+    done_count = 0
+
+    def on_done(race_id, error):
+        nonlocal done_count
+        done_count += 1
         progress_bar.progress(
-            num / len(race_id_list),
-            f"{num} / {len(race_id_list)} race id: {race_id}",
+            done_count / len(race_id_list),
+            f"{done_count} / {len(race_id_list)} race id: {race_id}",
         )
-    driver.quit()
-    mongo.close()
+
+    with app.get_driver() as driver:
+        driver, failed_race_ids = app.upsert_many_pre_race_shutuba(
+            driver,
+            mongo,
+            race_id_list,
+            force=True,
+            on_horse_ids=on_horse_ids,
+            on_done=on_done,
+        )
+        # 失敗したレースは1件ずつ取得し直す
+        for race_id in failed_race_ids:
+            try:
+                app.upsert_pre_race_shutuba(
+                    driver, mongo, race_id, force=True, on_horse_ids=on_horse_ids
+                )
+            except Exception as e:
+                log_races_update.warning(e)
     progress_bar.progress(1.0, "レース情報と出馬表をデータベースに格納しました。")
+
+    if update_odds:
+        log_races_update.info("オッズをデータベースに格納中...")
+        progress_bar = log_races_update.progress(0)
+        done_count = 0
+        with app.get_driver() as driver:
+            driver, failed_race_ids = app.upsert_many_odds_data(
+                driver, mongo, race_id_list, on_done=on_done
+            )
+            for race_id in failed_race_ids:
+                try:
+                    app.upsert_odds_data(driver, mongo, race_id)
+                except Exception as e:
+                    log_races_update.warning(e)
+        progress_bar.progress(1.0, "オッズをデータベースに格納しました。")
+
+    # 前日までのレースは、結果ページから着順・払戻・通過順・ラップタイムを格納する
+    today = datetime.date.today().strftime("%Y%m%d")
+    result_race_ids = [
+        race_id for race_id in race_id_list if race_id[:4] + race_id[6:10] < today
+    ]
+    if result_race_ids:
+        log_races_update.info("レース結果をデータベースに格納中...")
+        progress_bar = log_races_update.progress(0)
+        race_id_list = result_race_ids
+        done_count = 0
+        with app.get_driver() as driver:
+            driver, failed_race_ids = app.upsert_many_result_data(
+                driver, mongo, result_race_ids, on_done=on_done
+            )
+            for race_id in failed_race_ids:
+                try:
+                    app.upsert_result_data(driver, mongo, race_id)
+                except Exception as e:
+                    log_races_update.warning(e)
+        progress_bar.progress(1.0, "レース結果をデータベースに格納しました。")
+    mongo.close()
     log_races_update.update(label="レースの更新完了", state="complete", expanded=False)
 
 
+def get_horse_get_type(horse_profile_toggle, pedigree_toggle, results_toggle):
+    get_type = []
+    if horse_profile_toggle:
+        get_type.append("profile")
+    if pedigree_toggle:
+        get_type.append("pedigree")
+    if results_toggle:
+        get_type.append("result")
+    return get_type
+
+
 def update_horse_data(
     start_date, end_date, horse_profile_toggle, pedigree_toggle, results_toggle
 ):
@@ -184,16 +265,11 @@ def update_horse_data(
     horse_id_list = app.find_horse_ids_from_date(start_date, end_date)
     log_horses_update.progress(1.0, "馬IDを取得しました。")
 
-    get_type, message_list = [], []
-    if horse_profile_toggle:
-        get_type.append("profile")
-        message_list.append("馬プロフィール")
-    if pedigree_toggle:
-        get_type.append("pedigree")
-        message_list.append("血統データ")
-    if results_toggle:
-        get_type.append("result")
-        message_list.append("過去戦績")
+    get_type = get_horse_get_type(horse_profile_toggle, pedigree_toggle, results_toggle)
+    message_list = [
+        {"profile": "馬プロフィール", "pedigree": "血統データ", "result": "過去戦績"}[t]
+        for t in get_type
+    ]
     log_horses_update.info(f"{message_list}をデータベースに格納中...")
     predict_complete_time = (
         len(horse_id_list) * len(get_type) * 5 / 60 if len(get_type) > 0 else 0
@@ -203,19 +279,29 @@ def update_horse_data(
     progress_bar = log_horses_update.progress(0)
     driver = app.get_driver()
     mongo = app.get_mongo_client()
-    for num, horse_id in enumerate(horse_id_list):
-        try:
-            driver = app.upsert_horse_data(driver, mongo, horse_id, get_type)
-        except Exception:
-            driver = app.get_driver()
-            mongo = app.get_mongo_client()
-            driver = app.upsert_horse_data(driver, mongo, horse_id, get_type)
+    done_count = 0
+
+    def on_done(horse_id, result):
+        nonlocal done_count
+        done_count += 1
         progress_bar.progress(
-            num / len(horse_id_list),
-            f"{num} / {len(horse_id_list)} horse id: {horse_id}",
+            done_count / len(horse_id_list),
+            f"{done_count} / {len(horse_id_list)} horse id: {horse_id}",
         )
-    driver.quit()
-    mongo.close()
+
+    try:
+        driver, failed_horse_ids = app.upsert_many_horse_data(
+            driver, mongo, horse_id_list, get_type, on_done=on_done
+        )
+        # 失敗した馬は1頭ずつ取得し直す。ドライバーの作り直しはfetch_with_retryが行う
+        for horse_id in failed_horse_ids:
+            try:
+                app.upsert_horse_data(driver, mongo, horse_id, get_type)
+            except Exception as e:
+                log_horses_update.warning(e)
+    finally:
+        driver.quit()
+        mongo.close()
     progress_bar.progress(1.0, "馬情報をデータベースに格納しました。")
     log_horses_update.update(label="馬情報の更新完了", state="complete", expanded=False)
 
@@ -244,19 +330,28 @@ def update_human_data(type: str):
     progress_bar = log_human_update.progress(0)
     driver = app.get_driver()
     mongo = app.get_mongo_client()
-    for num, human_id in enumerate(human_id_list):
-        try:
-            driver = app.upsert_human_data(driver, mongo, human_id, type)
-        except Exception:
-            driver = app.get_driver()
-            mongo = app.get_mongo_client()
-            driver = app.upsert_human_data(driver, mongo, human_id, type)
+    done_count = 0
+
+    def on_done(human_id, result):
+        nonlocal done_count
+        done_count += 1
         progress_bar.progress(
-            num / len(human_id_list),
-            f"{num} / {len(human_id_list)} {type} id: {human_id}",
+            done_count / len(human_id_list),
+            f"{done_count} / {len(human_id_list)} {type} id: {human_id}",
         )
-    driver.quit()
-    mongo.close()
+
+    try:
+        driver, failed_human_ids = app.upsert_many_human_data(
+            driver, mongo, human_id_list, type, on_done=on_done
+        )
+        for human_id in failed_human_ids:
+            try:
+                app.upsert_human_data(driver, mongo, human_id, type)
+            except Exception as e:
+                log_human_update.warning(e)
+    finally:
+        driver.quit()
+        mongo.close()
     progress_bar.progress(1.0, f"{type_message}情報をデータベースに格納しました。")
     log_human_update.update(
         label=f"{type_message}の更新完了", state="complete", expanded=False
@@ -275,17 +370,38 @@ def update_database(
         results_toggle,
         jockey_toggle,
         trainer_toggle,
+        odds_toggle,
     ) = update_settings
-    if races_update_toggle:
-        update_race_data(start_date, end_date)
-    if horse_profile_toggle or pedigree_toggle:
-        update_horse_data(
-            start_date, end_date, horse_profile_toggle, pedigree_toggle, results_toggle
-        )
-    if jockey_toggle:
-        update_human_data("jockey")
-    if trainer_toggle:
-        update_human_data("trainer")
+    prefetcher = None
+    try:
+        if races_update_toggle:
+            horse_get_type = None
+            if horse_profile_toggle or pedigree_toggle:
+                # 馬情報も更新する場合は、出馬表の格納と並行して出走馬のページを先読みする
+                prefetcher = app.get_prefetcher()
+                horse_get_type = get_horse_get_type(
+                    horse_profile_toggle, pedigree_toggle, results_toggle
+                )
+            update_race_data(
+                start_date, end_date, prefetcher, horse_get_type, odds_toggle
+            )
+        if horse_profile_toggle or pedigree_toggle:
+            update_horse_data(
+                start_date,
+                end_date,
+                horse_profile_toggle,
+                pedigree_toggle,
+                results_toggle,
+            )
+        if jockey_toggle:
+            update_human_data("jockey")
+        if trainer_toggle:
+            update_human_data("trainer")
+    finally:
+        if prefetcher is not None:
+            prefetcher.close()
+        # 途中で失敗しても、起動したChromeを残さない
+        app.close_browsers()
     st.success("finished! 🎉🎉🎉")
 
 
@@ -362,6 +478,8 @@ def display_settings(start_date, end_date, update_settings, container: DeltaGene
         container.write("- 騎手")
     if update_settings[5]:
         container.write("- 調教師")
+    if update_settings[6]:
+        container.write("- オッズ")
 
 
 def main():
@@ -253,29 +253,32 @@ def get_pre_race_shutuba(race_id: str):
     """
     レース事前情報を取得する
     """
-    driver = app.get_driver()
     mongo = app.get_mongo_client()
-    app.upsert_pre_race_shutuba(driver, mongo, race_id, force=True)
+    with app.get_driver() as driver:
+        app.upsert_pre_race_shutuba(driver, mongo, race_id, force=True)
+    mongo.close()
 
 
 def get_horse(horse_ids: list[str], get_type: list[str]):
     """
     過去戦績を取得する
     """
-    driver = app.get_driver()
     mongo = app.get_mongo_client()
-    for horse_id in horse_ids:
-        driver = app.upsert_horse_data(driver, mongo, horse_id, get_type)
+    with app.get_driver() as driver:
+        for horse_id in horse_ids:
+            app.upsert_horse_data(driver, mongo, horse_id, get_type)
+    mongo.close()
 
 
 def get_human(human_ids: list[str], type: str):
     """
     騎手、調教師のプロフィールを取得する
     """
-    driver = app.get_driver()
     mongo = app.get_mongo_client()
-    for human_id in human_ids:
-        app.upsert_human_data(driver, mongo, human_id, type)
+    with app.get_driver() as driver:
+        for human_id in human_ids:
+            app.upsert_human_data(driver, mongo, human_id, type)
+    mongo.close()
 
 
 def update_data(container: DeltaGenerator, race_id: str):
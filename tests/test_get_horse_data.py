@@ -0,0 +1,74 @@
+import pytest
+
+from modules.scrape.get_horse_data import GetHorseData
+from modules.scrape.html_parser import make_soup
+
+TABLE_SELECTOR = "table.db_h_race_results.nk_tb_common"
+
+
+def _without_tbody(html: str) -> str:
+    for tag in ("<thead>", "</thead>", "<tbody>", "</tbody>"):
+        html = html.replace(tag, "")
+    return html
+
+
+@pytest.fixture(params=["tbody", "no_tbody"])
+def horse_html(request, fixture_html):
+    html = fixture_html("horse.html")
+    return html if request.param == "tbody" else _without_tbody(html)
+
+
+@pytest.mark.parametrize(
+    "known_race_id, expected",
+    [
+        # 2023/12/29より後の2件
+        ("202344122911", 2),
+        # 2024/01/24より後の1件
+        ("202443012410", 1),
+        # 最新のレースまで格納済み
+        ("202442031211", 0),
+        # すべて新しい
+        ("202344120111", 3),
+    ],
+)
+def test_count_new_results(horse_html, known_race_id, expected):
+    table = make_soup(horse_html).select_one(TABLE_SELECTOR)
+    assert (
+        GetHorseData(None, "2019100001").count_new_results(table, known_race_id)
+        == expected
+    )
+
+
+def test_count_new_results_skips_header_rows(fixture_html):
+    # 本文の途中に見出しの行がある場合も、その後の戦績を数える
+    html = fixture_html("horse.html").replace(
+        "<tbody>\n", "<tbody>\n<tr><th>日付</th><th>開催</th></tr>\n", 1
+    )
+    table = make_soup(html).select_one(TABLE_SELECTOR)
+    assert (
+        GetHorseData(None, "2019100001").count_new_results(table, "202344122911") == 3
+    )
+
+
+def test_get_horse_result_with_known_race_id(horse_html):
+    get_horse_data = GetHorseData(None, "2019100001")
+    get_horse_data.set_horse_page(horse_html)
+    df = get_horse_data.get_horse_result("202344122911")
+    assert df["日付"].tolist() == ["2024/03/12", "2024/01/24"]
+    assert df["race_id"].tolist() == ["202442031211", "202443012410"]
+    assert df["jockey_id"].tolist() == ["05339", "05574"]
+
+
+def test_count_new_results_skips_hidden_rows(fixture_html):
+    # 非表示の行はread_tableで取り除かれるため、数えない
+    html = fixture_html("horse.html").replace(
+        "<tbody>\n",
+        '<tbody>\n<tr style="display:none"><td>2024/05/01</td><td>2大井1</td></tr>\n',
+        1,
+    )
+    get_horse_data = GetHorseData(None, "2019100001")
+    get_horse_data.set_horse_page(html)
+    table = get_horse_data.horse_page_soup.select_one(TABLE_SELECTOR)
+    assert get_horse_data.count_new_results(table, "202344122911") == 2
+    df = get_horse_data.get_horse_result("202344122911")
+    assert df["日付"].tolist() == ["2024/03/12", "2024/01/24"]
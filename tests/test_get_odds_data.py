@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from modules.constants import URL, RACEDATA
+from modules.scrape.get_odds_data import GetOddsData, parse_odds_cells
+
+RACE_ID = "202442031211"
+# 馬券の種類ごとのページ(tests/fixtures/odds_b*.html)
+ODDS_FIXTURES = {
+    "tansho": "odds_b1.html",
+    "fukusho": "odds_b1.html",
+    "umaren": "odds_b4.html",
+    "wide": "odds_b5.html",
+    "umatan": "odds_b6.html",
+    "sanrenpuku": "odds_b7.html",
+    "sanrentan": "odds_b8.html",
+}
+
+
+@pytest.fixture
+def odds(fixture_html):
+    get_odds_data = GetOddsData(None, RACE_ID)
+    for odds_type, name in ODDS_FIXTURES.items():
+        get_odds_data.set_page(URL.ODDS_PAGES[odds_type] + RACE_ID, fixture_html(name))
+    return get_odds_data.get_all_odds()
+
+
+@pytest.mark.parametrize("odds_type", list(RACEDATA.ODDS_TYPES))
+def test_odds_shape(odds, odds_type):
+    _, size, is_range = RACEDATA.ODDS_TYPES[odds_type]
+    shape = (RACEDATA.MAX_UMABAN,) * size + ((2,) if is_range else ())
+    assert odds[odds_type].shape == shape
+
+
+def test_tansho_fukusho(odds):
+    np.testing.assert_array_equal(odds["tansho"][:3], [3.4, 2.1, 15.8])
+    # 取消の馬はnan
+    assert np.isnan(odds["tansho"][3])
+    # 下限と上限が別々のspanに入っている
+    np.testing.assert_array_equal(
+        odds["fukusho"][:3], [[1.1, 1.4], [1.0, 1.2], [2.5, 4.8]]
+    )
+    assert np.isnan(odds["fukusho"][3]).all()
+
+
+def test_combination_odds(odds):
+    assert odds["umaren"][0, 1] == 1.5
+    assert odds["umaren"][2, 3] == 10.0
+    # 馬連は組み合わせの順に置くため、逆順はnan
+    assert np.isnan(odds["umaren"][1, 0])
+    np.testing.assert_array_equal(odds["wide"][0, 1], [1.5, 2.2])
+    assert odds["umatan"][0, 1] == 1.5
+    assert odds["umatan"][1, 0] == 6.6
+    assert odds["sanrenpuku"][0, 1, 2] == 1.5
+    assert odds["sanrenpuku"][1, 2, 3] == 6.6
+    assert odds["sanrentan"][0, 1, 2] == 150.0
+    # 1,000倍以上のオッズは桁区切りのカンマを含む
+    assert odds["sanrentan"][3, 2, 1] == 4060.0
+
+
+@pytest.mark.parametrize(
+    "odds_type, count",
+    [
+        ("tansho", 3),
+        ("umaren", 6),
+        ("wide", 6),
+        ("umatan", 12),
+        ("sanrenpuku", 4),
+        ("sanrentan", 24),
+    ],
+)
+def test_odds_count(odds, odds_type, count):
+    matrix = odds[odds_type]
+    if matrix.ndim > RACEDATA.ODDS_TYPES[odds_type][1]:
+        matrix = matrix[..., 0]
+    assert np.count_nonzero(~np.isnan(matrix)) == count
+
+
+def test_parse_odds_cells_nested_elements():
+    html = (
+        '<table><tr><td id="odds-5-0102"><span>1.2</span> - <span>1.5</span></td>'
+        '<td><span id="odds-1_03"><b>4.5</b></span></td>'
+        '<td id="odds-table">ignored</td></tr></table>'
+    )
+    cells = parse_odds_cells(html)
+    np.testing.assert_array_equal(cells[5][0], [[1, 2]])
+    np.testing.assert_array_equal(cells[5][1], [[1.2, 1.5]])
+    np.testing.assert_array_equal(cells[1][1], [[4.5, 4.5]])
+
+
+def test_parse_odds_cells_empty():
+    assert parse_odds_cells("") == {}
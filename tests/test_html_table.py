@@ -0,0 +1,52 @@
+from io import StringIO
+
+import pandas as pd
+import pytest
+
+from modules.scrape.html_parser import make_soup
+from modules.scrape.html_table import read_table
+
+
+@pytest.mark.parametrize(
+    "name, selector",
+    [
+        ("horse.html", "table.db_h_race_results.nk_tb_common"),
+        ("result.html", "table#All_Result_Table"),
+        ("shutuba.html", "table.ShutubaTable"),
+    ],
+)
+def test_read_table_matches_read_html(fixture_html, name, selector):
+    table = make_soup(fixture_html(name)).select_one(selector)
+    expected = pd.read_html(StringIO(str(table)))[0]
+    df, _ = read_table(table)
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def test_read_table_br_becomes_space(fixture_html):
+    table = make_soup(fixture_html("result.html")).select_one("table#All_Result_Table")
+    df, _ = read_table(table)
+    assert df["馬体重 (増減)"].tolist() == ["480 (+2)", "452 (-6)", "501 (0)"]
+
+
+def test_read_table_links(fixture_html):
+    table = make_soup(fixture_html("shutuba.html")).select_one("table.ShutubaTable")
+    _, links = read_table(
+        table, link_columns={3: "span.HorseName > a", 7: ":scope > a"}
+    )
+    assert links[3] == [
+        "https://db.netkeiba.com/horse/2019100001",
+        "https://db.netkeiba.com/horse/2019100002",
+    ]
+    assert links[7] == [
+        "https://db.netkeiba.com/trainer/01101",
+        "https://db.netkeiba.com/trainer/01202",
+    ]
+
+
+def test_read_table_does_not_change_the_soup(fixture_html):
+    table = make_soup(fixture_html("horse.html")).select_one(
+        "table.db_h_race_results.nk_tb_common"
+    )
+    html = str(table)
+    read_table(table)
+    assert str(table) == html
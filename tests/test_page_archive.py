@@ -0,0 +1,28 @@
+from modules.scrape.page_archive import PageArchive, url_key
+
+# SHA-1の末尾が0のバイトになるURL
+NUL_URL = "https://db.netkeiba.com/horse/184"
+
+
+def test_url_key_ending_with_nul_round_trips(tmp_path):
+    assert url_key(NUL_URL).endswith(b"\x00")
+    archive = PageArchive(str(tmp_path))
+    archive.append(NUL_URL, "<html>184</html>", fetched_at=1.0)
+    archive.append("https://db.netkeiba.com/horse/1", "<html>1</html>")
+    meta, html = archive.read(NUL_URL)
+    assert html == "<html>184</html>"
+    assert meta["fetched_at"] == 1.0
+    # 別のインスタンスからインデックスを読み直しても見つかる
+    assert PageArchive(str(tmp_path)).read(NUL_URL)[1] == "<html>184</html>"
+
+
+def test_entries_returns_latest_of_each_url(tmp_path):
+    archive = PageArchive(str(tmp_path))
+    archive.append(NUL_URL, "old", fetched_at=1.0)
+    archive.append("https://db.netkeiba.com/horse/1", "other", fetched_at=2.0)
+    archive.append(NUL_URL, "new", fetched_at=3.0)
+    assert list(archive.entries(["horse"])) == [
+        ("https://db.netkeiba.com/horse/1", 2.0),
+        (NUL_URL, 3.0),
+    ]
+    assert archive.read(NUL_URL)[1] == "new"
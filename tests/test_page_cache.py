@@ -0,0 +1,63 @@
+import time
+
+from modules.constants import URL
+from modules.scrape.fetcher import Fetcher
+from modules.scrape.page_cache import CachedFetcher, DiskPageCache, MemoryPageCache
+from modules.scrape.single_flight import SingleFlight
+
+URL_HORSE = "https://db.netkeiba.com/horse/2019100001"
+
+
+class FakeFetcher(Fetcher):
+    """
+    条件付きリクエストに対応せず、レート制限をかけずに常にself.htmlを返すFetcher
+    """
+
+    def __init__(self, html: str):
+        self.html = html
+
+    def fetch(self, url: str) -> str:
+        return self.html
+
+
+def _page(horse_page: str, ad: str) -> str:
+    # 広告の部分は取得するたびに変わる
+    return horse_page.replace("</body>", f'<div class="ad">{ad}</div></body>')
+
+
+def _cached_fetcher(tmp_path, fetcher: Fetcher) -> CachedFetcher:
+    return CachedFetcher(
+        fetcher, DiskPageCache(str(tmp_path)), MemoryPageCache(), SingleFlight()
+    )
+
+
+def _expire(cached: CachedFetcher, url: str):
+    """
+    保存したページを、再検証し直す古さにする
+    """
+    meta, html = cached.cache.read(url)
+    cached.cache.write(url, html, fetched_at=time.time() - URL.REVALIDATE_MAX_AGE)
+
+
+def test_fetch_if_modified_ignores_changes_outside_content(tmp_path, fixture_html):
+    horse_page = fixture_html("horse.html")
+    fetcher = FakeFetcher(_page(horse_page, "token-1"))
+    cached = _cached_fetcher(tmp_path, fetcher)
+    html = cached.fetch_if_modified(URL_HORSE)
+    assert html is not None
+    cached.mark_processed(URL_HORSE, html)
+    fetcher.html = _page(horse_page, "token-2")
+    _expire(cached, URL_HORSE)
+    assert cached.fetch_if_modified(URL_HORSE) is None
+
+
+def test_fetch_if_modified_reports_new_results(tmp_path, fixture_html):
+    horse_page = fixture_html("horse.html")
+    fetcher = FakeFetcher(horse_page)
+    cached = _cached_fetcher(tmp_path, fetcher)
+    cached.mark_processed(URL_HORSE, cached.fetch_if_modified(URL_HORSE))
+    fetcher.html = horse_page.replace("2024/03/12", "2024/04/01")
+    # 直前に取得したページは再検証し直さない
+    assert cached.fetch_if_modified(URL_HORSE) is None
+    _expire(cached, URL_HORSE)
+    assert cached.fetch_if_modified(URL_HORSE) == fetcher.html
@@ -0,0 +1,45 @@
+import operator
+
+from modules.scrape.pipeline import ParsePipeline
+
+
+def _fetch(item):
+    if item == "missing":
+        raise KeyError(item)
+    if item == "unchanged":
+        return None
+    return "<" + item + ">"
+
+
+def _run(processes: int, items: list):
+    written = []
+    pipeline = ParsePipeline(
+        _fetch,
+        operator.add,
+        lambda item, record: written.append((item, record)),
+        concurrency=2,
+        processes=processes,
+        queue_size=2,
+    )
+    failed = pipeline.run(items)
+    return sorted(written), failed
+
+
+def test_pipeline_writes_parsed_records():
+    written, failed = _run(0, ["a", "b", "a", "unchanged"])
+    # 重複は1回だけ処理し、Noneを返したものは書き込まない
+    assert written == [("a", "a<a>"), ("b", "b<b>")]
+    assert failed == []
+
+
+def test_pipeline_reports_failed_items():
+    written, failed = _run(0, ["a", "missing"])
+    assert written == [("a", "a<a>")]
+    assert [item for item, _ in failed] == ["missing"]
+    assert isinstance(failed[0][1], KeyError)
+
+
+def test_pipeline_parses_in_spawned_processes():
+    written, failed = _run(1, ["a", "b", "c"])
+    assert written == [("a", "a<a>"), ("b", "b<b>"), ("c", "c<c>")]
+    assert failed == []
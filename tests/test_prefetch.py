@@ -0,0 +1,56 @@
+import time
+
+from modules.scrape.fetcher import Fetcher
+from modules.scrape.page_cache import CachedFetcher, DiskPageCache, MemoryPageCache
+from modules.scrape.prefetch import Prefetcher
+from modules.scrape.single_flight import SingleFlight
+
+URL_HORSE = "https://db.netkeiba.com/horse/2019100001"
+
+
+class CountingFetcher(Fetcher):
+    """
+    レート制限をかけずにself.htmlを返し、ネットワークへのリクエストの回数を数えるFetcher
+    """
+
+    def __init__(self, html: str):
+        self.html = html
+        self.requests = 0
+
+    def fetch(self, url: str) -> str:
+        self.requests += 1
+        return self.html
+
+
+def _cached_fetcher(tmp_path, fetcher: Fetcher) -> CachedFetcher:
+    return CachedFetcher(
+        fetcher, DiskPageCache(str(tmp_path)), MemoryPageCache(), SingleFlight()
+    )
+
+
+def test_revalidated_prefetch_is_reused(tmp_path, fixture_html):
+    horse_page = fixture_html("horse.html")
+    fetcher = CountingFetcher(horse_page)
+    cached = _cached_fetcher(tmp_path, fetcher)
+    # 前回の更新で取得し、処理した馬のページ
+    cached.cache.set(URL_HORSE, horse_page, fetched_at=time.time() - 24 * 60 * 60)
+    cached.mark_processed(URL_HORSE, horse_page)
+    fetcher.html = horse_page.replace("2024/03/12", "2024/04/01")
+    with Prefetcher(cached, workers=1) as prefetcher:
+        prefetcher.submit([URL_HORSE], revalidate=True)
+        prefetcher.join()
+    assert fetcher.requests == 1
+    # 先読みで再検証したページを、取得し直さずに使う
+    assert cached.fetch_if_modified(URL_HORSE) == fetcher.html
+    assert fetcher.requests == 1
+
+
+def test_plain_prefetch_fills_cache(tmp_path, fixture_html):
+    fetcher = CountingFetcher(fixture_html("horse.html"))
+    cached = _cached_fetcher(tmp_path, fetcher)
+    with Prefetcher(cached, workers=1) as prefetcher:
+        prefetcher.submit([URL_HORSE, URL_HORSE])
+        prefetcher.join()
+        assert prefetcher.fetched == 1
+    assert cached.fetch(URL_HORSE) == fetcher.html
+    assert fetcher.requests == 1
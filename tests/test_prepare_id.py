@@ -0,0 +1,39 @@
+import threading
+
+import pytest
+
+# appパッケージは学習用の依存関係(scikit-learnなど)も読み込む
+pytest.importorskip("sklearn")
+
+from app._prepare_id import close_browsers, get_run_pool
+
+
+def _pool_in_thread():
+    pools = []
+    thread = threading.Thread(target=lambda: pools.append(get_run_pool()))
+    thread.start()
+    thread.join()
+    return pools[0]
+
+
+def test_run_pool_is_shared_within_a_run():
+    try:
+        assert get_run_pool() is get_run_pool()
+    finally:
+        close_browsers()
+
+
+def test_close_browsers_leaves_other_runs_alone():
+    # Streamlitのセッションは別々のスレッドで実行される
+    other = _pool_in_thread()
+    driver = object()
+    other._idle.put(driver)
+    pool = get_run_pool()
+    assert pool is not other
+    close_browsers()
+    assert other._idle.get_nowait() is driver
+    # 閉じた後は新しいプールを使う
+    try:
+        assert get_run_pool() is not pool
+    finally:
+        close_browsers()
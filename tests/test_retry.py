@@ -0,0 +1,112 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from modules.scrape import retry
+from modules.scrape.retry import (
+    CircuitBreaker,
+    CircuitOpenError,
+    FetchError,
+    RetryPolicy,
+    classify_error,
+)
+
+
+def _http_error(status: int) -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(response=response)
+
+
+@pytest.mark.parametrize(
+    "error, kind",
+    [
+        (requests.Timeout(), "timeout"),
+        (_http_error(404), "client"),
+        (_http_error(429), "rate_limited"),
+        (_http_error(503), "server"),
+        (ValueError(), "other"),
+    ],
+)
+def test_classify_error(error, kind):
+    assert classify_error(error) == kind
+
+
+def _open_breaker(cooldown: float = 0.2) -> CircuitBreaker:
+    breaker = CircuitBreaker(threshold=2, cooldown=cooldown)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+
+def test_breaker_opens_after_threshold():
+    breaker = _open_breaker(cooldown=60)
+    assert breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        breaker.wait(max_wait=0.01)
+
+
+def test_breaker_closes_when_trial_succeeds():
+    breaker = _open_breaker()
+    breaker.wait()
+    assert breaker.is_half_open and breaker.trial_running
+    breaker.record_success()
+    assert breaker.failures == 0 and not breaker.is_open
+    assert not breaker.is_half_open
+    # 閉じた後は待たずに通す
+    breaker.wait(max_wait=0)
+
+
+def test_breaker_reopens_when_trial_fails():
+    breaker = _open_breaker()
+    breaker.wait()
+    breaker.record_failure()
+    assert breaker.is_open
+    assert not breaker.trial_running
+
+
+def test_breaker_lets_one_trial_through():
+    breaker = _open_breaker(cooldown=0.05)
+    breaker.wait()
+    passed = threading.Event()
+    waiter = threading.Thread(target=lambda: (breaker.wait(), passed.set()))
+    waiter.start()
+    # 試しのリクエストの結果が出るまで、他のスレッドは通らない
+    time.sleep(0.1)
+    assert not passed.is_set()
+    breaker.record_success()
+    waiter.join(timeout=2)
+    assert passed.is_set()
+
+
+def test_policy_retries_and_raises_fetch_error(monkeypatch):
+    monkeypatch.setattr(retry, "get_circuit_breaker", lambda url: CircuitBreaker())
+    calls = []
+
+    def _fail():
+        calls.append(1)
+        raise requests.Timeout()
+
+    policy = RetryPolicy(retries=2, base_wait=0, max_wait=0)
+    with pytest.raises(FetchError) as error:
+        policy.call("https://db.netkeiba.com/horse/1", _fail)
+    assert error.value.kind == "timeout"
+    assert len(calls) == 3
+
+
+def test_policy_does_not_retry_client_errors(monkeypatch):
+    breaker = CircuitBreaker(threshold=1)
+    monkeypatch.setattr(retry, "get_circuit_breaker", lambda url: breaker)
+    calls = []
+
+    def _not_found():
+        calls.append(1)
+        raise _http_error(404)
+
+    with pytest.raises(FetchError):
+        RetryPolicy(retries=2).call("https://db.netkeiba.com/horse/1", _not_found)
+    assert len(calls) == 1
+    # ホストは応答しているため、ブレーカーは開かない
+    assert not breaker.is_open
@@ -0,0 +1,75 @@
+from modules.scrape import webdriver
+from modules.scrape.webdriver import TabGroup, block_resources
+
+
+class _SwitchTo:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def new_window(self, kind: str):
+        self.driver.opened += 1
+        self.driver.window_handles.append(f"tab-{self.driver.opened}")
+        self.driver.current_window_handle = self.driver.window_handles[-1]
+
+    def window(self, handle: str):
+        self.driver.current_window_handle = handle
+
+
+class FakeDriver:
+    """
+    DevToolsのコマンドを、その時点でフォーカスのあるタブと一緒に記録するドライバー
+    """
+
+    def __init__(self):
+        self.opened = 0
+        self.window_handles = ["tab-0"]
+        self.current_window_handle = "tab-0"
+        self.switch_to = _SwitchTo(self)
+        self.cdp_calls = []
+
+    def execute_cdp_cmd(self, cmd: str, params: dict):
+        self.cdp_calls.append((self.current_window_handle, cmd))
+
+    def close(self):
+        self.window_handles.remove(self.current_window_handle)
+
+
+def _commands(driver: FakeDriver, handle: str) -> list[str]:
+    return [cmd for tab, cmd in driver.cdp_calls if tab == handle]
+
+
+def test_tab_group_blocks_resources_in_every_tab():
+    driver = FakeDriver()
+    group = TabGroup(driver, 3, ("odds",))
+    try:
+        assert [tab.handle for tab in group.tabs] == ["tab-0", "tab-1", "tab-2"]
+        for tab in group.tabs:
+            assert _commands(driver, tab.handle) == [
+                "Network.enable",
+                "Network.setBlockedURLs",
+                "Emulation.setScriptExecutionDisabled",
+            ]
+    finally:
+        group.close()
+    # 閉じたタブの設定は残さない
+    assert "tab-1" not in webdriver._blocked_page_types
+    webdriver.forget_blocked_tabs(driver)
+
+
+def test_block_resources_is_cached_per_tab():
+    driver = FakeDriver()
+    block_resources(driver, "odds")
+    block_resources(driver, "odds")
+    assert len(_commands(driver, "tab-0")) == 3
+    driver.switch_to.new_window("tab")
+    block_resources(driver, "odds")
+    assert len(_commands(driver, "tab-1")) == 3
+    # ページの種類が変わった場合は、Networkを有効にし直さずにブロックだけ変える
+    driver.switch_to.window("tab-0")
+    block_resources(driver, "horse")
+    assert _commands(driver, "tab-0")[3:] == [
+        "Network.setBlockedURLs",
+        "Emulation.setScriptExecutionDisabled",
+    ]
+    webdriver.forget_blocked_tabs(driver)
+    assert not set(driver.window_handles) & set(webdriver._blocked_page_types)